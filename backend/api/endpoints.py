@@ -1,6 +1,7 @@
-from fastapi import APIRouter, File, UploadFile, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
-from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
+from fastapi import APIRouter, Depends, File, UploadFile, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, StreamingResponse, Response
 from fastapi.staticfiles import StaticFiles
+import hmac
 import shutil
 import uuid
 import aiofiles
@@ -8,15 +9,24 @@ import json
 from pathlib import Path
 import logging
 from datetime import datetime
-import httpx
 import asyncio
 import os
 
-from ..core.config import UPLOAD_DIR, ALLOWED_EXTENSIONS, MAX_FILE_SIZE, YOUTUBE_USER_AGENT, DB_PATH
-from ..models.schemas import UploadResponse, SearchResponse, HealthResponse, ErrorResponse, AuthRequest, AuthResponse, MeResponse, SavedTracksResponse, SaveTrackRequest
-from ..services.youtube import search_youtube_service, get_stream_url_service, create_error_response
-from ..services.rooms import active_rooms, room_connections, broadcast_to_room, handle_host_message, handle_listener_message
-from ..services.auth import create_user, verify_credentials, create_session, delete_session, get_user_by_token, list_saved_tracks, save_track, remove_track
+from ..core.config import UPLOAD_DIR, ALLOWED_EXTENSIONS, MAX_FILE_SIZE, DB_PATH, DEBUG_TOKEN, PEAKS_MAX_AGE_SECONDS, ANALYSIS_CONCURRENCY, UPLOAD_ANALYSIS_WAIT_SECONDS
+from ..core.metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, render_metrics
+from ..core.ratelimit import rate_limit, rate_limit_charge
+from ..core.telemetry import StreamTrace, TrackedFileResponse, recent_streams, telemetry_capacity
+from ..core.http_cache import cache_headers, etag_matches, make_etag, not_modified
+from ..core.serialization import FastJSONResponse, RawJSONResponse, dumps
+from ..models.schemas import UploadResponse, SearchResponse, HealthResponse, ErrorResponse, AuthRequest, AuthResponse, MeResponse, SavedTracksResponse, SaveTrackRequest, LibraryBatchRequest, LibraryBatchResponse, PlayBatchRequest
+from ..services.youtube import search_youtube_entry, search_youtube_ndjson, search_max_age, get_stream_url_service, resolve_streams_ndjson, uncached_stream_count, create_error_response
+from ..services.rooms import rooms_playing, active_rooms, room_connections, broadcast_to_room, handle_host_message, handle_listener_message, register_room, add_connection, remove_connection, mark_alive, room_gauges
+from ..services.refresher import wake_refresher
+from ..services.streaming import proxy_stream
+from ..services.track_index import LOCAL_SEARCH_LIMIT, MAX_SUGGESTIONS, record_tracks_soon, search_local, suggest
+from ..services.library import invalidate_library, library_etag, library_snapshot
+from ..services.audio_analysis import PEAK_LEVELS, analysis_backlog, analysis_error, analysis_status, peaks_path, read_peaks, remove_analysis, schedule_analysis, upload_duplicate
+from ..services.auth import create_user, verify_credentials, create_session, delete_session, get_user_by_token, known_session_user, list_saved_tracks, list_library_changes, get_library_version, save_track, remove_track, apply_library_batch, MAX_PAGE_SIZE
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -35,6 +45,26 @@ def _require_user(request: Request):
         raise HTTPException(status_code=401, detail='Unauthorized')
     return user
 
+def _client_key(request: Request) -> str:
+    """Rate-limit key: the signed-in user, so one account shares a budget across devices, else the client IP.
+
+    Only sessions this process has already verified count, so keying never queries SQLite and a flood of made-up
+    tokens still lands on its IP's bucket.
+    """
+    token = _get_bearer_token(request)
+    user_id = known_session_user(token) if token else None
+    if user_id is not None:
+        return f'user:{user_id}'
+    return f'ip:{request.client.host if request.client else "unknown"}'
+
+_limit_search = Depends(rate_limit('search', _client_key))
+_limit_play = Depends(rate_limit('play', _client_key))
+_limit_auth = Depends(rate_limit('auth', _client_key))
+# Type-ahead lookups get their own, larger budget so keystrokes do not use up /search
+_limit_suggest = Depends(rate_limit('suggest', _client_key))
+# /play/batch spends the /play budget per video it has to extract, not per request
+_charge_play = rate_limit_charge('play', _client_key)
+
 @router.get("/health", response_model=HealthResponse)
 async def health_check():
     from ..core.config import YOUTUBE_SEARCH_AVAILABLE, PYTUBEFIX_AVAILABLE
@@ -52,10 +82,15 @@ async def api_status():
         "status": "success",
         "message": "VoxWave API is running!",
         "youtube_available": YOUTUBE_SEARCH_AVAILABLE,
-        "pytubefix_available": PYTUBEFIX_AVAILABLE
+        "pytubefix_available": PYTUBEFIX_AVAILABLE,
+        "rooms": room_gauges()
     }
 
-@router.post("/auth/register", response_model=AuthResponse)
+@router.get("/metrics", include_in_schema=False)
+async def metrics():
+    return Response(content=render_metrics(), media_type=METRICS_CONTENT_TYPE)
+
+@router.post("/auth/register", response_model=AuthResponse, dependencies=[_limit_auth])
 async def register(payload: AuthRequest):
     try:
         user = create_user(DB_PATH, payload.username, payload.password)
@@ -64,7 +99,7 @@ async def register(payload: AuthRequest):
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
-@router.post("/auth/login", response_model=AuthResponse)
+@router.post("/auth/login", response_model=AuthResponse, dependencies=[_limit_auth])
 async def login(payload: AuthRequest):
     user = verify_credentials(DB_PATH, payload.username, payload.password)
     if not user:
@@ -85,16 +120,49 @@ async def me(request: Request):
     return MeResponse(id=user.id, username=user.username)
 
 @router.get("/me/library", response_model=SavedTracksResponse)
-async def get_my_library(request: Request):
+async def get_my_library(
+    request: Request,
+    since: int = Query(None, ge=0, description="Library version from a previous response; returns only changes after it"),
+    limit: int = Query(None, ge=1, le=MAX_PAGE_SIZE, description="Page size; omit to get every track"),
+    cursor: str = Query(None, description="next_cursor from the previous page"),
+    fields: str = Query(None, description="Comma-separated track fields to return, e.g. track_id,title,artist"),
+):
     user = _require_user(request)
-    tracks = list_saved_tracks(DB_PATH, user.id)
-    return SavedTracksResponse(tracks=tracks)
+
+    def validators(version):
+        # Every query parameter shapes the body, so each combination gets its own ETag
+        etag = make_etag('me-library', user.id, version, since, limit, cursor, fields)
+        return cache_headers(etag, 'private, no-cache', vary='Authorization')
+
+    # One indexed lookup decides a 304 before any tracks are read
+    version = get_library_version(DB_PATH, user.id)
+    headers = validators(version)
+    if etag_matches(request, headers['ETag']):
+        return not_modified(headers)
+
+    field_list = [f.strip() for f in fields.split(',') if f.strip()] if fields else None
+    try:
+        if since is not None:
+            payload = list_library_changes(DB_PATH, user.id, since, limit=limit, cursor=cursor, fields=field_list)
+        else:
+            payload = list_saved_tracks(DB_PATH, user.id, limit=limit, cursor=cursor, fields=field_list)
+            # Read before listing: a write landing in between is re-sent on the next sync, never lost
+            payload['version'] = version
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # Rows come straight from SQLite in SavedTrack's shape (or a projection of it), so skip response_model validation
+    payload.setdefault('deleted', [])
+    payload.setdefault('full', True)
+    payload.setdefault('next_cursor', None)
+    if payload['version'] != version:
+        headers = validators(payload['version'])
+    return FastJSONResponse(content=payload, headers=headers)
 
 @router.post("/me/library")
 async def add_to_my_library(request: Request, payload: SaveTrackRequest):
     user = _require_user(request)
     try:
-        save_track(
+        version = save_track(
             DB_PATH,
             user.id,
             track_id=payload.track_id,
@@ -105,19 +173,36 @@ async def add_to_my_library(request: Request, payload: SaveTrackRequest):
         )
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
-    return {"ok": True}
+    record_tracks_soon(DB_PATH, [payload.dict()])
+    return {"ok": True, "version": version}
+
+@router.post("/me/library/batch", response_model=LibraryBatchResponse)
+async def batch_update_my_library(request: Request, payload: LibraryBatchRequest):
+    """Apply many saves, then many removes, atomically"""
+    user = _require_user(request)
+    try:
+        version = apply_library_batch(
+            DB_PATH,
+            user.id,
+            saves=[t.dict() for t in payload.save],
+            removes=[t.dict() for t in payload.remove],
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    record_tracks_soon(DB_PATH, [t.dict() for t in payload.save])
+    return LibraryBatchResponse(ok=True, version=version, saved=len(payload.save), removed=len(payload.remove))
 
 @router.delete("/me/library")
 async def remove_from_my_library(request: Request, track_id: str = Query(...), source: str = Query(...)):
     user = _require_user(request)
     try:
-        remove_track(DB_PATH, user.id, track_id=track_id, source=source)
+        version = remove_track(DB_PATH, user.id, track_id=track_id, source=source)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
-    return {"ok": True}
+    return {"ok": True, "version": version}
 
 @router.get("/songs/{filename}")
-async def serve_song(filename: str):
+async def serve_song(filename: str, request: Request):
     file_path = UPLOAD_DIR / filename
     if not file_path.exists():
         raise HTTPException(status_code=404, detail="File not found")
@@ -125,14 +210,60 @@ async def serve_song(filename: str):
     if file_path.suffix.lower() not in ALLOWED_EXTENSIONS:
         raise HTTPException(status_code=400, detail="File type not supported")
     
-    return FileResponse(
+    trace = StreamTrace('songs', filename, request, rooms_playing(filename))
+    trace.set(mode='local')
+    return TrackedFileResponse(
         path=str(file_path),
         media_type="audio/mpeg",
         headers={
             "Accept-Ranges": "bytes",
             "Cache-Control": "public, max-age=3600",
             "Access-Control-Allow-Origin": "*"
-        }
+        },
+        trace=trace,
+    )
+
+@router.get("/songs/{filename}/peaks")
+async def song_peaks(
+    filename: str,
+    request: Request,
+    width: int = Query(PEAK_LEVELS[0], ge=1, description="Smallest number of (min, max) bins wanted"),
+):
+    """Precomputed waveform of an upload: min/max pairs in -127..127, from the stored level nearest width"""
+    file_path = UPLOAD_DIR / filename
+    if not file_path.is_file() or file_path.suffix.lower() not in ALLOWED_EXTENSIONS:
+        raise HTTPException(status_code=404, detail="File not found")
+
+    status = analysis_status(filename)
+    if status == 'failed':
+        raise HTTPException(status_code=404, detail=f"No waveform for this file: {analysis_error(filename)}")
+    if status != 'ready':
+        # Uploaded before the worker ran, or still in the queue
+        schedule_analysis(filename)
+        return JSONResponse(status_code=202, content={"status": "pending"}, headers={"Retry-After": "2"})
+
+    path = peaks_path(filename)
+    try:
+        etag = make_etag('peaks', filename, path.stat().st_mtime_ns, width)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="File not found")
+    headers = cache_headers(etag, f"public, max-age={PEAKS_MAX_AGE_SECONDS}")
+    headers["Access-Control-Allow-Origin"] = "*"
+    if etag_matches(request, etag):
+        return not_modified(headers)
+
+    sample_rate, duration, levels = await asyncio.to_thread(read_peaks, path)
+    # Coarsest level that still has at least width bins, else the finest there is
+    bins = min((b for b in levels if b >= width), default=max(levels))
+    return FastJSONResponse(
+        content={
+            "filename": filename,
+            "duration": duration,
+            "sample_rate": sample_rate,
+            "bins": bins,
+            "peaks": levels[bins].ravel().tolist(),
+        },
+        headers=headers,
     )
 
 @router.post("/upload", response_model=UploadResponse)
@@ -150,27 +281,95 @@ async def upload_audio(file: UploadFile = File(...)):
     
     async with aiofiles.open(file_path, 'wb') as f:
         await f.write(content)
+    invalidate_library()
+    analysed = schedule_analysis(unique_filename)
+    # Give the analysis a moment so a re-upload of an existing track is flagged in this response. Only when it
+    # can start right away: behind a backlog (say, the startup backfill) waiting would just time out
+    if analysis_backlog() <= max(ANALYSIS_CONCURRENCY, 1):
+        try:
+            await asyncio.wait_for(asyncio.shield(analysed), UPLOAD_ANALYSIS_WAIT_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+    duplicate = upload_duplicate(unique_filename)
         
     return UploadResponse(
         filename=unique_filename,
         original_name=file.filename,
         size=len(content),
-        message="File uploaded successfully"
+        message="File uploaded successfully",
+        analysed=analysis_status(unique_filename) == 'ready',
+        duplicate_of=duplicate['filename'] if duplicate else None,
+        similarity=duplicate['similarity'] if duplicate else None,
     )
 
-@router.get("/search", response_model=SearchResponse)
-async def search_youtube(q: str = Query(..., description="Search query", min_length=1)):
+@router.get("/search", response_model=SearchResponse, dependencies=[_limit_search])
+async def search_youtube(
+    request: Request,
+    q: str = Query(None, description="Search query", min_length=1),
+    continuation: str = Query(None, description="continuation from the previous page; replaces q"),
+):
     """Search YouTube videos"""
+    if not q and not continuation:
+        raise HTTPException(status_code=422, detail="Search query cannot be empty")
+    try:
+        entry = await search_youtube_entry(q, continuation)
+        headers = cache_headers(entry['etag'], f"public, max-age={search_max_age(entry)}")
+        if etag_matches(request, entry['etag']):
+            return not_modified(headers)
+        # response_model stays for the OpenAPI schema; the cached body is already in SearchResponse shape
+        return RawJSONResponse(content=entry['body'], headers=headers)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except Exception as e:
+        logger.error(f"Search failed for query '{q}': {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/search/stream", dependencies=[_limit_search])
+async def search_youtube_stream(
+    q: str = Query(None, description="Search query", min_length=1),
+    continuation: str = Query(None, description="continuation from the previous page; replaces q"),
+):
+    """Search YouTube videos, streaming each result as an NDJSON line as soon as it is parsed"""
+    if not q and not continuation:
+        raise HTTPException(status_code=422, detail="Search query cannot be empty")
     try:
-        results = await search_youtube_service(q.strip())
-        return SearchResponse(results=results, total=len(results))
+        lines = await search_youtube_ndjson(q, continuation)
     except ValueError as e:
         raise HTTPException(status_code=422, detail=str(e))
     except Exception as e:
         logger.error(f"Search failed for query '{q}': {e}")
         raise HTTPException(status_code=500, detail=str(e))
+    # Instant matches from tracks we have seen before go out first, while YouTube is still being asked
+    local = await asyncio.to_thread(search_local, DB_PATH, q) if q and not continuation else []
+
+    async def body():
+        for result in local:
+            yield dumps({'type': 'local', 'result': result}) + b'\n'
+        async for line in lines:
+            yield line
+
+    # no-transform/X-Accel-Buffering keep proxies from holding lines back until the page is complete
+    return StreamingResponse(body(), media_type="application/x-ndjson",
+                             headers={"Cache-Control": "no-cache, no-transform", "X-Accel-Buffering": "no"})
     
-@router.get("/play/{video_id}")
+@router.get("/search/local", dependencies=[_limit_suggest])
+async def search_local_tracks(
+    q: str = Query(..., description="Search query", min_length=1),
+    limit: int = Query(LOCAL_SEARCH_LIMIT, ge=1, le=LOCAL_SEARCH_LIMIT),
+):
+    """Ranked matches from the local index of tracks seen in earlier searches and libraries"""
+    results = await asyncio.to_thread(search_local, DB_PATH, q, limit)
+    return FastJSONResponse(content={'results': results, 'total': len(results)})
+
+@router.get("/search/suggest", dependencies=[_limit_suggest])
+async def search_suggest(
+    q: str = Query(..., description="Partially typed query", min_length=1),
+    limit: int = Query(MAX_SUGGESTIONS, ge=1, le=MAX_SUGGESTIONS),
+):
+    """Autocomplete titles for a partially typed query, from the local track index"""
+    return FastJSONResponse(content={'suggestions': await asyncio.to_thread(suggest, DB_PATH, q, limit)})
+
+@router.get("/play/{video_id}", dependencies=[_limit_play])
 async def get_stream_url(video_id: str):
     """Fixed play endpoint with better error handling"""
     if not video_id or len(video_id) != 11:
@@ -188,6 +387,18 @@ async def get_stream_url(video_id: str):
         return JSONResponse(status_code=400, content=result.dict())
     return result
 
+@router.post("/play/batch")
+async def get_stream_urls(request: Request, payload: PlayBatchRequest):
+    """Resolve many videos at once, streaming one NDJSON line per video as it completes, then an end line"""
+    try:
+        lines = resolve_streams_ndjson(payload.video_ids)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # One /play token per video that needs an extraction; an all-cached batch still costs one
+    await _charge_play(request, cost=max(uncached_stream_count(payload.video_ids), 1))
+    return StreamingResponse(lines, media_type="application/x-ndjson",
+                             headers={"Cache-Control": "no-cache, no-transform", "X-Accel-Buffering": "no"})
+
 @router.get("/stream/{video_id}")
 async def stream_audio(video_id: str, request: Request):
     """Fixed streaming endpoint with proper error handling"""
@@ -203,173 +414,32 @@ async def stream_audio(video_id: str, request: Request):
             ).dict()
         )
     
-    # Get fresh stream URL
-    result = await get_stream_url_service(video_id)
-    if isinstance(result, ErrorResponse):
-        return JSONResponse(status_code=400, content=result.dict())
-
-    upstream_url = result.stream_url
-    extra_headers = result.stream_headers or {}
-
-    range_header = request.headers.get('range')
-    
-    client_headers = {
-        'User-Agent': YOUTUBE_USER_AGENT,
-        'Accept': '*/*',
-        'Accept-Language': 'en-US,en;q=0.9',
-        'Accept-Encoding': 'gzip, deflate',
-        'Connection': 'keep-alive',
-    }
-    
-    for k, v in extra_headers.items():
-        if k.lower() not in ['range', 'host']:
-            client_headers[k] = v
-    
-    if range_header:
-        client_headers['Range'] = range_header
-    else:
-        client_headers['Range'] = 'bytes=0-'
-
-    client = httpx.AsyncClient(
-        follow_redirects=True, 
-        timeout=httpx.Timeout(60.0, connect=10.0),
-        limits=httpx.Limits(max_keepalive_connections=5, max_connections=10)
-    )
-
-    stream_cm = None
-    resp = None
-
-    try:
-        stream_cm = client.stream('GET', upstream_url, headers=client_headers)
-        resp = await stream_cm.__aenter__()
-
-        if resp.status_code >= 400:
-            error_body = ""
-            try:
-                error_bytes = await asyncio.wait_for(resp.aread(), timeout=2.0)
-                error_body = error_bytes[:300].decode('utf-8', errors='ignore')
-            except asyncio.TimeoutError:
-                error_body = "Timeout reading error response"
-            except Exception as e:
-                error_body = f"Error reading response: {e}"
-
-            logger.error(f"Upstream error {resp.status_code} for {video_id}: {error_body}")
-
-            try:
-                await stream_cm.__aexit__(None, None, None)
-            finally:
-                await client.aclose()
-
-            return JSONResponse(
-                status_code=502,
-                content=create_error_response(
-                    'Upstream Stream Failed',
-                    f'YouTube returned {resp.status_code}',
-                    [
-                        'Stream URL may have expired',
-                        'Try refreshing the page',
-                        'Video may be region-restricted'
-                    ]
-                ).dict()
-            )
-
-        passthrough_headers = {
-            'Access-Control-Allow-Origin': '*',
-            'Access-Control-Allow-Methods': 'GET, OPTIONS',
-            'Access-Control-Allow-Headers': 'Range',
-            'Access-Control-Expose-Headers': 'Content-Length, Content-Range, Accept-Ranges',
-            'Cache-Control': 'no-cache',
-        }
-
-        for h in ['accept-ranges', 'content-range', 'content-length', 'content-type']:
-            if h in resp.headers:
-                passthrough_headers[h] = resp.headers[h]
-
-        media_type = resp.headers.get('content-type') or 'audio/mp4'
-
-        async def stream_bytes():
-            try:
-                async for chunk in resp.aiter_bytes(chunk_size=65536):
-                    yield chunk
-            except Exception as e:
-                logger.error(f"Error during streaming for {video_id}: {e}")
-                raise
-            finally:
-                try:
-                    if stream_cm is not None:
-                        await stream_cm.__aexit__(None, None, None)
-                finally:
-                    try:
-                        await client.aclose()
-                    except Exception as e:
-                        logger.warning(f"Error closing client: {e}")
-
-        return StreamingResponse(
-            stream_bytes(),
-            status_code=resp.status_code,
-            media_type=media_type,
-            headers=passthrough_headers,
-        )
-
-    except httpx.TimeoutException as e:
-        logger.error(f"Timeout streaming {video_id}: {e}")
-        try:
-            if stream_cm is not None:
-                await stream_cm.__aexit__(None, None, None)
-        finally:
-            try:
-                await client.aclose()
-            except Exception:
-                pass
-        
-        return JSONResponse(
-            status_code=504,
-            content=create_error_response(
-                'Stream Timeout',
-                'Connection to YouTube timed out',
-                ['Check your internet connection', 'Try again']
-            ).dict()
-        )
-    
-    except Exception as e:
-        logger.error(f"Unexpected error streaming {video_id}: {e}")
-        try:
-            if stream_cm is not None:
-                await stream_cm.__aexit__(None, None, None)
-        finally:
-            try:
-                await client.aclose()
-            except Exception:
-                pass
-        
-        return JSONResponse(
-            status_code=500,
-            content=create_error_response(
-                'Stream Failed',
-                str(e)[:150],
-                ['Unexpected error', 'Try refreshing']
-            ).dict()
-        )
+    trace = StreamTrace('stream', video_id, request, rooms_playing(video_id))
+    return trace.attach(await proxy_stream(video_id, request.headers.get('range'), trace))
+
+@router.get("/debug/streams", include_in_schema=False)
+async def debug_streams(
+    request: Request,
+    video_id: str = Query(None, description="Only responses for this video id (or uploaded file name)"),
+    room: str = Query(None, description="Only responses for the song a room was playing"),
+    limit: int = Query(100, ge=1, le=1000),
+):
+    """Recent /stream and /songs telemetry, newest first; needs DEBUG_TOKEN as X-Debug-Token"""
+    token = request.headers.get('x-debug-token', '')
+    if not DEBUG_TOKEN or not hmac.compare_digest(token.encode(), DEBUG_TOKEN.encode()):
+        # Indistinguishable from a missing route, so the endpoint does not advertise itself
+        raise HTTPException(status_code=404, detail="Not Found")
+    streams = recent_streams(video_id, room, limit)
+    return FastJSONResponse(content={'streams': streams, 'total': len(streams), 'capacity': telemetry_capacity()})
         
 @router.get("/library")
-async def get_library():
+async def get_library(request: Request):
     try:
-        songs = []
-        if UPLOAD_DIR.exists():
-            for file_path in UPLOAD_DIR.iterdir():
-                if file_path.is_file() and file_path.suffix.lower() in ALLOWED_EXTENSIONS:
-                    stat = file_path.stat()
-                    songs.append({
-                        'id': file_path.name,
-                        'filename': file_path.name,
-                        'original_name': file_path.stem,
-                        'size': stat.st_size,
-                        'modified': stat.st_mtime,
-                        'url': f'/songs/{file_path.name}',
-                        'source': 'local'
-                    })
-        songs.sort(key=lambda x: x['modified'], reverse=True)
-        return {'songs': songs, 'total': len(songs)}
+        etag = library_etag()
+        if etag_matches(request, etag):
+            return not_modified(cache_headers(etag, 'no-cache'))
+        etag, body = library_snapshot()
+        return RawJSONResponse(content=body, headers=cache_headers(etag, 'no-cache'))
     except Exception as e:
         logger.error(f"Library error: {e}")
         raise HTTPException(status_code=500, detail="Failed to get library")
@@ -381,6 +451,8 @@ async def delete_song(filename: str):
         raise HTTPException(status_code=404, detail="File not found")
     try:
         file_path.unlink()
+        remove_analysis(filename)
+        invalidate_library()
         return {"message": f"File {filename} deleted successfully"}
     except Exception as e:
         raise HTTPException(status_code=500, detail="Failed to delete file")
@@ -392,15 +464,14 @@ async def create_room(request: Request):
 
     user = _require_user(request)
     room_id = secrets.token_urlsafe(8)
-    active_rooms[room_id] = {
+    register_room(room_id, {
         'host_id': user.username,
         'current_song': None,
         'is_playing': False,
         'current_time': 0.0,
         'last_update': datetime.now().isoformat(),
         'listener_count': 0
-    }
-    room_connections[room_id] = []
+    })
 
     frontend_base = (
         os.environ.get("FRONTEND_BASE_URL")
@@ -431,8 +502,7 @@ async def websocket_endpoint(websocket: WebSocket, room_id: str, user_id: str):
 
     await websocket.accept()
     
-    room_connections[room_id].append(websocket)
-    active_rooms[room_id]['listener_count'] = len(room_connections[room_id])
+    add_connection(room_id, websocket)
     
     await websocket.send_text(json.dumps({
         'type': 'room_state',
@@ -449,20 +519,32 @@ async def websocket_endpoint(websocket: WebSocket, room_id: str, user_id: str):
     try:
         while True:
             data = await websocket.receive_text()
+            mark_alive(websocket)
             message = json.loads(data)
+            msg_type = message.get('type')
+            if msg_type == 'pong':
+                continue
+            if msg_type == 'ping':
+                await websocket.send_text(json.dumps({'type': 'pong'}))
+                continue
+            if room_id not in active_rooms:
+                break
             if user_id == active_rooms[room_id]['host_id']:
                 await handle_host_message(room_id, message, websocket)
+                if msg_type == 'song_change':
+                    # Resolve the new song's URL now, before every listener requests it at once
+                    wake_refresher()
             else:
                 await handle_listener_message(room_id, message, websocket)
     except WebSocketDisconnect:
-        if room_id in room_connections:
-            room_connections[room_id] = [c for c in room_connections[room_id] if c != websocket]
-            active_rooms[room_id]['listener_count'] = len(room_connections[room_id])
+        pass
+    except Exception as e:
+        logger.warning(f"Closing room connection for {user_id} in {room_id}: {e}")
+    finally:
+        # Empty rooms are kept for a grace period so a host can reconnect; the reaper expires them
+        if remove_connection(room_id, websocket):
             await broadcast_to_room(room_id, {
                 'type': 'user_left',
                 'user_id': user_id,
                 'listener_count': active_rooms[room_id]['listener_count']
             })
-            if len(room_connections[room_id]) == 0:
-                del active_rooms[room_id]
-                del room_connections[room_id]
\ No newline at end of file
@@ -1,3 +1,4 @@
+import importlib.util
 import os
 from pathlib import Path
 from datetime import timedelta
@@ -13,16 +14,20 @@ logger = logging.getLogger(__name__)
 # Directory setup
 # We assume this config is imported from backend/core/config.py, so we go up two levels to root
 ROOT_DIR = Path(__file__).resolve().parent.parent.parent
-UPLOAD_DIR = ROOT_DIR / "uploads"
+# Writable locations can be redirected (e.g. to a scratch dir for benchmarks) via environment variables
+UPLOAD_DIR = Path(os.environ.get("VOXWAVE_UPLOAD_DIR", ROOT_DIR / "uploads"))
 STATIC_DIR = ROOT_DIR / "main_frontend" / "public"  # Use main_frontend public directory
-CACHE_DIR = ROOT_DIR / "cache"
-DATA_DIR = ROOT_DIR / "data"
+CACHE_DIR = Path(os.environ.get("VOXWAVE_CACHE_DIR", ROOT_DIR / "cache"))
+DATA_DIR = Path(os.environ.get("VOXWAVE_DATA_DIR", ROOT_DIR / "data"))
 DB_PATH = DATA_DIR / "voxwave.db"
 
-# Ensure directories exist
-UPLOAD_DIR.mkdir(exist_ok=True)
-CACHE_DIR.mkdir(exist_ok=True)
-DATA_DIR.mkdir(exist_ok=True)
+
+def ensure_directories():
+    """Create writable directories; called from the app lifespan rather than at import time."""
+    UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    DATA_DIR.mkdir(parents=True, exist_ok=True)
+
 
 # Constants
 ALLOWED_EXTENSIONS = {".mp3", ".wav", ".m4a", ".flac", ".ogg"}
@@ -31,26 +36,119 @@ CACHE_DURATION = timedelta(hours=1)
 PORT = int(os.environ.get("PORT", 8000))
 YOUTUBE_USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/121.0.0.0 Safari/537.36'
 
+# Caps concurrent pytubefix extractions/searches; excess callers queue on the event loop
+EXTRACTOR_CONCURRENCY = int(os.environ.get("EXTRACTOR_CONCURRENCY", 8))
+# Hedging: an extraction still running at this percentile of recent latencies gets a second attempt, through
+# EXTRACTOR_HEDGE_CLIENT (a pytubefix client name; empty = same client). 0 disables hedging.
+EXTRACTOR_HEDGE_PERCENTILE = float(os.environ.get("EXTRACTOR_HEDGE_PERCENTILE", 95))
+EXTRACTOR_HEDGE_CLIENT = os.environ.get("EXTRACTOR_HEDGE_CLIENT", "ANDROID_VR")
+EXTRACTOR_HEDGE_MIN_SAMPLES = 20
+EXTRACTOR_HEDGE_DEFAULT_DELAY_SECONDS = float(os.environ.get("EXTRACTOR_HEDGE_DEFAULT_DELAY_SECONDS", 4))
+EXTRACTOR_HEDGE_MIN_DELAY_SECONDS = float(os.environ.get("EXTRACTOR_HEDGE_MIN_DELAY_SECONDS", 0.5))
+
+# Diagnostics: sampling profiler (always on, or per request via X-Profile-Token), slow-request log and loop-lag monitor
+PROFILING_ENABLED = os.environ.get("PROFILING_ENABLED", "").lower() in ("1", "true", "yes")
+PROFILE_TOKEN = os.environ.get("PROFILE_TOKEN", "")
+PROFILE_SAMPLE_INTERVAL_MS = float(os.environ.get("PROFILE_SAMPLE_INTERVAL_MS", 5))
+PROFILE_DIR = CACHE_DIR / "profiles"
+SLOW_REQUEST_MS = float(os.environ.get("SLOW_REQUEST_MS", 1000))
+LOOP_LAG_THRESHOLD_MS = float(os.environ.get("LOOP_LAG_THRESHOLD_MS", 250))  # 0 disables the monitor
+# Per-response telemetry of /stream and /songs kept in memory, readable at /debug/streams with X-Debug-Token
+# (the endpoint is off while DEBUG_TOKEN is empty)
+DEBUG_TOKEN = os.environ.get("DEBUG_TOKEN", "")
+STREAM_TELEMETRY_SIZE = int(os.environ.get("STREAM_TELEMETRY_SIZE", 1000))
+
+# Room liveness
+ROOM_HEARTBEAT_INTERVAL_SECONDS = float(os.environ.get("ROOM_HEARTBEAT_INTERVAL_SECONDS", 15))
+ROOM_HEARTBEAT_TIMEOUT_SECONDS = float(os.environ.get("ROOM_HEARTBEAT_TIMEOUT_SECONDS", 45))
+ROOM_EMPTY_GRACE_SECONDS = float(os.environ.get("ROOM_EMPTY_GRACE_SECONDS", 120))
+
+# Stream URLs: cached until shortly before their signed expire= (capped), and re-resolved in the background
+# while a room is playing the video or /stream served it recently
+STREAM_URL_MAX_AGE_SECONDS = float(os.environ.get("STREAM_URL_MAX_AGE_SECONDS", 3600))
+STREAM_URL_EXPIRY_MARGIN_SECONDS = float(os.environ.get("STREAM_URL_EXPIRY_MARGIN_SECONDS", 120))
+# Failed extractions are answered from memory for this long: removed/private/region-blocked videos, and anything else
+STREAM_UNAVAILABLE_TTL_SECONDS = float(os.environ.get("STREAM_UNAVAILABLE_TTL_SECONDS", 6 * 3600))
+STREAM_FAILURE_TTL_SECONDS = float(os.environ.get("STREAM_FAILURE_TTL_SECONDS", 30))
+STREAM_REFRESH_INTERVAL_SECONDS = float(os.environ.get("STREAM_REFRESH_INTERVAL_SECONDS", 15))
+STREAM_REFRESH_LEAD_SECONDS = float(os.environ.get("STREAM_REFRESH_LEAD_SECONDS", 300))
+STREAM_IN_USE_GRACE_SECONDS = float(os.environ.get("STREAM_IN_USE_GRACE_SECONDS", 600))
+# How often /stream may re-resolve and resume a single response after the upstream connection breaks
+STREAM_RESUME_ATTEMPTS = int(os.environ.get("STREAM_RESUME_ATTEMPTS", 3))
+# Bytes a direct /stream relay reads ahead of its client (0 = read only as fast as the client takes them)
+STREAM_READAHEAD_BYTES = int(os.environ.get("STREAM_READAHEAD_KB", 1024)) * 1024
+# Shared fetch: concurrent /stream requests for one video read a single upstream download buffered on disk.
+# Ranges starting more than the join window past the download head, and oversized tracks, go direct.
+SHARED_FETCH_ENABLED = os.environ.get("SHARED_FETCH_ENABLED", "true").lower() in ("1", "true", "yes")
+SHARED_FETCH_DIR = CACHE_DIR / "stream_buffers"
+SHARED_FETCH_JOIN_WINDOW_BYTES = int(os.environ.get("SHARED_FETCH_JOIN_WINDOW_KB", 1024)) * 1024
+SHARED_FETCH_MAX_TRACK_BYTES = int(float(os.environ.get("SHARED_FETCH_MAX_TRACK_MB", 64)) * 1024 * 1024)
+SHARED_FETCH_MAX_DOWNLOADS = int(os.environ.get("SHARED_FETCH_MAX_DOWNLOADS", 32))
+SHARED_FETCH_LINGER_SECONDS = float(os.environ.get("SHARED_FETCH_LINGER_SECONDS", 120))
+
+# Disk-backed second tier for the search and stream URL caches, warmed into memory on startup
+L2_CACHE_ENABLED = os.environ.get("L2_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+L2_CACHE_PATH = CACHE_DIR / "l2_cache.sqlite"
+L2_CACHE_MAX_BYTES = int(float(os.environ.get("L2_CACHE_MAX_MB", 64)) * 1024 * 1024)
+L2_WARM_ENTRIES = int(os.environ.get("L2_WARM_ENTRIES", 500))
+
+# Token-bucket limits for expensive routes, per user (bearer token) or client IP.
+# RATE_LIMIT_<GROUP>="<requests per minute>,<burst>"; a rate of 0 turns the group off.
+RATE_LIMIT_ENABLED = os.environ.get("RATE_LIMIT_ENABLED", "true").lower() in ("1", "true", "yes")
+
+
+def _rate_limit(group: str, per_minute: float, burst: int):
+    spec = os.environ.get(f"RATE_LIMIT_{group.upper()}", f"{per_minute},{burst}")
+    rate, _, size = spec.partition(",")
+    return float(rate), int(size or burst)
+
+
+RATE_LIMITS = {
+    "search": _rate_limit("search", 60, 20),
+    "play": _rate_limit("play", 60, 20),
+    "auth": _rate_limit("auth", 10, 5),
+    "suggest": _rate_limit("suggest", 300, 60),
+}
+RATE_LIMIT_PRUNE_SECONDS = 60
+# Proxies whose X-Forwarded-For names the real client (comma-separated IPs or CIDRs, "*" for any); the same
+# variable uvicorn reads for --forwarded-allow-ips. Without it every client behind a proxy shares one rate-limit key.
+FORWARDED_ALLOW_IPS = os.environ.get("FORWARDED_ALLOW_IPS", "127.0.0.1")
+
+# Uploads are analysed once in the background (waveform peaks, loudness, fingerprints); results live in a hidden directory next to them.
+# Compressed formats are decoded with ffmpeg when it is on PATH; WAV needs nothing beyond NumPy.
+ANALYSIS_DIR = UPLOAD_DIR / ".analysis"
+ANALYSIS_CONCURRENCY = int(os.environ.get("ANALYSIS_CONCURRENCY", 2))
+ANALYSIS_BATCH_SIZE = int(os.environ.get("ANALYSIS_BATCH_SIZE", 16))
+FFMPEG_BINARY = os.environ.get("FFMPEG_BINARY", "ffmpeg")
+# Waveform responses never change for an upload (names are unique), so clients may keep them this long
+PEAKS_MAX_AGE_SECONDS = int(os.environ.get("PEAKS_MAX_AGE_SECONDS", 86400))
+# /library reports each upload's integrated loudness and the gain that brings it to this level; positive gain
+# is capped so the track's peak stays below the ceiling
+LOUDNESS_TARGET_LUFS = float(os.environ.get("LOUDNESS_TARGET_LUFS", -14))
+LOUDNESS_PEAK_CEILING_DBFS = float(os.environ.get("LOUDNESS_PEAK_CEILING_DBFS", -1))
+# Uploads whose audio fingerprint differs from an earlier upload's in at most this fraction of bits are flagged
+# as its duplicate (re-encodes typically land well under 0.15, unrelated tracks near 0.5). /upload waits up to
+# this long for the analysis, when no backlog is ahead of it, to report a duplicate straight away; otherwise it
+# shows up in /library.
+DUPLICATE_MAX_BIT_ERROR_RATE = float(os.environ.get("DUPLICATE_MAX_BIT_ERROR_RATE", 0.3))
+UPLOAD_ANALYSIS_WAIT_SECONDS = float(os.environ.get("UPLOAD_ANALYSIS_WAIT_SECONDS", 1.5))
+
+# Rows kept in the local full-text index of tracks seen in searches and libraries (least recently seen go first)
+TRACK_INDEX_MAX_ROWS = int(os.environ.get("TRACK_INDEX_MAX_ROWS", 50000))
+
 # Dependency Checks
-try:
-    from youtubesearchpython import VideosSearch
-    YOUTUBE_SEARCH_AVAILABLE = False  # Disabled due to httpx compatibility issues
-    logger.warning("youtube-search-python disabled due to compatibility issues. Using pytubefix for search instead.")
-except ImportError:
-    YOUTUBE_SEARCH_AVAILABLE = False
-    logger.warning("youtube-search-python not available. Using pytubefix for search instead.")
-
-try:
-    import pytubefix
-    PYTUBEFIX_AVAILABLE = True
-except ImportError:
-    PYTUBEFIX_AVAILABLE = False
-    logger.warning("pytubefix not available. Install with: pip install pytubefix")
+# Only look the packages up here; importing them is deferred to first use to keep cold starts fast.
+# youtube-search-python is disabled due to httpx compatibility issues, pytubefix handles search instead.
+YOUTUBE_SEARCH_AVAILABLE = False
 
-try:
-    from fastapi.templating import Jinja2Templates
-    TEMPLATES_AVAILABLE = False  # Templates no longer needed with React frontend
-    templates = None
-except ImportError:
-    TEMPLATES_AVAILABLE = False
-    templates = None
+
+def _module_available(name: str) -> bool:
+    try:
+        return importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+PYTUBEFIX_AVAILABLE = _module_available("pytubefix")
+if not PYTUBEFIX_AVAILABLE:
+    logger.warning("pytubefix not available. Install with: pip install pytubefix")
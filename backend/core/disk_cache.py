@@ -0,0 +1,179 @@
+import asyncio
+import logging
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from .metrics import CallbackGauge
+
+logger = logging.getLogger(__name__)
+
+
+class DiskCache:
+    """Second-tier cache in a SQLite file: namespaced bytes values with absolute expiry times.
+
+    Every method is blocking and thread-safe; use the a*/set_soon variants from the event loop. Storage
+    errors are logged and behave like misses, so a broken cache file never fails a request.
+    """
+
+    # Check the size bound every this many writes, and then shrink to this fraction of it
+    EVICT_EVERY = 50
+    EVICT_TARGET = 0.9
+
+    def __init__(self, path: Path, max_bytes: int, name: str = 'l2'):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.name = name
+        self._lock = threading.Lock()
+        self._conn = None
+        self._writes = 0
+        self._pending = set()
+        self.total_bytes = 0
+        CallbackGauge(f'voxwave_{name}_cache_bytes', f'Bytes of values held in the {name} disk cache',
+                      lambda: self.total_bytes)
+
+    def open(self) -> bool:
+        with self._lock:
+            if self._conn is not None:
+                return True
+            try:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                conn = sqlite3.connect(str(self.path), check_same_thread=False)
+                conn.execute("PRAGMA journal_mode = WAL")
+                conn.execute("PRAGMA synchronous = NORMAL")
+                conn.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS entries (
+                        namespace TEXT NOT NULL,
+                        key TEXT NOT NULL,
+                        value BLOB NOT NULL,
+                        size INTEGER NOT NULL,
+                        expires_at REAL NOT NULL,
+                        hits INTEGER NOT NULL DEFAULT 0,
+                        last_access REAL NOT NULL,
+                        PRIMARY KEY(namespace, key)
+                    )
+                    """
+                )
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_last_access ON entries(last_access)")
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_hot ON entries(namespace, hits DESC, last_access DESC)")
+                conn.commit()
+                self.total_bytes = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+                self._conn = conn
+                return True
+            except sqlite3.Error as e:
+                logger.warning(f"{self.name} cache at {self.path} unavailable: {e}")
+                return False
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def get(self, namespace: str, key: str) -> Optional[Tuple[bytes, float]]:
+        """(value, expires_at) of a live entry, or None"""
+        now = time.time()
+        with self._lock:
+            if self._conn is None:
+                return None
+            try:
+                row = self._conn.execute(
+                    "SELECT value, expires_at FROM entries WHERE namespace = ? AND key = ? AND expires_at > ?",
+                    (namespace, key, now),
+                ).fetchone()
+                if row is None:
+                    return None
+                self._conn.execute(
+                    "UPDATE entries SET hits = hits + 1, last_access = ? WHERE namespace = ? AND key = ?",
+                    (now, namespace, key),
+                )
+                self._conn.commit()
+                return bytes(row[0]), row[1]
+            except sqlite3.Error as e:
+                logger.warning(f"{self.name} cache read failed: {e}")
+                return None
+
+    def set(self, namespace: str, key: str, value: bytes, expires_at: float):
+        now = time.time()
+        if expires_at <= now:
+            return
+        with self._lock:
+            if self._conn is None:
+                return
+            try:
+                old = self._conn.execute(
+                    "SELECT size FROM entries WHERE namespace = ? AND key = ?", (namespace, key)
+                ).fetchone()
+                self._conn.execute(
+                    """
+                    INSERT INTO entries(namespace, key, value, size, expires_at, hits, last_access)
+                    VALUES(?,?,?,?,?,0,?)
+                    ON CONFLICT(namespace, key) DO UPDATE SET
+                        value=excluded.value, size=excluded.size, expires_at=excluded.expires_at,
+                        last_access=excluded.last_access
+                    """,
+                    (namespace, key, value, len(value), expires_at, now),
+                )
+                self._conn.commit()
+                self.total_bytes += len(value) - (old[0] if old else 0)
+                self._writes += 1
+                if self._writes % self.EVICT_EVERY == 0 or self.total_bytes > self.max_bytes:
+                    self._evict(now)
+            except sqlite3.Error as e:
+                logger.warning(f"{self.name} cache write failed: {e}")
+
+    def _evict(self, now: float):
+        """Drop expired entries, then least recently used ones until under EVICT_TARGET of max_bytes."""
+        self._conn.execute("DELETE FROM entries WHERE expires_at <= ?", (now,))
+        self.total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        excess = self.total_bytes - int(self.max_bytes * self.EVICT_TARGET)
+        if self.total_bytes > self.max_bytes and excess > 0:
+            victims = []
+            freed = 0
+            for namespace, key, size in self._conn.execute(
+                "SELECT namespace, key, size FROM entries ORDER BY last_access ASC"
+            ):
+                victims.append((namespace, key))
+                freed += size
+                if freed >= excess:
+                    break
+            self._conn.executemany("DELETE FROM entries WHERE namespace = ? AND key = ?", victims)
+            self.total_bytes -= freed
+        self._conn.commit()
+
+    def hot(self, namespace: str, limit: int) -> List[Tuple[str, bytes, float]]:
+        """Most used live entries of a namespace as (key, value, expires_at), for warming the memory tier"""
+        with self._lock:
+            if self._conn is None:
+                return []
+            try:
+                return [
+                    (key, bytes(value), expires_at)
+                    for key, value, expires_at in self._conn.execute(
+                        """
+                        SELECT key, value, expires_at FROM entries
+                        WHERE namespace = ? AND expires_at > ?
+                        ORDER BY hits DESC, last_access DESC LIMIT ?
+                        """,
+                        (namespace, time.time(), limit),
+                    )
+                ]
+            except sqlite3.Error as e:
+                logger.warning(f"{self.name} cache scan failed: {e}")
+                return []
+
+    async def aget(self, namespace: str, key: str) -> Optional[Tuple[bytes, float]]:
+        if self._conn is None:
+            return None
+        return await asyncio.to_thread(self.get, namespace, key)
+
+    def set_soon(self, namespace: str, key: str, value: bytes, expires_at: float):
+        """Write through in a worker thread without making the caller wait."""
+        if self._conn is None:
+            return
+        task = asyncio.ensure_future(asyncio.to_thread(self.set, namespace, key, value, expires_at))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
@@ -0,0 +1,42 @@
+import hashlib
+import secrets
+
+from fastapi import Request
+from fastapi.responses import Response
+
+# Mixed into ETags built from in-memory counters, which restart at zero with the process
+PROCESS_TAG = secrets.token_hex(4)
+
+
+def make_etag(*parts) -> str:
+    """Strong ETag from the version parts that determine a representation."""
+    digest = hashlib.blake2s('\x1f'.join(str(p) for p in parts).encode('utf-8'), digest_size=12).hexdigest()
+    return f'"{digest}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """If-None-Match check; uses the weak comparison RFC 9110 prescribes for this header."""
+    header = request.headers.get('if-none-match')
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    for candidate in header.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def cache_headers(etag: str, cache_control: str, vary: str = None) -> dict:
+    headers = {'ETag': etag, 'Cache-Control': cache_control}
+    if vary:
+        headers['Vary'] = vary
+    return headers
+
+
+def not_modified(headers: dict) -> Response:
+    """304 carrying the same validator and caching headers a 200 would have."""
+    return Response(status_code=304, headers=headers)
@@ -0,0 +1,226 @@
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, List, Tuple, Union
+
+# Minimal Prometheus text-format metrics.
+# Every update happens on the event loop thread, so plain attribute arithmetic is safe without locks.
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+_registry: List["_Metric"] = []
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple, extra: str = '') -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = 'untyped'
+    has_children = True
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple, object] = {}
+        if not self.labelnames and self.has_children:
+            # Unlabelled metrics are exported as 0 before their first update
+            self.labels()
+        _registry.append(self)
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            child = self._children[values] = self._new_child()
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def _samples(self):
+        raise NotImplementedError
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        lines.extend(self._samples())
+        return lines
+
+
+class _Value:
+    __slots__ = ('value',)
+
+    def __init__(self):
+        self.value = 0
+
+    def inc(self, amount: float = 1):
+        self.value += amount
+
+    def dec(self, amount: float = 1):
+        self.value -= amount
+
+    def set(self, value: float):
+        self.value = value
+
+
+class Counter(_Metric):
+    kind = 'counter'
+
+    def _new_child(self):
+        return _Value()
+
+    def inc(self, amount: float = 1):
+        self.labels().inc(amount)
+
+    def _samples(self):
+        return [f'{self.name}{_format_labels(self.labelnames, k)} {_format_value(c.value)}'
+                for k, c in self._children.items()]
+
+
+class Gauge(Counter):
+    kind = 'gauge'
+
+    def dec(self, amount: float = 1):
+        self.labels().dec(amount)
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+
+class CallbackGauge(_Metric):
+    """Gauge evaluated at scrape time; the callback returns a number or a {label values: number} dict."""
+    kind = 'gauge'
+    has_children = False
+
+    def __init__(self, name: str, documentation: str, callback: Callable[[], Union[float, Dict]],
+                 labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.callback = callback
+
+    def _samples(self):
+        try:
+            value = self.callback()
+        except Exception:
+            return []
+        if not isinstance(value, dict):
+            return [f'{self.name} {_format_value(value)}']
+        return [f'{self.name}{_format_labels(self.labelnames, k if isinstance(k, tuple) else (k,))} {_format_value(v)}'
+                for k, v in value.items()]
+
+
+class _HistogramChild:
+    __slots__ = ('upper_bounds', 'counts', 'sum', 'count')
+
+    def __init__(self, upper_bounds):
+        self.upper_bounds = upper_bounds
+        self.counts = [0] * (len(upper_bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.upper_bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Histogram(_Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), buckets=DEFAULT_BUCKETS):
+        self.upper_bounds = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.upper_bounds)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def _samples(self):
+        lines = []
+        for key, child in self._children.items():
+            cumulative = 0
+            for bound, count in zip(self.upper_bounds + (float('inf'),), child.counts):
+                cumulative += count
+                le = f'le="{_format_value(float(bound))}"'
+                lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}')
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f'{self.name}_sum{labels} {_format_value(child.sum)}')
+            lines.append(f'{self.name}_count{labels} {child.count}')
+        return lines
+
+
+def render_metrics() -> str:
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+HTTP_REQUEST_DURATION = Histogram(
+    'voxwave_http_request_duration_seconds',
+    'Time from request receipt to response headers, by route template',
+    ('method', 'route', 'status'),
+)
+HTTP_REQUESTS_IN_PROGRESS = Gauge(
+    'voxwave_http_requests_in_progress',
+    'HTTP requests currently being handled',
+)
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording per-route latency without wrapping the response body."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        in_progress = HTTP_REQUESTS_IN_PROGRESS.labels()
+        in_progress.inc()
+        recorded = False
+
+        def record(status):
+            route = scope.get('route')
+            HTTP_REQUEST_DURATION.labels(
+                scope['method'],
+                route.path if route is not None else 'unmatched',
+                status,
+            ).observe(time.perf_counter() - start)
+
+        async def send_wrapper(message):
+            nonlocal recorded
+            if message['type'] == 'http.response.start' and not recorded:
+                recorded = True
+                record(message['status'])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception:
+            if not recorded:
+                recorded = True
+                record(500)
+            raise
+        finally:
+            in_progress.dec()
@@ -0,0 +1,205 @@
+import asyncio
+import hmac
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import Counter as StackCounter
+from datetime import datetime
+
+from .config import (
+    PROFILING_ENABLED,
+    PROFILE_TOKEN,
+    PROFILE_SAMPLE_INTERVAL_MS,
+    PROFILE_DIR,
+    SLOW_REQUEST_MS,
+    LOOP_LAG_THRESHOLD_MS,
+)
+from .metrics import Counter
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = b'x-profile-token'
+MAX_CONCURRENT_PROFILES = 2
+
+SLOW_REQUESTS = Counter('voxwave_slow_requests_total', 'Requests whose response headers took longer than SLOW_REQUEST_MS')
+LOOP_STALLS = Counter('voxwave_event_loop_stalls_total', 'Times the event loop was blocked longer than LOOP_LAG_THRESHOLD_MS')
+
+_SAMPLER_PREFIX = 'voxwave-profiler'
+_IDLE_FILES = ('threading.py', 'queue.py', 'selectors.py')
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    path = code.co_filename
+    parts = path.replace('\\', '/').rsplit('/', 2)
+    return f"{code.co_name} ({'/'.join(parts[-2:])}:{code.co_firstlineno})"
+
+
+class StackSampler(threading.Thread):
+    """Samples every Python thread's stack at a fixed interval and aggregates folded stacks."""
+
+    def __init__(self, interval_seconds: float, loop_thread_id: int):
+        super().__init__(name=f'{_SAMPLER_PREFIX}-{id(self):x}', daemon=True)
+        self.interval_seconds = interval_seconds
+        self.loop_thread_id = loop_thread_id
+        self.stacks = StackCounter()
+        self.samples = 0
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.wait(self.interval_seconds):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                name = names.get(thread_id, str(thread_id))
+                if name.startswith(_SAMPLER_PREFIX):
+                    continue
+                # Skip idle executor workers parked on their queue; the loop thread is always kept
+                if thread_id != self.loop_thread_id and frame.f_code.co_filename.endswith(_IDLE_FILES):
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                stack.append(name)
+                self.stacks[';'.join(reversed(stack))] += 1
+            self.samples += 1
+
+    def stop(self):
+        """Signal the thread to finish; it exits within one interval. join() it (off the loop) before reading."""
+        self._stopped.set()
+
+    def folded(self) -> str:
+        """Brendan Gregg's folded format, readable by flamegraph.pl and speedscope."""
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+
+def _write_profile(path, content: str):
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(content)
+
+
+class ProfilingMiddleware:
+    """Logs slow requests and, when enabled, samples them and dumps folded stacks for the slow ones.
+
+    Duration is measured to response headers, and sampling stops there too, so long-lived /stream bodies
+    are neither reported as slow nor hold a profiling slot while they play.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.active_profiles = 0
+
+    def _wants_profile(self, scope) -> bool:
+        if PROFILING_ENABLED:
+            return True
+        if not PROFILE_TOKEN:
+            return False
+        for name, value in scope.get('headers', ()):
+            if name == PROFILE_HEADER:
+                return hmac.compare_digest(value, PROFILE_TOKEN.encode())
+        return False
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        sampler = None
+        if self._wants_profile(scope) and self.active_profiles < MAX_CONCURRENT_PROFILES:
+            self.active_profiles += 1
+            sampler = StackSampler(PROFILE_SAMPLE_INTERVAL_MS / 1000, threading.get_ident())
+            sampler.start()
+
+        start = time.perf_counter()
+        elapsed_ms = None
+
+        def headers_done():
+            nonlocal elapsed_ms
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            if sampler is not None:
+                sampler.stop()
+                self.active_profiles -= 1
+
+        async def send_wrapper(message):
+            if message['type'] == 'http.response.start' and elapsed_ms is None:
+                headers_done()
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if elapsed_ms is None:
+                headers_done()
+            if elapsed_ms >= SLOW_REQUEST_MS:
+                await self._report_slow(scope, elapsed_ms, sampler)
+
+    async def _report_slow(self, scope, elapsed_ms: float, sampler):
+        SLOW_REQUESTS.inc()
+        route = scope.get('route')
+        route_path = route.path if route is not None else scope['path']
+        message = f"Slow request: {scope['method']} {scope['path']} took {elapsed_ms:.0f}ms"
+        if sampler is not None:
+            # The sampler thread finishes its current sample within one interval; wait for it off the loop
+            await asyncio.to_thread(sampler.join, 1.0)
+        if sampler is None or not sampler.samples:
+            logger.warning(message)
+            return
+        slug = route_path.strip('/').replace('/', '_').replace('{', '').replace('}', '') or 'root'
+        filename = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{scope['method']}-{slug}-{os.getpid()}-{int(elapsed_ms)}ms.folded"
+        path = PROFILE_DIR / filename
+        try:
+            await asyncio.to_thread(_write_profile, path, sampler.folded())
+            logger.warning(f"{message}; {sampler.samples} samples written to {path}")
+        except OSError as e:
+            logger.warning(f"{message}; failed to write profile: {e}")
+
+
+class LoopLagMonitor:
+    """Watchdog thread that logs the event loop's stack whenever a tick is late by more than the threshold."""
+
+    def __init__(self, threshold_ms: float = LOOP_LAG_THRESHOLD_MS):
+        self.threshold = threshold_ms / 1000
+        self.interval = self.threshold / 4
+        self._last_tick = time.monotonic()
+        self._loop = None
+        self._loop_thread_id = None
+        self._stopped = threading.Event()
+        self._watchdog = None
+        self._ticker = None
+
+    async def _tick(self):
+        while True:
+            self._last_tick = time.monotonic()
+            await asyncio.sleep(self.interval)
+
+    def _watch(self):
+        reported_tick = None
+        while not self._stopped.wait(self.interval):
+            last_tick = self._last_tick
+            lag = time.monotonic() - last_tick - self.interval
+            if lag < self.threshold or reported_tick == last_tick:
+                continue
+            # Report each stall once, capturing whatever the loop is running right now
+            reported_tick = last_tick
+            self._loop.call_soon_threadsafe(LOOP_STALLS.inc)
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = ''.join(traceback.format_stack(frame)) if frame is not None else '<unavailable>'
+            logger.warning(f"Event loop blocked for {lag * 1000:.0f}ms; loop stack:\n{stack}")
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._last_tick = time.monotonic()
+        self._ticker = asyncio.create_task(self._tick())
+        self._watchdog = threading.Thread(target=self._watch, name='voxwave-loop-lag', daemon=True)
+        self._watchdog.start()
+
+    async def stop(self):
+        self._stopped.set()
+        if self._ticker is not None:
+            self._ticker.cancel()
+            await asyncio.gather(self._ticker, return_exceptions=True)
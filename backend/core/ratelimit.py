@@ -0,0 +1,91 @@
+import math
+import time
+from typing import Callable, Dict, List
+
+from fastapi import HTTPException, Request
+
+from .config import RATE_LIMIT_ENABLED, RATE_LIMITS, RATE_LIMIT_PRUNE_SECONDS
+from .metrics import CallbackGauge, Counter
+
+RATE_LIMITED = Counter('voxwave_rate_limited_total', 'Requests rejected with 429, by route group', ('group',))
+
+_limiters: Dict[str, 'TokenBucketLimiter'] = {}
+CallbackGauge('voxwave_rate_limit_buckets', 'Clients with a partly drained rate-limit bucket',
+              lambda: sum(len(limiter.buckets) for limiter in _limiters.values()))
+
+
+class TokenBucketLimiter:
+    """Token buckets per client key: refilled at per_minute/60 tokens a second, holding at most burst.
+
+    A bucket is two floats, [tokens, updated_at], created on first use. Buckets that have refilled
+    completely are indistinguishable from new ones, so a periodic sweep drops them.
+    """
+
+    def __init__(self, group: str, per_minute: float, burst: int):
+        self.group = group
+        self.rate = per_minute / 60
+        self.burst = max(burst, 1)
+        self.buckets: Dict[str, List[float]] = {}
+        self._next_prune = time.monotonic() + RATE_LIMIT_PRUNE_SECONDS
+
+    def take(self, key: str, now: float = None, cost: float = 1) -> float:
+        """Spend cost tokens for key; returns 0 when allowed, else seconds until enough are available.
+
+        A cost above burst is charged as burst (a full bucket), so large requests stay possible.
+        """
+        now = time.monotonic() if now is None else now
+        cost = min(max(cost, 0), self.burst)
+        if now >= self._next_prune:
+            self.prune(now)
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            self.buckets[key] = [self.burst - cost, now]
+            return 0.0
+        tokens = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+        bucket[1] = now
+        if tokens >= cost:
+            bucket[0] = tokens - cost
+            return 0.0
+        bucket[0] = tokens
+        return (cost - tokens) / self.rate
+
+    def prune(self, now: float = None):
+        now = time.monotonic() if now is None else now
+        full_after = self.burst / self.rate
+        for key in [k for k, (_, updated_at) in self.buckets.items() if now - updated_at >= full_after]:
+            del self.buckets[key]
+        self._next_prune = now + RATE_LIMIT_PRUNE_SECONDS
+
+
+def rate_limit_charge(group: str, key_func: Callable[[Request], str]):
+    """async charge(request, cost=1) spending cost tokens of RATE_LIMITS[group]; raises 429 with Retry-After.
+
+    For routes whose cost is only known inside the handler (e.g. how many videos of a batch need work).
+    """
+    per_minute, burst = RATE_LIMITS[group]
+    if not RATE_LIMIT_ENABLED or per_minute <= 0:
+        async def unlimited(request: Request, cost: float = 1):
+            return None
+        return unlimited
+
+    limiter = _limiters.setdefault(group, TokenBucketLimiter(group, per_minute, burst))
+    rejected = RATE_LIMITED.labels(group)
+
+    async def charge(request: Request, cost: float = 1):
+        retry_after = limiter.take(key_func(request), cost=cost)
+        if retry_after:
+            rejected.inc()
+            raise HTTPException(status_code=429, detail='Too many requests, slow down',
+                                headers={'Retry-After': str(math.ceil(retry_after))})
+
+    return charge
+
+
+def rate_limit(group: str, key_func: Callable[[Request], str]):
+    """FastAPI dependency enforcing RATE_LIMITS[group] per key_func(request), one token per request."""
+    charge = rate_limit_charge(group, key_func)
+
+    async def dependency(request: Request):
+        await charge(request)
+
+    return dependency
@@ -0,0 +1,32 @@
+import json
+from typing import Any
+
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    orjson = None
+    ORJSON_AVAILABLE = False
+
+
+def dumps(content: Any) -> bytes:
+    """Serialize plain JSON-ready data (dicts, lists, str, numbers) to compact UTF-8 bytes."""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse for content that is already plain data; skips jsonable_encoder and uses orjson when installed."""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+class RawJSONResponse(JSONResponse):
+    """Sends bytes that were serialized earlier (e.g. cached payloads) without touching them."""
+
+    def render(self, content: bytes) -> bytes:
+        return content
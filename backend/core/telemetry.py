@@ -0,0 +1,164 @@
+import asyncio
+import itertools
+import time
+from collections import deque
+from typing import List, Optional
+
+from fastapi import Request
+from fastapi.responses import FileResponse, StreamingResponse
+
+from .config import STREAM_TELEMETRY_SIZE
+
+# A wait between two body chunks longer than this counts as a stall
+STALL_SECONDS = 0.5
+
+# Most recent finished /stream and /songs responses, oldest dropped first
+_records = deque(maxlen=STREAM_TELEMETRY_SIZE)
+_ids = itertools.count(1)
+
+
+class StreamTrace:
+    """Timing and outcome of one audio response; appended to the ring buffer once when it ends."""
+
+    def __init__(self, kind: str, track_id: str, request: Request, rooms: List[str]):
+        self._start = time.perf_counter()
+        self._finished = False
+        self.record = {
+            'id': next(_ids),
+            'kind': kind,
+            'track_id': track_id,
+            'rooms': rooms,
+            'client': request.client.host if request.client else None,
+            'range': request.headers.get('range'),
+            'started_at': time.time(),
+            'mode': None,
+            'status': None,
+            'upstream_status': None,
+            'ttfb_ms': None,
+            'bytes': 0,
+            'duration_ms': None,
+            'throughput_bps': None,
+            'stalls': {'upstream': 0, 'client': 0},
+            'stall_ms': {'upstream': 0.0, 'client': 0.0},
+            'outcome': None,
+            'error': None,
+        }
+
+    def set(self, **fields):
+        self.record.update(fields)
+
+    def sent(self, nbytes: int):
+        if self.record['ttfb_ms'] is None:
+            self.record['ttfb_ms'] = round((time.perf_counter() - self._start) * 1000, 1)
+        self.record['bytes'] += nbytes
+
+    def waited(self, side: str, seconds: float):
+        """side="upstream": the body had no data ready; side="client": the client was slow to take it."""
+        if seconds >= STALL_SECONDS:
+            self.record['stalls'][side] += 1
+            self.record['stall_ms'][side] = round(self.record['stall_ms'][side] + seconds * 1000, 1)
+
+    def finish(self, outcome: str, error: Optional[str] = None):
+        if self._finished:
+            return
+        self._finished = True
+        elapsed = time.perf_counter() - self._start
+        self.record.update(
+            outcome=outcome,
+            error=error,
+            duration_ms=round(elapsed * 1000, 1),
+            throughput_bps=round(self.record['bytes'] / elapsed) if elapsed > 0 else None,
+        )
+        _records.append(self.record)
+
+    async def wrap(self, body):
+        """Pass a response body through, recording bytes, TTFB, stalls and how it ended."""
+        outcome, error = 'complete', None
+        iterator = body.__aiter__()
+        try:
+            while True:
+                waiting = time.perf_counter()
+                try:
+                    chunk = await iterator.__anext__()
+                except StopAsyncIteration:
+                    break
+                ready = time.perf_counter()
+                if self.record['bytes']:
+                    self.waited('upstream', ready - waiting)
+                self.sent(len(chunk))
+                yield chunk
+                self.waited('client', time.perf_counter() - ready)
+        except asyncio.CancelledError:
+            outcome, error = 'client_abort', 'client disconnected'
+            raise
+        except GeneratorExit:
+            outcome, error = 'client_abort', 'response closed before the body finished'
+            raise
+        except Exception as e:
+            outcome, error = 'error', f'{type(e).__name__}: {e}'[:300]
+            raise
+        finally:
+            self.finish(outcome, error)
+            if hasattr(iterator, 'aclose'):
+                await iterator.aclose()
+
+    def attach(self, response):
+        """Trace response: its streamed body when there is one, else record it as finished right away."""
+        self.set(status=response.status_code)
+        if isinstance(response, StreamingResponse):
+            response.body_iterator = self.wrap(response.body_iterator)
+        elif response.status_code >= 400:
+            self.finish('error', bytes(response.body[:300]).decode('utf-8', errors='replace'))
+        else:
+            self.finish('complete')
+        return response
+
+
+class TrackedFileResponse(FileResponse):
+    """FileResponse (Range support included) that reports what it sent to a StreamTrace."""
+
+    def __init__(self, *args, trace: StreamTrace, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.trace = trace
+
+    async def __call__(self, scope, receive, send):
+        trace = self.trace
+
+        async def traced_send(message):
+            if message['type'] == 'http.response.start':
+                trace.set(status=message['status'])
+            elif message.get('body'):
+                trace.sent(len(message['body']))
+            started = time.perf_counter()
+            await send(message)
+            trace.waited('client', time.perf_counter() - started)
+
+        outcome, error = 'complete', None
+        try:
+            await super().__call__(scope, receive, traced_send)
+        except (asyncio.CancelledError, OSError) as e:
+            outcome, error = 'client_abort', f'{type(e).__name__}: {e}'[:300]
+            raise
+        except Exception as e:
+            outcome, error = 'error', f'{type(e).__name__}: {e}'[:300]
+            raise
+        finally:
+            trace.finish(outcome, error)
+
+
+def recent_streams(track_id: Optional[str] = None, room: Optional[str] = None, limit: int = 100) -> List[dict]:
+    """Newest first, optionally only one track's or one room's"""
+    matches = []
+    for record in reversed(_records):
+        if track_id and record['track_id'] != track_id:
+            continue
+        if room and room not in record['rooms']:
+            continue
+        matches.append(record)
+        if len(matches) >= limit:
+            break
+    return matches
+
+
+def telemetry_capacity() -> int:
+    return _records.maxlen
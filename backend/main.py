@@ -2,22 +2,68 @@ from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import HTMLResponse
+from uvicorn.middleware.proxy_headers import ProxyHeadersMiddleware
+import asyncio
 import logging
 import os
+from contextlib import asynccontextmanager
 from pathlib import Path
 
-from .core.config import TEMPLATES_AVAILABLE, templates, STATIC_DIR, DB_PATH
+from .core.config import STATIC_DIR, DB_PATH, LOOP_LAG_THRESHOLD_MS, FORWARDED_ALLOW_IPS, ensure_directories
+from .core.metrics import MetricsMiddleware
+from .core.profiling import ProfilingMiddleware, LoopLagMonitor
 from .api.endpoints import router as api_router
+from .services.audio_analysis import init_analysis_db, run_analysis_worker
 from .services.auth import init_auth_db
+from .services.rooms import run_heartbeat
+from .services.refresher import run_refresher
+from .services.shared_fetch import close_shared_downloads, prepare_shared_downloads
+from .services.track_index import init_track_index
+from .services.youtube import preload_extractor, warm_caches, close_caches
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Side effects live here, not at import time, so importing the app stays cheap
+    ensure_directories()
+    init_auth_db(DB_PATH)
+    init_track_index(DB_PATH)
+    init_analysis_db(DB_PATH)
+    prepare_shared_downloads()
+    loop_lag_monitor = LoopLagMonitor() if LOOP_LAG_THRESHOLD_MS > 0 else None
+    if loop_lag_monitor:
+        loop_lag_monitor.start()
+    background_tasks = [
+        asyncio.create_task(run_heartbeat()),
+        asyncio.create_task(run_refresher()),
+        # Import pytubefix/httpx off the loop once we are already serving, instead of on the first request
+        asyncio.create_task(preload_extractor()),
+        # Memory caches start empty; pull the hot part of the disk tier back in without delaying startup
+        asyncio.create_task(warm_caches()),
+        # Waveform peaks and loudness for uploads: new ones as they arrive, plus any the previous run did not get to
+        asyncio.create_task(run_analysis_worker()),
+    ]
+    try:
+        yield
+    finally:
+        if loop_lag_monitor:
+            await loop_lag_monitor.stop()
+        for task in background_tasks:
+            task.cancel()
+        await asyncio.gather(*background_tasks, return_exceptions=True)
+        close_shared_downloads()
+        close_caches()
+
+
 app = FastAPI(
     title="VoxWave API",
     description="A modern music streaming API with YouTube integration and local file support",
-    version="2.0.0"
+    version="2.0.0",
+    lifespan=lifespan,
 )
 
 # CORS Config
@@ -29,6 +75,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+app.add_middleware(ProfilingMiddleware)
+# Outside everything else but the proxy headers, so latency includes CORS handling
+app.add_middleware(MetricsMiddleware)
+# Outermost: request.client is the real client (for rate-limit keys) whichever server runs the app
+app.add_middleware(ProxyHeadersMiddleware, trusted_hosts=FORWARDED_ALLOW_IPS)
+
 # Mount Static Files
 # We mount "static" to serve general static files (images, etc)
 app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
@@ -44,20 +96,12 @@ if (DIST_DIR / "index.html").exists():
 app.include_router(api_router)
 
 
-@app.on_event("startup")
-async def startup_event():
-    init_auth_db(DB_PATH)
-
 @app.get("/", response_class=HTMLResponse)
 async def read_root():
     if (DIST_DIR / "index.html").exists():
         with open(DIST_DIR / "index.html", "r", encoding="utf-8") as f:
             return f.read()
-    elif TEMPLATES_AVAILABLE and templates:
-        # Fallback to templates if needed, or simple message
-        return "<h1>VoxWave Backend Running. React build not found.</h1>"
-    else:
-        return "<h1>VoxWave Backend Running</h1>"
+    return "<h1>VoxWave Backend Running</h1>"
 
 if __name__ == "__main__":
     import uvicorn
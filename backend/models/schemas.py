@@ -12,6 +12,7 @@ class SearchResult(BaseModel):
 class SearchResponse(BaseModel):
     results: List[SearchResult]
     total: int
+    continuation: Optional[str] = None
 
 class PlayResponse(BaseModel):
     stream_url: str
@@ -20,11 +21,19 @@ class PlayResponse(BaseModel):
     stream_headers: Optional[Dict[str, str]] = None
     error: Optional[str] = None
 
+class PlayBatchRequest(BaseModel):
+    video_ids: List[str]
+
 class UploadResponse(BaseModel):
     filename: str
     original_name: str
     size: int
     message: str
+    # False when analysis was queued behind others or did not finish within UPLOAD_ANALYSIS_WAIT_SECONDS;
+    # /library has the result later
+    analysed: bool = False
+    duplicate_of: Optional[str] = None
+    similarity: Optional[float] = None
 
 class HealthResponse(BaseModel):
     status: str
@@ -57,8 +66,16 @@ class SavedTrack(BaseModel):
     thumbnail: Optional[str] = None
     created_at: int
 
+class TrackRef(BaseModel):
+    track_id: str
+    source: str
+
 class SavedTracksResponse(BaseModel):
     tracks: List[SavedTrack]
+    version: int = 0
+    deleted: List[TrackRef] = []
+    full: bool = True
+    next_cursor: Optional[str] = None
 
 class SaveTrackRequest(BaseModel):
     track_id: str
@@ -67,6 +84,16 @@ class SaveTrackRequest(BaseModel):
     artist: Optional[str] = None
     thumbnail: Optional[str] = None
 
+class LibraryBatchRequest(BaseModel):
+    save: List[SaveTrackRequest] = []
+    remove: List[TrackRef] = []
+
+class LibraryBatchResponse(BaseModel):
+    ok: bool
+    version: int
+    saved: int
+    removed: int
+
 class RoomInfo(BaseModel):
     room_id: str
     host_id: str
@@ -0,0 +1,631 @@
+import asyncio
+import logging
+import math
+import os
+import shutil
+import sqlite3
+import struct
+import subprocess
+import tempfile
+import threading
+import time
+import wave
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from ..core.config import (
+    UPLOAD_DIR,
+    ANALYSIS_DIR,
+    ALLOWED_EXTENSIONS,
+    ANALYSIS_CONCURRENCY,
+    ANALYSIS_BATCH_SIZE,
+    FFMPEG_BINARY,
+    LOUDNESS_TARGET_LUFS,
+    LOUDNESS_PEAK_CEILING_DBFS,
+)
+from ..core.metrics import CallbackGauge, Counter, Histogram
+from .fingerprint import compute_fingerprint, find_duplicate, forget_fingerprint, index_fingerprint, init_fingerprint_tables
+
+logger = logging.getLogger(__name__)
+
+# Compressed formats are decoded by ffmpeg to 16-bit PCM at this rate and read off its stdout in chunks; WAV is
+# read natively. Only a mono downmix of the whole track is kept in memory.
+ANALYSIS_SAMPLE_RATE = 22050
+MAX_ANALYSIS_SECONDS = 3600
+# Peak levels stored per track: (min, max) pairs per bin, finest first; each level is 4x coarser
+PEAK_LEVELS = (4096, 1024, 256)
+_PEAKS_MAGIC = b'VXPK'
+_PEAKS_VERSION = 1
+_PEAKS_HEADER = struct.Struct('<4sBxxxIdI')  # magic, version, sample rate, duration, level count
+
+# ITU-R BS.1770 loudness: 400 ms blocks every 100 ms, gated at -70 LUFS and then 10 LU below the ungated mean.
+# K-weighting is the standard's high shelf + high pass, given as analog parameters so any sample rate works.
+_SUB_BLOCK_SECONDS = 0.1
+_SUB_BLOCKS_PER_BLOCK = 4
+_ABSOLUTE_GATE_LUFS = -70.0
+_RELATIVE_GATE_LU = -10.0
+_K_SHELF = (1681.974450955533, 3.999843853973347, 0.7071752369554196)  # centre Hz, gain dB, Q
+_K_HIGH_PASS = (38.13547087602444, 0.5003270373238773)  # cutoff Hz, Q
+# Sub-blocks transformed per FFT call, bounding the temporary arrays for long files; also the decode chunk size
+_FFT_ROWS = 512
+_FFMPEG_TIMEOUT_SECONDS = 300
+
+# Files waiting for or in analysis, and why the ones that could not be analysed failed
+_pending: Dict[str, asyncio.Future] = {}
+_failed: Dict[str, str] = {}
+# Loudness and duplicate links of analysed uploads, mirrored from SQLite; version moves on every change,
+# for /library
+_loudness: Dict[str, dict] = {}
+_duplicates: Dict[str, dict] = {}
+_fingerprinted = set()
+_state = {'queue': None, 'db_path': None, 'version': 0}
+_pending_writes = set()
+
+ANALYSES = Counter('voxwave_audio_analyses_total', 'Uploaded files analysed, by result', ('result',))
+ANALYSIS_DURATION = Histogram('voxwave_audio_analysis_duration_seconds', 'Decode and analysis time per file')
+DUPLICATES = Counter('voxwave_upload_duplicates_total', 'Uploads flagged as a near-duplicate of an earlier one')
+CallbackGauge('voxwave_audio_analysis_pending', 'Uploaded files waiting for analysis', lambda: len(_pending))
+
+
+class UnsupportedAudio(Exception):
+    """The file cannot be decoded here (no ffmpeg for compressed formats, or an unreadable file)."""
+
+
+def peaks_path(filename: str) -> Path:
+    return ANALYSIS_DIR / f'{filename}.peaks'
+
+
+def _ffmpeg() -> Optional[str]:
+    return shutil.which(FFMPEG_BINARY)
+
+
+def _pcm_samples(raw: bytes, width: int, channels: int):
+    """Interleaved little-endian PCM as an int16 array of shape (frames, channels)"""
+    import numpy as np
+
+    if width == 1:
+        samples = (np.frombuffer(raw, dtype=np.uint8).astype(np.int16) - 128) << 8
+    elif width == 2:
+        samples = np.frombuffer(raw, dtype='<i2', count=len(raw) // 2)
+    elif width == 3:
+        # Keep the top two bytes of each 24-bit sample
+        samples = np.frombuffer(raw, dtype=np.uint8, count=len(raw) // 3 * 3).reshape(-1, 3)[:, 1:].copy().view('<i2').ravel()
+    elif width == 4:
+        samples = (np.frombuffer(raw, dtype='<i4', count=len(raw) // 4) >> 16).astype(np.int16)
+    else:
+        raise UnsupportedAudio(f'{width * 8}-bit PCM')
+    return samples[:len(samples) // channels * channels].reshape(-1, channels)
+
+
+def _pcm_chunks(read_frames, width: int, channels: int, sample_rate: int):
+    """int16 chunks (frames, channels) of up to MAX_ANALYSIS_SECONDS of PCM; all but the last hold whole sub-blocks"""
+    chunk_frames = int(round(sample_rate * _SUB_BLOCK_SECONDS)) * _FFT_ROWS
+    remaining = sample_rate * MAX_ANALYSIS_SECONDS
+    while remaining > 0:
+        samples = _pcm_samples(read_frames(min(chunk_frames, remaining)), width, channels)
+        if len(samples) == 0:
+            return
+        remaining -= len(samples)
+        yield samples
+
+
+def _downmix(chunks, sample_rate: int):
+    """(mono int16 samples of shape (frames, 1), sample rate, sample peak, K-weighted sub-block energies).
+
+    BS.1770 sums the power of every channel, so the peak and the loudness energies are taken from each chunk
+    before it is averaged to mono; only the mono signal is kept for the whole track.
+    """
+    import numpy as np
+
+    mono, energies, peak = [], [], 0
+    for chunk in chunks:
+        peak = max(peak, int(chunk.max()), -int(chunk.min()))
+        energies.append(_sub_block_energies(chunk, sample_rate))
+        channels = chunk.shape[1]
+        mono.append(chunk[:, 0] if channels == 1 else (chunk.sum(axis=1, dtype=np.int32) // channels).astype(np.int16))
+    if not mono:
+        raise UnsupportedAudio('no audio samples decoded')
+    return np.concatenate(mono)[:, None], sample_rate, peak, np.concatenate(energies)
+
+
+def _decode_wav(path: Path):
+    with wave.open(str(path), 'rb') as wav:
+        channels, width, rate = wav.getnchannels(), wav.getsampwidth(), wav.getframerate()
+        return _downmix(_pcm_chunks(wav.readframes, width, channels, rate), rate)
+
+
+def _read_wav_pipe(stream):
+    """Decode a WAV read off a pipe in chunks; ffmpeg cannot go back and fill in its chunk sizes, so read to EOF"""
+    header = stream.read(12)
+    if header[:4] != b'RIFF' or header[8:12] != b'WAVE':
+        raise UnsupportedAudio('ffmpeg did not produce WAV output')
+    fmt = None
+    while True:
+        chunk = stream.read(8)
+        if len(chunk) < 8:
+            raise UnsupportedAudio('no PCM data in ffmpeg output')
+        chunk_id, size = struct.unpack('<4sI', chunk)
+        if chunk_id == b'data':
+            break
+        body = stream.read(size + (size & 1))
+        if chunk_id == b'fmt ' and len(body) >= 16:
+            channels, rate = struct.unpack_from('<HI', body, 2)
+            bits, = struct.unpack_from('<H', body, 14)
+            fmt = (channels, rate, bits // 8)
+    if fmt is None or not fmt[0] or not fmt[1]:
+        raise UnsupportedAudio('no PCM format in ffmpeg output')
+    channels, rate, width = fmt
+    return _downmix(_pcm_chunks(lambda frames: stream.read(frames * channels * width), width, channels, rate), rate)
+
+
+def _decode_ffmpeg(path: Path):
+    binary = _ffmpeg()
+    if binary is None:
+        raise UnsupportedAudio(f'{path.suffix} needs ffmpeg ({FFMPEG_BINARY}), which is not installed')
+    with tempfile.TemporaryFile() as errors:
+        started = time.monotonic()
+        process = subprocess.Popen(
+            [binary, '-nostdin', '-v', 'error', '-i', str(path), '-t', str(MAX_ANALYSIS_SECONDS),
+             '-ar', str(ANALYSIS_SAMPLE_RATE), '-c:a', 'pcm_s16le', '-f', 'wav', '-'],
+            stdout=subprocess.PIPE,
+            stderr=errors,
+        )
+        # A stuck decode is killed; reading then hits end of file
+        watchdog = threading.Timer(_FFMPEG_TIMEOUT_SECONDS, process.kill)
+        watchdog.start()
+        decoded, failure = None, None
+        try:
+            decoded = _read_wav_pipe(process.stdout)
+            # Resampling can leave a few samples past MAX_ANALYSIS_SECONDS; drain them so ffmpeg exits cleanly
+            process.stdout.read()
+        except UnsupportedAudio as e:
+            failure = str(e)
+        finally:
+            watchdog.cancel()
+            if decoded is None:
+                process.kill()
+            process.stdout.close()
+            process.wait()
+        if decoded is not None and process.returncode == 0:
+            return decoded
+        if time.monotonic() - started >= _FFMPEG_TIMEOUT_SECONDS:
+            raise UnsupportedAudio(f'ffmpeg took longer than {_FFMPEG_TIMEOUT_SECONDS}s')
+        errors.seek(0)
+        message = errors.read().decode('utf-8', errors='replace').strip()[:300]
+        raise UnsupportedAudio(message or failure or 'ffmpeg failed')
+
+
+def decode_audio(path: Path):
+    """(mono int16 samples of shape (frames, 1), sample rate, sample peak, K-weighted sub-block energies).
+
+    PCM is read in chunks and capped at MAX_ANALYSIS_SECONDS; see _downmix for what is taken from each chunk.
+    """
+    try:
+        if path.suffix.lower() == '.wav':
+            try:
+                return _decode_wav(path)
+            except wave.Error:
+                pass  # WAV container with a non-PCM codec: let ffmpeg have a go
+        return _decode_ffmpeg(path)
+    except (OSError, EOFError) as e:
+        raise UnsupportedAudio(f'{type(e).__name__}: {e}')
+
+
+def compute_peaks(samples):
+    """Min/max int8 pairs per bin for every PEAK_LEVELS width, as {bins: int8 array of shape (bins, 2)}."""
+    import numpy as np
+
+    if len(samples) == 0:
+        raise UnsupportedAudio('no audio samples decoded')
+    # Envelope over all channels
+    if samples.shape[1] == 1:
+        low = high = samples[:, 0]
+    else:
+        low, high = samples.min(axis=1), samples.max(axis=1)
+    finest = min(PEAK_LEVELS[0], len(samples))
+    # reduceat over bin starts handles lengths that do not divide evenly, without a Python loop
+    edges = np.linspace(0, len(samples), finest + 1).astype(np.int64)[:-1]
+    mins = np.minimum.reduceat(low, edges)
+    maxs = np.maximum.reduceat(high, edges)
+    levels = {}
+    for bins in PEAK_LEVELS:
+        if bins < finest:
+            factor = finest // bins
+            usable = len(mins) // factor * factor
+            mins = mins[:usable].reshape(-1, factor).min(axis=1)
+            maxs = maxs[:usable].reshape(-1, factor).max(axis=1)
+            finest = len(mins)
+        pairs = np.stack([mins, maxs], axis=1).astype(np.int32) >> 8
+        levels[len(pairs)] = pairs.astype(np.int8)
+    return levels
+
+
+def _biquad_power(frequencies, sample_rate: int, b, a):
+    """|H|^2 of a biquad at the given frequencies"""
+    import numpy as np
+
+    z = np.exp(-2j * np.pi * frequencies / sample_rate)
+    response = (b[0] + b[1] * z + b[2] * z * z) / (a[0] + a[1] * z + a[2] * z * z)
+    return np.abs(response) ** 2
+
+
+def _k_weighting_power(frequencies, sample_rate: int):
+    """|H|^2 of the K-weighting filter (pre-filter shelf, then RLB high pass) at the given frequencies"""
+    import numpy as np
+
+    centre, gain_db, q = _K_SHELF
+    k = np.tan(np.pi * centre / sample_rate)
+    vh = 10 ** (gain_db / 20)
+    vb = vh ** 0.4996667741545416
+    a0 = 1 + k / q + k * k
+    shelf = _biquad_power(
+        frequencies, sample_rate,
+        ((vh + vb * k / q + k * k) / a0, 2 * (k * k - vh) / a0, (vh - vb * k / q + k * k) / a0),
+        (1, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0),
+    )
+    cutoff, q = _K_HIGH_PASS
+    k = np.tan(np.pi * cutoff / sample_rate)
+    a0 = 1 + k / q + k * k
+    high_pass = _biquad_power(
+        frequencies, sample_rate,
+        (1, -2, 1),
+        (1, 2 * (k * k - 1) / a0, (1 - k / q + k * k) / a0),
+    )
+    return shelf * high_pass
+
+
+def _sub_block_energies(samples, sample_rate: int):
+    """K-weighted mean square of every 100 ms sub-block, per channel: shape (sub_blocks, channels).
+
+    The filter is applied in the frequency domain (Parseval over each sub-block's real FFT), so the whole
+    track is a handful of batched FFTs instead of a sample-by-sample IIR loop.
+    """
+    import numpy as np
+
+    hop = int(round(sample_rate * _SUB_BLOCK_SECONDS))
+    count = len(samples) // hop
+    if count == 0:
+        return np.empty((0, samples.shape[1]))
+    frames = samples[:count * hop].reshape(count, hop, -1)
+    # Non-DC, non-Nyquist bins stand for two conjugate bins of the full spectrum
+    weights = _k_weighting_power(np.fft.rfftfreq(hop, 1 / sample_rate), sample_rate)
+    weights[1:(hop + 1) // 2] *= 2
+    weights /= hop * hop * 32768.0 ** 2
+    energies = np.empty((count, samples.shape[1]))
+    for start in range(0, count, _FFT_ROWS):
+        block = frames[start:start + _FFT_ROWS].astype(np.float32)
+        spectrum = np.fft.rfft(block, axis=1)
+        energies[start:start + _FFT_ROWS] = np.einsum('k,rkc->rc', weights, spectrum.real ** 2 + spectrum.imag ** 2)
+    return energies
+
+
+def measure_loudness(energies, peak: int) -> dict:
+    """Integrated loudness (LUFS), sample peak (dBFS) and the gain that brings the track to LOUDNESS_TARGET_LUFS.
+
+    Takes the per-channel sub-block energies from _sub_block_energies and the largest absolute sample. Positive
+    gain is capped so the peak stays under LOUDNESS_PEAK_CEILING_DBFS. Loudness and gain are None for tracks
+    too short or too quiet to pass the gates.
+    """
+    import numpy as np
+
+    peak_dbfs = round(20 * math.log10(peak / 32768), 2) if peak else None
+    result = {'integrated_lufs': None, 'peak_dbfs': peak_dbfs, 'gain_db': None}
+
+    if len(energies) < _SUB_BLOCKS_PER_BLOCK:
+        return result
+    # 400 ms blocks overlapping by 75%: windowed sums of four consecutive sub-blocks, summed over channels
+    cumulative = np.concatenate([[0.0], np.cumsum(energies.sum(axis=1))])
+    blocks = (cumulative[_SUB_BLOCKS_PER_BLOCK:] - cumulative[:-_SUB_BLOCKS_PER_BLOCK]) / _SUB_BLOCKS_PER_BLOCK
+    with np.errstate(divide='ignore'):
+        block_lufs = -0.691 + 10 * np.log10(blocks)
+    gated = blocks[block_lufs > _ABSOLUTE_GATE_LUFS]
+    if len(gated) == 0:
+        return result
+    relative_gate = -0.691 + 10 * math.log10(gated.mean()) + _RELATIVE_GATE_LU
+    gated = blocks[(block_lufs > _ABSOLUTE_GATE_LUFS) & (block_lufs > relative_gate)]
+    integrated = -0.691 + 10 * math.log10(gated.mean())
+
+    gain = LOUDNESS_TARGET_LUFS - integrated
+    if gain > 0 and peak_dbfs is not None:
+        gain = max(min(gain, LOUDNESS_PEAK_CEILING_DBFS - peak_dbfs), 0.0)
+    result.update(integrated_lufs=round(integrated, 2), gain_db=round(gain, 2))
+    return result
+
+
+def write_peaks(path: Path, levels, sample_rate: int, duration: float):
+    """Binary layout: header, one uint32 bin count per level, then each level's int8 (min, max) pairs."""
+    import numpy as np
+
+    counts = sorted(levels, reverse=True)
+    tmp = path.with_suffix('.tmp')
+    with open(tmp, 'wb') as f:
+        f.write(_PEAKS_HEADER.pack(_PEAKS_MAGIC, _PEAKS_VERSION, sample_rate, duration, len(counts)))
+        f.write(np.asarray(counts, dtype='<u4').tobytes())
+        for bins in counts:
+            f.write(levels[bins].tobytes())
+    os.replace(tmp, path)
+
+
+def read_peaks(path: Path):
+    """(sample_rate, duration, {bins: int8 array (bins, 2)}) from a .peaks file"""
+    import numpy as np
+
+    data = path.read_bytes()
+    magic, version, sample_rate, duration, count = _PEAKS_HEADER.unpack_from(data)
+    if magic != _PEAKS_MAGIC or version != _PEAKS_VERSION:
+        raise ValueError(f'{path.name} is not a version {_PEAKS_VERSION} peaks file')
+    offset = _PEAKS_HEADER.size
+    counts = np.frombuffer(data, dtype='<u4', count=count, offset=offset)
+    offset += 4 * count
+    levels = {}
+    for bins in counts.tolist():
+        levels[bins] = np.frombuffer(data, dtype=np.int8, count=bins * 2, offset=offset).reshape(bins, 2)
+        offset += bins * 2
+    return sample_rate, duration, levels
+
+
+def _analyse_sync(filename: str) -> dict:
+    """Decode once; write the peaks file and return the loudness row with the fingerprint."""
+    path = UPLOAD_DIR / filename
+    samples, sample_rate, peak, energies = decode_audio(path)
+    duration = len(samples) / sample_rate
+    levels = compute_peaks(samples)
+    ANALYSIS_DIR.mkdir(parents=True, exist_ok=True)
+    write_peaks(peaks_path(filename), levels, sample_rate, duration)
+    return {
+        'filename': filename,
+        'duration': round(duration, 3),
+        'fingerprint': compute_fingerprint(samples, sample_rate),
+        **measure_loudness(energies, peak),
+    }
+
+
+def _db_connect(db_path: Path) -> sqlite3.Connection:
+    conn = sqlite3.connect(str(db_path))
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def init_analysis_db(db_path: Path) -> None:
+    """Create the analysis tables and load the stored loudness and duplicate links of uploads into memory."""
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    with _db_connect(db_path) as conn:
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS upload_analysis (
+                filename TEXT PRIMARY KEY,
+                duration REAL NOT NULL,
+                integrated_lufs REAL,
+                peak_dbfs REAL,
+                gain_db REAL,
+                analysed_at INTEGER NOT NULL
+            )
+            """
+        )
+        init_fingerprint_tables(conn)
+        rows = conn.execute("SELECT filename, integrated_lufs, peak_dbfs, gain_db FROM upload_analysis").fetchall()
+        fingerprints = conn.execute("SELECT filename, duplicate_of, similarity FROM upload_fingerprints").fetchall()
+    _state['db_path'] = db_path
+    _loudness.clear()
+    _loudness.update({row['filename']: _loudness_fields(row) for row in rows})
+    _fingerprinted.clear()
+    _fingerprinted.update(row['filename'] for row in fingerprints)
+    _duplicates.clear()
+    _duplicates.update({row['filename']: _duplicate_fields(row['duplicate_of'], row['similarity'])
+                        for row in fingerprints if row['duplicate_of']})
+    _state['version'] += 1
+
+
+def _loudness_fields(row) -> dict:
+    return {'integrated_lufs': row['integrated_lufs'], 'peak_dbfs': row['peak_dbfs'], 'gain_db': row['gain_db']}
+
+
+def _duplicate_fields(filename: str, similarity: float) -> dict:
+    return {'filename': filename, 'similarity': similarity}
+
+
+def _store_results(db_path: Path, rows: List[dict]) -> Dict[str, tuple]:
+    """Store a batch in one transaction; returns {filename: (original, similarity)} for near-duplicates.
+
+    Rows are matched in order against everything indexed before them, earlier rows of the batch included.
+    """
+    now = int(time.time())
+    duplicates = {}
+    with _db_connect(db_path) as conn:
+        conn.executemany(
+            """
+            INSERT INTO upload_analysis(filename, duration, integrated_lufs, peak_dbfs, gain_db, analysed_at)
+            VALUES(:filename, :duration, :integrated_lufs, :peak_dbfs, :gain_db, :analysed_at)
+            ON CONFLICT(filename) DO UPDATE SET
+                duration=excluded.duration, integrated_lufs=excluded.integrated_lufs,
+                peak_dbfs=excluded.peak_dbfs, gain_db=excluded.gain_db, analysed_at=excluded.analysed_at
+            """,
+            [{**row, 'analysed_at': now} for row in rows],
+        )
+        for row in rows:
+            duplicate = find_duplicate(conn, row['fingerprint'])
+            if duplicate is not None and duplicate[0] != row['filename']:
+                duplicates[row['filename']] = duplicate
+            else:
+                duplicate = None
+            index_fingerprint(conn, row['filename'], row['fingerprint'], duplicate)
+    return duplicates
+
+
+def _forget(db_path: Path, filename: str) -> None:
+    try:
+        with _db_connect(db_path) as conn:
+            conn.execute("DELETE FROM upload_analysis WHERE filename = ?", (filename,))
+            forget_fingerprint(conn, filename)
+    except sqlite3.Error as e:
+        logger.warning(f"Could not drop analysis of {filename}: {e}")
+
+
+def upload_loudness(filename: str) -> Optional[dict]:
+    """{integrated_lufs, peak_dbfs, gain_db} of an analysed upload, or None"""
+    return _loudness.get(filename)
+
+
+def upload_duplicate(filename: str) -> Optional[dict]:
+    """{filename, similarity} of the earlier upload this one is a near-duplicate of, or None"""
+    return _duplicates.get(filename)
+
+
+def analysis_version() -> int:
+    return _state['version']
+
+
+def _queue() -> asyncio.Queue:
+    if _state['queue'] is None:
+        _state['queue'] = asyncio.Queue()
+    return _state['queue']
+
+
+def schedule_analysis(filename: str) -> asyncio.Future:
+    """Queue an uploaded file for analysis (once); the future resolves when it is done or has failed."""
+    pending = _pending.get(filename)
+    if pending is None:
+        pending = _pending[filename] = asyncio.get_running_loop().create_future()
+        _failed.pop(filename, None)
+        _queue().put_nowait(filename)
+    return pending
+
+
+def analysis_backlog() -> int:
+    """Files queued for or in analysis"""
+    return len(_pending)
+
+
+def analysis_status(filename: str) -> str:
+    """'ready', 'pending', 'failed' or 'missing'"""
+    if filename in _pending:
+        return 'pending'
+    if filename in _failed:
+        return 'failed'
+    return 'ready' if filename in _loudness and peaks_path(filename).exists() else 'missing'
+
+
+def analysis_error(filename: str) -> Optional[str]:
+    return _failed.get(filename)
+
+
+def remove_analysis(filename: str):
+    """Forget a deleted upload's results; the database row goes in a worker thread."""
+    _failed.pop(filename, None)
+    peaks_path(filename).unlink(missing_ok=True)
+    _fingerprinted.discard(filename)
+    _loudness.pop(filename, None)
+    _duplicates.pop(filename, None)
+    # Copies of it are no longer duplicates of anything in the library
+    for name in [name for name, duplicate in _duplicates.items() if duplicate['filename'] == filename]:
+        del _duplicates[name]
+    _state['version'] += 1
+    if _state['db_path'] is not None:
+        task = asyncio.ensure_future(asyncio.to_thread(_forget, _state['db_path'], filename))
+        _pending_writes.add(task)
+        task.add_done_callback(_pending_writes.discard)
+
+
+async def _analyse(filename: str, slots: asyncio.Semaphore) -> Optional[dict]:
+    loop = asyncio.get_running_loop()
+    async with slots:
+        start = loop.time()
+        try:
+            if (UPLOAD_DIR / filename).exists():
+                row = await asyncio.to_thread(_analyse_sync, filename)
+                ANALYSES.labels('ok').inc()
+                return row
+        except UnsupportedAudio as e:
+            ANALYSES.labels('unsupported').inc()
+            _failed[filename] = str(e)
+            logger.info(f"Skipping analysis of {filename}: {e}")
+        except Exception as e:
+            ANALYSES.labels('error').inc()
+            _failed[filename] = f'{type(e).__name__}: {e}'
+            logger.error(f"Analysis of {filename} failed: {e}")
+        finally:
+            ANALYSIS_DURATION.observe(loop.time() - start)
+    return None
+
+
+async def _store_analysed(results: List[Optional[dict]]):
+    """Store analysed rows in one transaction (one /library change) and mirror them in memory."""
+    rows = []
+    for row in results:
+        if row is None:
+            continue
+        if (UPLOAD_DIR / row['filename']).exists():
+            rows.append(row)
+        else:
+            # Deleted while it was being analysed
+            peaks_path(row['filename']).unlink(missing_ok=True)
+    if not rows:
+        return
+    try:
+        duplicates = {}
+        if _state['db_path'] is not None:
+            duplicates = await asyncio.to_thread(_store_results, _state['db_path'], rows)
+            _fingerprinted.update(row['filename'] for row in rows)
+        for row in rows:
+            _loudness[row['filename']] = _loudness_fields(row)
+            _duplicates.pop(row['filename'], None)
+        for filename, (original, similarity) in duplicates.items():
+            _duplicates[filename] = _duplicate_fields(original, similarity)
+            DUPLICATES.inc()
+            logger.info(f"Upload {filename} is a near-duplicate of {original} (similarity {similarity})")
+        _state['version'] += 1
+    except Exception as e:
+        logger.error(f"Storing analysis results failed: {e}")
+        for row in rows:
+            _failed.setdefault(row['filename'], f'{type(e).__name__}: {e}')
+
+
+def _resolve(filenames):
+    for filename in filenames:
+        pending = _pending.pop(filename, None)
+        if pending is not None and not pending.done():
+            pending.set_result(None)
+
+
+async def _analyse_batch(batch: List[str], slots: asyncio.Semaphore):
+    """Analyse files concurrently, storing them as they finish.
+
+    Rows that finish while the previous write is running are stored together in one transaction, so a backfill
+    still changes /library about once per write rather than per file, and each file's future resolves as soon
+    as its own row is stored.
+    """
+    tasks = {asyncio.ensure_future(_analyse(f, slots)): f for f in batch}
+    running = set(tasks)
+    try:
+        while running:
+            done, running = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            await _store_analysed([task.result() for task in done])
+            _resolve(tasks[task] for task in done)
+    finally:
+        for task in running:
+            task.cancel()
+        _resolve(batch)
+
+
+def _unanalysed_uploads():
+    if not UPLOAD_DIR.exists():
+        return []
+    return [p.name for p in UPLOAD_DIR.iterdir()
+            if p.is_file() and p.suffix.lower() in ALLOWED_EXTENSIONS
+            and (p.name not in _loudness or p.name not in _fingerprinted or not peaks_path(p.name).exists())]
+
+
+async def run_analysis_worker():
+    """Background task started by the app lifespan: backfills uploads without results, then serves the queue.
+
+    Files are taken off the queue up to ANALYSIS_BATCH_SIZE at a time and decoded ANALYSIS_CONCURRENCY at once.
+    """
+    for filename in await asyncio.to_thread(_unanalysed_uploads):
+        schedule_analysis(filename)
+    queue = _queue()
+    slots = asyncio.Semaphore(max(ANALYSIS_CONCURRENCY, 1))
+    while True:
+        batch = [await queue.get()]
+        while len(batch) < ANALYSIS_BATCH_SIZE and not queue.empty():
+            batch.append(queue.get_nowait())
+        await _analyse_batch(batch, slots)
@@ -7,7 +7,17 @@ import sqlite3
 import time
 from dataclasses import dataclass
 from pathlib import Path
-from typing import List, Optional
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Deletions are remembered this long for delta sync; clients syncing from older versions get a full list
+TOMBSTONE_RETENTION_SECONDS = 60 * 60 * 24 * 30
+MAX_BATCH_OPERATIONS = 500
+MAX_PAGE_SIZE = 200
+SAVED_TRACK_FIELDS = ('track_id', 'source', 'title', 'artist', 'thumbnail', 'created_at')
+# Sessions this process has seen to be valid, token -> (user id, expires_at), so the rate limiter can key a
+# request by account without a database lookup; the oldest entry goes once the map is full
+MAX_KNOWN_SESSIONS = 10000
+_known_sessions: Dict[str, Tuple[int, int]] = {}
 
 
 @dataclass(frozen=True)
@@ -64,6 +74,39 @@ def init_auth_db(db_path: Path) -> None:
             )
             """
         )
+        columns = {r["name"] for r in conn.execute("PRAGMA table_info(saved_tracks)")}
+        if "version" not in columns:
+            conn.execute("ALTER TABLE saved_tracks ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+        # Covering index for keyset pages; thumbnail is left out so list views never touch the table
+        conn.execute(
+            """
+            CREATE INDEX IF NOT EXISTS idx_saved_tracks_user_page
+            ON saved_tracks(user_id, created_at DESC, id DESC, version, track_id, source, title, artist)
+            """
+        )
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS library_versions (
+                user_id INTEGER PRIMARY KEY,
+                version INTEGER NOT NULL,
+                pruned_version INTEGER NOT NULL DEFAULT 0,
+                FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE
+            )
+            """
+        )
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS saved_track_tombstones (
+                user_id INTEGER NOT NULL,
+                track_id TEXT NOT NULL,
+                source TEXT NOT NULL,
+                version INTEGER NOT NULL,
+                deleted_at INTEGER NOT NULL,
+                PRIMARY KEY(user_id, track_id, source),
+                FOREIGN KEY(user_id) REFERENCES users(id) ON DELETE CASCADE
+            )
+            """
+        )
 
 
 def _pbkdf2_hash(password: str, salt: bytes) -> bytes:
@@ -133,10 +176,12 @@ def create_session(db_path: Path, user_id: int, ttl_seconds: int = 60 * 60 * 24
             (token, user_id, expires_at, now),
         )
 
+    _remember_session(token, user_id, expires_at)
     return token
 
 
 def delete_session(db_path: Path, token: str) -> None:
+    _known_sessions.pop(token, None)
     with _db_connect(db_path) as conn:
         conn.execute("DELETE FROM sessions WHERE token = ?", (token,))
 
@@ -162,35 +207,247 @@ def get_user_by_token(db_path: Path, token: str) -> Optional[AuthUser]:
             return None
 
         if int(row["expires_at"]) < now:
+            _known_sessions.pop(token, None)
             conn.execute("DELETE FROM sessions WHERE token = ?", (token,))
             return None
 
+        _remember_session(token, int(row["id"]), int(row["expires_at"]))
         return AuthUser(id=int(row["id"]), username=row["username"])
 
 
-def list_saved_tracks(db_path: Path, user_id: int) -> List[dict]:
+def _remember_session(token: str, user_id: int, expires_at: int) -> None:
+    if token not in _known_sessions and len(_known_sessions) >= MAX_KNOWN_SESSIONS:
+        _known_sessions.pop(next(iter(_known_sessions)), None)
+    _known_sessions[token] = (user_id, expires_at)
+
+
+def known_session_user(token: str) -> Optional[int]:
+    """User id of a session already verified by this process, or None; never touches the database."""
+    entry = _known_sessions.get(token)
+    if entry is None:
+        return None
+    if entry[1] < time.time():
+        _known_sessions.pop(token, None)
+        return None
+    return entry[0]
+
+
+def _library_version_row(conn: sqlite3.Connection, user_id: int) -> sqlite3.Row:
+    return conn.execute(
+        "SELECT version, pruned_version FROM library_versions WHERE user_id = ?",
+        (user_id,),
+    ).fetchone()
+
+
+def _bump_library_version(conn: sqlite3.Connection, user_id: int) -> int:
+    conn.execute(
+        """
+        INSERT INTO library_versions(user_id, version, pruned_version) VALUES(?, 1, 0)
+        ON CONFLICT(user_id) DO UPDATE SET version = version + 1
+        """,
+        (user_id,),
+    )
+    return int(_library_version_row(conn, user_id)["version"])
+
+
+def _prune_tombstones(conn: sqlite3.Connection, user_id: int, now: int) -> None:
+    cutoff = now - TOMBSTONE_RETENTION_SECONDS
+    row = conn.execute(
+        "SELECT MAX(version) AS v FROM saved_track_tombstones WHERE user_id = ? AND deleted_at < ?",
+        (user_id, cutoff),
+    ).fetchone()
+    if row["v"] is None:
+        return
+    conn.execute(
+        "DELETE FROM saved_track_tombstones WHERE user_id = ? AND deleted_at < ?",
+        (user_id, cutoff),
+    )
+    conn.execute(
+        "UPDATE library_versions SET pruned_version = MAX(pruned_version, ?) WHERE user_id = ?",
+        (int(row["v"]), user_id),
+    )
+
+
+def _normalize_save(track: dict) -> dict:
+    track_id = (track.get('track_id') or '').strip()
+    source = (track.get('source') or '').strip()
+    title = (track.get('title') or '').strip()
+    if not track_id or not source or not title:
+        raise ValueError('track_id, source and title are required')
+    if source not in ('youtube', 'local'):
+        raise ValueError('Invalid source')
+    return {
+        'track_id': track_id,
+        'source': source,
+        'title': title,
+        'artist': track.get('artist'),
+        'thumbnail': track.get('thumbnail'),
+    }
+
+
+def _normalize_remove(track: dict) -> dict:
+    track_id = (track.get('track_id') or '').strip()
+    source = (track.get('source') or '').strip()
+    if not track_id or not source:
+        raise ValueError('track_id and source are required')
+    return {'track_id': track_id, 'source': source}
+
+
+def _apply_changes(conn: sqlite3.Connection, user_id: int, saves: List[dict], removes: List[dict]) -> int:
+    now = int(time.time())
+    version = _bump_library_version(conn, user_id)
+    if saves:
+        conn.executemany(
+            """
+            INSERT INTO saved_tracks(user_id, track_id, source, title, artist, thumbnail, created_at, version)
+            VALUES(?,?,?,?,?,?,?,?)
+            ON CONFLICT(user_id, track_id, source) DO UPDATE SET
+                title=excluded.title,
+                artist=excluded.artist,
+                thumbnail=excluded.thumbnail,
+                version=excluded.version
+            """,
+            [(user_id, t['track_id'], t['source'], t['title'], t['artist'], t['thumbnail'], now, version) for t in saves],
+        )
+        conn.executemany(
+            "DELETE FROM saved_track_tombstones WHERE user_id = ? AND track_id = ? AND source = ?",
+            [(user_id, t['track_id'], t['source']) for t in saves],
+        )
+    for t in removes:
+        cur = conn.execute(
+            "DELETE FROM saved_tracks WHERE user_id = ? AND track_id = ? AND source = ?",
+            (user_id, t['track_id'], t['source']),
+        )
+        if cur.rowcount:
+            conn.execute(
+                """
+                INSERT INTO saved_track_tombstones(user_id, track_id, source, version, deleted_at)
+                VALUES(?,?,?,?,?)
+                ON CONFLICT(user_id, track_id, source) DO UPDATE SET
+                    version=excluded.version,
+                    deleted_at=excluded.deleted_at
+                """,
+                (user_id, t['track_id'], t['source'], version, now),
+            )
+    if removes:
+        _prune_tombstones(conn, user_id, now)
+    return version
+
+
+def get_library_version(db_path: Path, user_id: int) -> int:
+    with _db_connect(db_path) as conn:
+        row = _library_version_row(conn, user_id)
+    return int(row["version"]) if row else 0
+
+
+def _encode_cursor(created_at: int, row_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{created_at}:{row_id}".encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str) -> Tuple[int, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, row_id = raw.split(":")
+        return int(created_at), int(row_id)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid cursor")
+
+
+def _resolve_fields(fields: Optional[Iterable[str]]) -> Tuple[str, ...]:
+    if not fields:
+        return SAVED_TRACK_FIELDS
+    requested = set(fields)
+    unknown = requested - set(SAVED_TRACK_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+    # track_id and source identify a track, so they are always returned
+    requested.update(('track_id', 'source'))
+    return tuple(f for f in SAVED_TRACK_FIELDS if f in requested)
+
+
+def _select_saved_tracks(
+    conn: sqlite3.Connection,
+    user_id: int,
+    *,
+    after_version: int = -1,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    fields: Optional[Iterable[str]] = None,
+) -> Tuple[List[dict], Optional[str]]:
+    """Newest-first keyset page over (created_at, id), served from idx_saved_tracks_user_page."""
+    columns = _resolve_fields(fields)
+    sql = f"SELECT id AS _id, created_at AS _created_at, {', '.join(columns)} FROM saved_tracks WHERE user_id = ? AND version > ?"
+    params: list = [user_id, after_version]
+    if cursor:
+        sql += " AND (created_at, id) < (?, ?)"
+        params.extend(_decode_cursor(cursor))
+    sql += " ORDER BY created_at DESC, id DESC"
+    if limit is not None:
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        sql += " LIMIT ?"
+        params.append(limit + 1)
+
+    rows = conn.execute(sql, params).fetchall()
+    next_cursor = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = _encode_cursor(rows[-1]["_created_at"], rows[-1]["_id"])
+    return [{f: r[f] for f in columns} for r in rows], next_cursor
+
+
+def list_saved_tracks(
+    db_path: Path,
+    user_id: int,
+    *,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    fields: Optional[Iterable[str]] = None,
+) -> Dict:
+    """Saved tracks, newest first. Without ``limit`` every track is returned in one page."""
+    with _db_connect(db_path) as conn:
+        tracks, next_cursor = _select_saved_tracks(conn, user_id, limit=limit, cursor=cursor, fields=fields)
+    return {'tracks': tracks, 'next_cursor': next_cursor}
+
+
+def list_library_changes(
+    db_path: Path,
+    user_id: int,
+    since: int,
+    *,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    fields: Optional[Iterable[str]] = None,
+) -> Dict:
+    """Tracks saved/updated and tracks removed after library version ``since``.
+
+    ``full`` is True when the caller must replace its copy instead of merging: a first sync
+    (``since`` <= 0) or a ``since`` older than the tombstones still retained. Deletions are
+    only reported on the first page (no ``cursor``).
+    """
     with _db_connect(db_path) as conn:
-        rows = conn.execute(
+        version_row = _library_version_row(conn, user_id)
+        version = int(version_row["version"]) if version_row else 0
+        pruned_version = int(version_row["pruned_version"]) if version_row else 0
+        full = since <= 0 or since < pruned_version or since > version
+        tracks, next_cursor = _select_saved_tracks(
+            conn, user_id, after_version=-1 if full else since, limit=limit, cursor=cursor, fields=fields,
+        )
+        deleted = [] if full or cursor else conn.execute(
             """
-            SELECT track_id, source, title, artist, thumbnail, created_at
-            FROM saved_tracks
-            WHERE user_id = ?
-            ORDER BY created_at DESC
+            SELECT track_id, source
+            FROM saved_track_tombstones
+            WHERE user_id = ? AND version > ?
             """,
-            (user_id,),
+            (user_id, since),
         ).fetchall()
 
-    return [
-        {
-            'track_id': r['track_id'],
-            'source': r['source'],
-            'title': r['title'],
-            'artist': r['artist'],
-            'thumbnail': r['thumbnail'],
-            'created_at': r['created_at'],
-        }
-        for r in rows
-    ]
+    return {
+        'tracks': tracks,
+        'next_cursor': next_cursor,
+        'deleted': [{'track_id': r['track_id'], 'source': r['source']} for r in deleted],
+        'version': version,
+        'full': full,
+    }
 
 
 def save_track(
@@ -202,38 +459,27 @@ def save_track(
     title: str,
     artist: Optional[str] = None,
     thumbnail: Optional[str] = None,
-) -> None:
-    track_id = (track_id or '').strip()
-    source = (source or '').strip()
-    title = (title or '').strip()
-    if not track_id or not source or not title:
-        raise ValueError('track_id, source and title are required')
-    if source not in ('youtube', 'local'):
-        raise ValueError('Invalid source')
-
-    now = int(time.time())
+) -> int:
+    track = _normalize_save({
+        'track_id': track_id, 'source': source, 'title': title, 'artist': artist, 'thumbnail': thumbnail,
+    })
     with _db_connect(db_path) as conn:
-        conn.execute(
-            """
-            INSERT INTO saved_tracks(user_id, track_id, source, title, artist, thumbnail, created_at)
-            VALUES(?,?,?,?,?,?,?)
-            ON CONFLICT(user_id, track_id, source) DO UPDATE SET
-                title=excluded.title,
-                artist=excluded.artist,
-                thumbnail=excluded.thumbnail
-            """,
-            (user_id, track_id, source, title, artist, thumbnail, now),
-        )
+        return _apply_changes(conn, user_id, [track], [])
 
 
-def remove_track(db_path: Path, user_id: int, *, track_id: str, source: str) -> None:
-    track_id = (track_id or '').strip()
-    source = (source or '').strip()
-    if not track_id or not source:
-        raise ValueError('track_id and source are required')
+def remove_track(db_path: Path, user_id: int, *, track_id: str, source: str) -> int:
+    track = _normalize_remove({'track_id': track_id, 'source': source})
+    with _db_connect(db_path) as conn:
+        return _apply_changes(conn, user_id, [], [track])
+
 
+def apply_library_batch(db_path: Path, user_id: int, saves: Iterable[dict], removes: Iterable[dict]) -> int:
+    """Apply many saves, then many removes, in one transaction; returns the new library version."""
+    saves = [_normalize_save(t) for t in saves]
+    removes = [_normalize_remove(t) for t in removes]
+    if len(saves) + len(removes) > MAX_BATCH_OPERATIONS:
+        raise ValueError(f'At most {MAX_BATCH_OPERATIONS} operations per batch')
+    if not saves and not removes:
+        return get_library_version(db_path, user_id)
     with _db_connect(db_path) as conn:
-        conn.execute(
-            "DELETE FROM saved_tracks WHERE user_id = ? AND track_id = ? AND source = ?",
-            (user_id, track_id, source),
-        )
+        return _apply_changes(conn, user_id, saves, removes)
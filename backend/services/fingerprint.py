@@ -0,0 +1,174 @@
+import sqlite3
+from collections import Counter
+from typing import Optional, Tuple
+
+from ..core.config import DUPLICATE_MAX_BIT_ERROR_RATE
+
+# Haitsma-Kalker style fingerprint: one 32-bit sub-fingerprint per 46 ms frame, each bit the sign of the
+# change over time of the energy difference between two adjacent bands (33 log-spaced bands, 300-2000 Hz).
+# The bits survive re-encoding, bitrate changes and resampling, so copies of a track differ in few of them.
+FINGERPRINT_RATE = 5512
+FINGERPRINT_SECONDS = 180
+_FRAME = 2048  # 0.37 s
+_HOP = 256  # 46 ms
+_BAND_EDGES_HZ = (300.0, 2000.0)
+_BANDS = 33
+# Frames transformed per FFT call, bounding temporaries
+_FFT_ROWS = 1024
+# Every STRIDE-th sub-fingerprint of a track goes into the lookup index; queries use all of theirs, so an
+# alignment still finds seeds while the index holds a quarter of the rows
+_INDEX_STRIDE = 4
+_MIN_SEEDS = 3
+_CANDIDATES = 5
+_MIN_OVERLAP_FRAMES = 64
+# All bits equal: silence or a flat spectrum, shared by unrelated tracks
+_DEGENERATE = (0, 0xFFFFFFFF)
+_QUERY_CHUNK = 500
+
+
+def compute_fingerprint(samples, sample_rate: int):
+    """uint32 sub-fingerprints of (at most) the first FINGERPRINT_SECONDS of int16 samples (frames, channels)."""
+    import numpy as np
+
+    mono = samples[:sample_rate * FINGERPRINT_SECONDS].astype(np.float32).mean(axis=1)
+    length = int(len(mono) * FINGERPRINT_RATE / sample_rate)
+    if length < _FRAME + 2 * _HOP:
+        return np.empty(0, dtype=np.uint32)
+    # Truncating the spectrum low-passes and resamples in one step, so every source rate gives the same frames
+    signal = np.fft.irfft(np.fft.rfft(mono), length).astype(np.float32)
+
+    frequencies = np.fft.rfftfreq(_FRAME, 1 / FINGERPRINT_RATE)
+    edges = np.geomspace(*_BAND_EDGES_HZ, _BANDS + 1)
+    band = np.digitize(frequencies, edges) - 1
+    in_range = (band >= 0) & (band < _BANDS)
+    bands = np.zeros((len(frequencies), _BANDS), dtype=np.float32)
+    bands[np.nonzero(in_range)[0], band[in_range]] = 1
+
+    frames = np.lib.stride_tricks.sliding_window_view(signal, _FRAME)[::_HOP]
+    window = np.hanning(_FRAME).astype(np.float32)
+    energies = np.empty((len(frames), _BANDS), dtype=np.float32)
+    for start in range(0, len(frames), _FFT_ROWS):
+        spectrum = np.fft.rfft(frames[start:start + _FFT_ROWS] * window, axis=1)
+        energies[start:start + _FFT_ROWS] = (spectrum.real ** 2 + spectrum.imag ** 2) @ bands
+
+    differences = energies[:, :-1] - energies[:, 1:]
+    bits = (differences[1:] - differences[:-1]) > 0
+    return np.packbits(bits, axis=1, bitorder='little').view('<u4').ravel().astype(np.uint32)
+
+
+def bit_error_rate(query, candidate, offset: int) -> Optional[float]:
+    """Fraction of differing bits where candidate frame i + offset lines up with query frame i"""
+    import numpy as np
+
+    if offset >= 0:
+        query, candidate = query, candidate[offset:]
+    else:
+        query = query[-offset:]
+    overlap = min(len(query), len(candidate))
+    if overlap < _MIN_OVERLAP_FRAMES:
+        return None
+    return float(np.bitwise_count(query[:overlap] ^ candidate[:overlap]).sum()) / (32 * overlap)
+
+
+def init_fingerprint_tables(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS upload_fingerprints (
+            filename TEXT PRIMARY KEY,
+            fingerprint BLOB NOT NULL,
+            duplicate_of TEXT,
+            similarity REAL
+        )
+        """
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS fingerprint_hashes (
+            hash INTEGER NOT NULL,
+            filename TEXT NOT NULL,
+            frame INTEGER NOT NULL
+        )
+        """
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_fingerprint_hashes_hash ON fingerprint_hashes(hash)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_fingerprint_hashes_filename ON fingerprint_hashes(filename)")
+
+
+def _load(conn: sqlite3.Connection, filename: str):
+    import numpy as np
+
+    row = conn.execute(
+        "SELECT fingerprint, duplicate_of FROM upload_fingerprints WHERE filename = ?", (filename,)
+    ).fetchone()
+    if row is None:
+        return None, None
+    return np.frombuffer(row[0], dtype='<u4'), row[1]
+
+
+def find_duplicate(conn: sqlite3.Connection, fingerprint) -> Optional[Tuple[str, float]]:
+    """(filename, similarity) of the indexed upload that fingerprint is a copy of, or None.
+
+    Exact sub-fingerprint matches are looked up as seeds; the offsets they imply vote for an alignment per
+    candidate, and only the best few candidates are compared bit by bit at that alignment.
+    """
+    import numpy as np
+
+    if len(fingerprint) < _MIN_OVERLAP_FRAMES:
+        return None
+    hashes, first_frames = np.unique(fingerprint, return_index=True)
+    keep = ~np.isin(hashes, _DEGENERATE)
+    positions = dict(zip(hashes[keep].tolist(), first_frames[keep].tolist()))
+    votes = Counter()
+    keys = list(positions)
+    for start in range(0, len(keys), _QUERY_CHUNK):
+        chunk = keys[start:start + _QUERY_CHUNK]
+        for filename, value, frame in conn.execute(
+            f"SELECT filename, hash, frame FROM fingerprint_hashes WHERE hash IN ({','.join('?' * len(chunk))})",
+            chunk,
+        ):
+            votes[(filename, frame - positions[value])] += 1
+
+    checked = set()
+    for (filename, offset), seeds in votes.most_common():
+        if seeds < _MIN_SEEDS or len(checked) >= _CANDIDATES:
+            break
+        if filename in checked:
+            continue
+        checked.add(filename)
+        candidate, duplicate_of = _load(conn, filename)
+        if candidate is None:
+            continue
+        rates = [r for r in (bit_error_rate(fingerprint, candidate, offset + d) for d in (-1, 0, 1)) if r is not None]
+        if rates and min(rates) <= DUPLICATE_MAX_BIT_ERROR_RATE:
+            # Link copies of a copy to the first upload of the track
+            return duplicate_of or filename, round(1 - min(rates), 3)
+    return None
+
+
+def index_fingerprint(conn: sqlite3.Connection, filename: str, fingerprint,
+                      duplicate: Optional[Tuple[str, float]] = None) -> None:
+    duplicate_of, similarity = duplicate or (None, None)
+    _drop(conn, filename)
+    conn.execute(
+        "INSERT INTO upload_fingerprints(filename, fingerprint, duplicate_of, similarity) VALUES(?,?,?,?)",
+        (filename, fingerprint.astype('<u4').tobytes(), duplicate_of, similarity),
+    )
+    conn.executemany(
+        "INSERT INTO fingerprint_hashes(hash, filename, frame) VALUES(?,?,?)",
+        [(value, filename, frame)
+         for frame, value in enumerate(fingerprint.tolist())
+         if frame % _INDEX_STRIDE == 0 and value not in _DEGENERATE],
+    )
+
+
+def _drop(conn: sqlite3.Connection, filename: str) -> None:
+    conn.execute("DELETE FROM fingerprint_hashes WHERE filename = ?", (filename,))
+    conn.execute("DELETE FROM upload_fingerprints WHERE filename = ?", (filename,))
+
+
+def forget_fingerprint(conn: sqlite3.Connection, filename: str) -> None:
+    """Drop a deleted file's fingerprint; uploads linked to it as their original are no longer flagged."""
+    _drop(conn, filename)
+    conn.execute(
+        "UPDATE upload_fingerprints SET duplicate_of = NULL, similarity = NULL WHERE duplicate_of = ?", (filename,)
+    )
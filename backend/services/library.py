@@ -0,0 +1,75 @@
+import logging
+
+from ..core.config import UPLOAD_DIR, ALLOWED_EXTENSIONS
+from ..core.http_cache import PROCESS_TAG, make_etag
+from ..core.serialization import dumps
+from .audio_analysis import analysis_version, upload_duplicate, upload_loudness
+
+logger = logging.getLogger(__name__)
+
+# Version of the uploads directory listing. Bumped by our own uploads/deletes and whenever the
+# directory mtime moves (files added or removed behind our back), or background analysis stores new
+# loudness values or duplicate links, so reads stay a single stat().
+_index = {
+    'version': 0,
+    'dir_mtime_ns': None,
+    'analysis_version': None,
+    'body': None,
+    'body_version': -1,
+}
+
+
+def invalidate_library():
+    """Mark the cached listing stale after a file in UPLOAD_DIR was added or removed."""
+    _index['version'] += 1
+
+
+def library_version() -> int:
+    try:
+        mtime_ns = UPLOAD_DIR.stat().st_mtime_ns
+    except FileNotFoundError:
+        mtime_ns = None
+    if mtime_ns != _index['dir_mtime_ns']:
+        _index['dir_mtime_ns'] = mtime_ns
+        _index['version'] += 1
+    if analysis_version() != _index['analysis_version']:
+        _index['analysis_version'] = analysis_version()
+        _index['version'] += 1
+    return _index['version']
+
+
+def library_etag() -> str:
+    return make_etag('library', PROCESS_TAG, library_version())
+
+
+def _scan_library() -> list:
+    songs = []
+    if UPLOAD_DIR.exists():
+        for file_path in UPLOAD_DIR.iterdir():
+            if file_path.is_file() and file_path.suffix.lower() in ALLOWED_EXTENSIONS:
+                stat = file_path.stat()
+                songs.append({
+                    'id': file_path.name,
+                    'filename': file_path.name,
+                    'original_name': file_path.stem,
+                    'size': stat.st_size,
+                    'modified': stat.st_mtime,
+                    'url': f'/songs/{file_path.name}',
+                    'source': 'local',
+                    # None until the background analysis has measured it
+                    'loudness': upload_loudness(file_path.name),
+                    # {filename, similarity} of the earlier upload this is a re-encode of, if any
+                    'duplicate_of': upload_duplicate(file_path.name),
+                })
+    songs.sort(key=lambda x: x['modified'], reverse=True)
+    return songs
+
+
+def library_snapshot():
+    """(etag, body) of the /library response, rescanned only when the version moved."""
+    version = library_version()
+    if _index['body_version'] != version:
+        songs = _scan_library()
+        _index['body'] = dumps({'songs': songs, 'total': len(songs)})
+        _index['body_version'] = version
+    return make_etag('library', PROCESS_TAG, version), _index['body']
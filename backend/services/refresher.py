@@ -0,0 +1,108 @@
+import asyncio
+import logging
+import time
+from typing import Dict, Optional, Set
+
+from ..core.config import (
+    STREAM_REFRESH_INTERVAL_SECONDS, STREAM_REFRESH_LEAD_SECONDS, STREAM_IN_USE_GRACE_SECONDS,
+)
+from ..core.metrics import CallbackGauge, Counter
+from ..models.schemas import ErrorResponse
+from .rooms import active_rooms
+from .youtube import get_stream_url_service, prune_stream_cache, stream_fresh_until
+
+logger = logging.getLogger(__name__)
+
+# Videos /stream is relaying right now, and when each was last relayed (epoch seconds)
+open_streams: Dict[str, int] = {}
+last_streamed: Dict[str, float] = {}
+# Videos whose refresh failed, not retried before the stored time
+_retry_after: Dict[str, float] = {}
+_wake = asyncio.Event()
+
+STREAM_REFRESHES = Counter('voxwave_stream_url_refreshes_total', 'Background stream URL re-resolutions', ('result',))
+CallbackGauge('voxwave_stream_videos_in_use', 'Videos whose stream URL the refresher keeps warm',
+              lambda: len(videos_in_use()))
+
+
+def stream_opened(video_id: str):
+    open_streams[video_id] = open_streams.get(video_id, 0) + 1
+    last_streamed[video_id] = time.time()
+
+
+def stream_closed(video_id: str):
+    remaining = open_streams.get(video_id, 0) - 1
+    if remaining > 0:
+        open_streams[video_id] = remaining
+    else:
+        open_streams.pop(video_id, None)
+    last_streamed[video_id] = time.time()
+
+
+def wake_refresher():
+    """Run a refresh pass now, e.g. right after a room switched songs."""
+    _wake.set()
+
+
+def _song_video_id(song) -> Optional[str]:
+    if not isinstance(song, dict) or song.get('source', 'youtube') != 'youtube':
+        return None
+    song_id = str(song.get('id') or '')
+    # The frontend ids YouTube tracks as "yt-<video id>"
+    if song_id.startswith('yt-'):
+        song_id = song_id[3:]
+    return song_id if len(song_id) == 11 else None
+
+
+def videos_in_use(now: float = None) -> Set[str]:
+    now = time.time() if now is None else now
+    videos = set(open_streams)
+    videos.update(v for v, seen in last_streamed.items() if now - seen < STREAM_IN_USE_GRACE_SECONDS)
+    for room in active_rooms.values():
+        video_id = _song_video_id(room.get('current_song'))
+        if video_id:
+            videos.add(video_id)
+    return videos
+
+
+async def _refresh(video_id: str, now: float):
+    result = await get_stream_url_service(video_id, force_refresh=True)
+    if isinstance(result, ErrorResponse):
+        STREAM_REFRESHES.labels('error').inc()
+        _retry_after[video_id] = now + STREAM_REFRESH_LEAD_SECONDS / 2
+        logger.warning(f"Stream URL refresh failed for {video_id}: {result.detail}")
+    else:
+        STREAM_REFRESHES.labels('ok').inc()
+        _retry_after.pop(video_id, None)
+
+
+async def refresh_tick():
+    """Re-resolve in-use videos whose cached URL goes stale within the lead time."""
+    now = time.time()
+    for video_id in [v for v, seen in last_streamed.items()
+                     if v not in open_streams and now - seen >= STREAM_IN_USE_GRACE_SECONDS]:
+        del last_streamed[video_id]
+    for video_id in [v for v, at in _retry_after.items() if at <= now]:
+        del _retry_after[video_id]
+    prune_stream_cache(now)
+
+    due = [v for v in videos_in_use(now)
+           if v not in _retry_after and stream_fresh_until(v) - now < STREAM_REFRESH_LEAD_SECONDS]
+    if due:
+        await asyncio.gather(*(_refresh(v, now) for v in due))
+
+
+async def run_refresher():
+    """Background loop started by the app lifespan."""
+    while True:
+        try:
+            await asyncio.wait_for(_wake.wait(), timeout=STREAM_REFRESH_INTERVAL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+        _wake.clear()
+        try:
+            await refresh_tick()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Stream URL refresher failed: {e}")
@@ -1,40 +1,155 @@
+import asyncio
+import logging
+import time
 from datetime import datetime
 from fastapi import WebSocket
 import json
 from typing import Dict, List
+from ..core.config import ROOM_HEARTBEAT_INTERVAL_SECONDS, ROOM_HEARTBEAT_TIMEOUT_SECONDS, ROOM_EMPTY_GRACE_SECONDS
+from ..core.metrics import CallbackGauge, Counter
 from ..models.schemas import RoomInfo
 
+logger = logging.getLogger(__name__)
+
 # In-memory storage
 active_rooms: Dict[str, Dict] = {}
 room_connections: Dict[str, List[WebSocket]] = {}
 
+# Liveness bookkeeping (monotonic seconds), kept out of active_rooms so it is never sent to clients
+connection_last_seen: Dict[WebSocket, float] = {}
+room_empty_since: Dict[str, float] = {}
+
+CallbackGauge('voxwave_rooms', 'Active listening rooms', lambda: len(active_rooms))
+CallbackGauge('voxwave_room_connections', 'Open room WebSockets (hosts and listeners)',
+              lambda: sum(len(c) for c in room_connections.values()))
+CallbackGauge('voxwave_rooms_empty', 'Rooms with no connections awaiting expiry', lambda: len(room_empty_since))
+ROOM_EVICTIONS = Counter('voxwave_room_evictions_total', 'Room connections and rooms removed by the reaper', ('kind',))
+
+def register_room(room_id: str, room: dict):
+    active_rooms[room_id] = room
+    room_connections[room_id] = []
+    # A room nobody joins is reaped after the same grace period as one everybody left
+    room_empty_since[room_id] = time.monotonic()
+
+def add_connection(room_id: str, websocket: WebSocket):
+    room_connections[room_id].append(websocket)
+    connection_last_seen[websocket] = time.monotonic()
+    room_empty_since.pop(room_id, None)
+    active_rooms[room_id]['listener_count'] = len(room_connections[room_id])
+
+def remove_connection(room_id: str, websocket: WebSocket) -> bool:
+    """Drop a connection from its room. Returns False if it was already gone."""
+    connection_last_seen.pop(websocket, None)
+    connections = room_connections.get(room_id)
+    if connections is None or websocket not in connections:
+        return False
+    room_connections[room_id] = [c for c in connections if c is not websocket]
+    active_rooms[room_id]['listener_count'] = len(room_connections[room_id])
+    if not room_connections[room_id]:
+        room_empty_since[room_id] = time.monotonic()
+    return True
+
+def mark_alive(websocket: WebSocket):
+    if websocket in connection_last_seen:
+        connection_last_seen[websocket] = time.monotonic()
+
+def rooms_playing(track_id: str) -> List[str]:
+    """Rooms whose current song is track_id (a YouTube video id or an uploaded file name)"""
+    matches = []
+    for room_id, room in active_rooms.items():
+        song = room.get('current_song')
+        if not isinstance(song, dict):
+            continue
+        song_id = str(song.get('id') or '')
+        # The frontend ids YouTube tracks as "yt-<video id>" and uploads by their /songs URL
+        if song_id in (track_id, f'yt-{track_id}') or str(song.get('url') or '').endswith(f'/{track_id}'):
+            matches.append(room_id)
+    return matches
+
+def delete_room(room_id: str):
+    active_rooms.pop(room_id, None)
+    room_connections.pop(room_id, None)
+    room_empty_since.pop(room_id, None)
+
+def room_gauges() -> Dict[str, int]:
+    return {
+        'rooms': len(active_rooms),
+        'connections': sum(len(c) for c in room_connections.values()),
+        'empty_rooms': len(room_empty_since),
+    }
+
 async def broadcast_to_room(room_id: str, message: dict, exclude: WebSocket = None):
     if room_id in room_connections:
-        for connection in room_connections[room_id]:
-            if connection != exclude:
+        payload = json.dumps(message)
+        for connection in list(room_connections[room_id]):
+            if connection is not exclude:
                 try:
-                    await connection.send_text(json.dumps(message))
+                    await connection.send_text(payload)
                 except Exception:
-                    # Connection might be closed
-                    pass
+                    # Half-open socket: stop sending to it, the reaper finishes the cleanup
+                    remove_connection(room_id, connection)
+
+async def _evict_connection(room_id: str, websocket: WebSocket):
+    if not remove_connection(room_id, websocket):
+        return
+    try:
+        await websocket.close(code=1001)
+    except Exception:
+        pass
+    await broadcast_to_room(room_id, {
+        'type': 'user_left',
+        'listener_count': active_rooms[room_id]['listener_count']
+    })
+
+async def heartbeat_tick():
+    """Ping every connection, evict the unresponsive ones and expire abandoned rooms."""
+    now = time.monotonic()
+    ping = json.dumps({'type': 'ping', 'timestamp': datetime.now().isoformat()})
+
+    for room_id in list(room_connections):
+        for websocket in list(room_connections.get(room_id, [])):
+            last_seen = connection_last_seen.get(websocket, now)
+            if now - last_seen > ROOM_HEARTBEAT_TIMEOUT_SECONDS:
+                logger.info(f"Evicting unresponsive connection from room {room_id}")
+                ROOM_EVICTIONS.labels('connection').inc()
+                await _evict_connection(room_id, websocket)
+                continue
+            try:
+                await websocket.send_text(ping)
+            except Exception:
+                await _evict_connection(room_id, websocket)
+
+    for room_id, empty_since in list(room_empty_since.items()):
+        if now - empty_since > ROOM_EMPTY_GRACE_SECONDS and not room_connections.get(room_id):
+            logger.info(f"Expiring abandoned room {room_id}")
+            ROOM_EVICTIONS.labels('room').inc()
+            delete_room(room_id)
+
+async def run_heartbeat():
+    while True:
+        await asyncio.sleep(ROOM_HEARTBEAT_INTERVAL_SECONDS)
+        try:
+            await heartbeat_tick()
+        except Exception as e:
+            logger.error(f"Room heartbeat failed: {e}")
 
 async def handle_host_message(room_id: str, message: dict, websocket: WebSocket):
     msg_type = message.get('type')
-    
+
     if msg_type == 'play':
         active_rooms[room_id]['is_playing'] = True
         active_rooms[room_id]['current_time'] = message.get('current_time', 0)
         active_rooms[room_id]['last_update'] = datetime.now().isoformat()
-        
+
     elif msg_type == 'pause':
         active_rooms[room_id]['is_playing'] = False
         active_rooms[room_id]['current_time'] = message.get('current_time', 0)
         active_rooms[room_id]['last_update'] = datetime.now().isoformat()
-        
+
     elif msg_type == 'seek':
         active_rooms[room_id]['current_time'] = message.get('current_time', 0)
         active_rooms[room_id]['last_update'] = datetime.now().isoformat()
-        
+
     elif msg_type == 'song_change':
         active_rooms[room_id]['current_song'] = message.get('song')
         active_rooms[room_id]['current_time'] = 0
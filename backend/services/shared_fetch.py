@@ -0,0 +1,197 @@
+import asyncio
+import itertools
+import logging
+import shutil
+import tempfile
+import time
+from pathlib import Path
+from typing import AsyncIterator, Dict, Optional
+
+import aiofiles
+
+from ..core.config import SHARED_FETCH_DIR, SHARED_FETCH_LINGER_SECONDS
+from ..core.metrics import CallbackGauge
+
+logger = logging.getLogger(__name__)
+
+READ_CHUNK_SIZE = 65536
+
+# Whole-track downloads in progress or lingering for late joiners, keyed by video id
+shared_downloads: Dict[str, 'SharedDownload'] = {}
+_state = {'dir': None}
+# Buffer files are per download, not per video: a failed download can still have readers on its file
+# while a replacement for the same video fills another
+_buffer_ids = itertools.count(1)
+# Other workers and containers may share SHARED_FETCH_DIR, so each process writes to a directory of its own and
+# only sweeps others' once nothing in them has changed for this long
+STALE_BUFFER_SECONDS = 6 * 60 * 60
+
+CallbackGauge('voxwave_stream_shared_downloads', 'Upstream tracks buffered for shared /stream reads',
+              lambda: len(shared_downloads))
+CallbackGauge('voxwave_stream_shared_buffer_bytes', 'Bytes held on disk by shared /stream downloads',
+              lambda: sum(d.available for d in shared_downloads.values()))
+
+
+class SharedDownloadFailed(Exception):
+    """The shared download stopped before the bytes a reader is waiting for arrived."""
+
+
+def _buffer_dir() -> Path:
+    if _state['dir'] is None:
+        SHARED_FETCH_DIR.mkdir(parents=True, exist_ok=True)
+        _state['dir'] = Path(tempfile.mkdtemp(prefix='worker-', dir=SHARED_FETCH_DIR))
+    return _state['dir']
+
+
+def _last_change(path: Path) -> float:
+    try:
+        if path.is_dir():
+            return max([path.stat().st_mtime] + [child.stat().st_mtime for child in path.iterdir()])
+        return path.stat().st_mtime
+    except OSError:
+        return time.time()
+
+
+def prepare_shared_downloads():
+    """Create this process's buffer directory and remove ones left behind by crashed processes; run at startup."""
+    own = _buffer_dir()
+    cutoff = time.time() - STALE_BUFFER_SECONDS
+    for path in SHARED_FETCH_DIR.iterdir():
+        if path == own or _last_change(path) > cutoff:
+            continue
+        logger.info(f"Removing stale stream buffers {path.name}")
+        if path.is_dir():
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            path.unlink(missing_ok=True)
+
+
+class SharedDownload:
+    """One upstream body written to a file as it arrives, read concurrently by any number of responses.
+
+    Readers are served from the file up to the download head and wait there for more. Once the last
+    reader leaves, the download (finished or not) stays available for SHARED_FETCH_LINGER_SECONDS so
+    listeners who join late, or seek back, never reopen the upstream.
+    """
+
+    def __init__(self, key: str, total: int, media_type: str, upstream_status: int = None):
+        self.key = key
+        self.total = total
+        self.media_type = media_type
+        self.upstream_status = upstream_status
+        self.path = _buffer_dir() / f'{key}.{next(_buffer_ids)}.part'
+        self.available = 0
+        self.error: Optional[str] = None
+        self.readers = 0
+        self.closed = False
+        self._progress = asyncio.Event()
+        self._task = None
+        self._idle_timer = None
+
+    def start(self, chunks: AsyncIterator[bytes]):
+        shared_downloads[self.key] = self
+        # Exists before start() returns, so readers can open it before the first chunk is written
+        self.path.touch()
+        self._task = asyncio.ensure_future(self._fill(chunks))
+        self._schedule_expiry()
+
+    @property
+    def done(self) -> bool:
+        return self.available >= self.total
+
+    async def _fill(self, chunks):
+        try:
+            # Unbuffered, so every byte counted in available is already visible to readers' own handles
+            async with aiofiles.open(self.path, 'wb', buffering=0) as f:
+                async for chunk in chunks:
+                    await f.write(chunk)
+                    self.available += len(chunk)
+                    self._notify()
+            if not self.done:
+                self.error = f'upstream ended at byte {self.available} of {self.total}'
+        except asyncio.CancelledError:
+            self.error = 'download cancelled'
+            raise
+        except Exception as e:
+            self.error = f'{type(e).__name__}: {e}'
+        finally:
+            await chunks.aclose()
+            if self.error:
+                logger.warning(f"Shared download of {self.key} stopped: {self.error}")
+                # Later requests start over instead of joining a download that will never finish
+                self._unregister()
+                if self.readers == 0:
+                    self.close()
+            self._notify()
+
+    def _notify(self):
+        progress, self._progress = self._progress, asyncio.Event()
+        progress.set()
+
+    async def read(self, start: int, end: int) -> AsyncIterator[bytes]:
+        """Bytes start..end (inclusive), waiting for the download to reach them."""
+        self._attach()
+        position = start
+        try:
+            async with aiofiles.open(self.path, 'rb') as f:
+                while position <= end:
+                    if position >= self.available:
+                        if self.error:
+                            raise SharedDownloadFailed(self.error)
+                        await self._progress.wait()
+                        continue
+                    await f.seek(position)
+                    chunk = await f.read(min(READ_CHUNK_SIZE, self.available - position, end + 1 - position))
+                    position += len(chunk)
+                    yield chunk
+        finally:
+            self._detach()
+
+    def _attach(self):
+        self.readers += 1
+        if self._idle_timer is not None:
+            self._idle_timer.cancel()
+            self._idle_timer = None
+
+    def _detach(self):
+        self.readers -= 1
+        if self.readers == 0:
+            if self.error:
+                self.close()
+            else:
+                self._schedule_expiry()
+
+    def _schedule_expiry(self):
+        loop = asyncio.get_running_loop()
+        self._idle_timer = loop.call_later(SHARED_FETCH_LINGER_SECONDS, self._expire)
+
+    def _expire(self):
+        self._idle_timer = None
+        if self.readers == 0:
+            self.close()
+
+    def _unregister(self):
+        if shared_downloads.get(self.key) is self:
+            del shared_downloads[self.key]
+
+    def close(self):
+        """Stop downloading and drop this download's buffer file; only called once no reader is attached."""
+        if self.closed:
+            return
+        self.closed = True
+        self._unregister()
+        if self._idle_timer is not None:
+            self._idle_timer.cancel()
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            self._task.add_done_callback(lambda _: self.path.unlink(missing_ok=True))
+        else:
+            self.path.unlink(missing_ok=True)
+
+
+def close_shared_downloads():
+    for download in list(shared_downloads.values()):
+        download.close()
+    if _state['dir'] is not None:
+        shutil.rmtree(_state['dir'], ignore_errors=True)
+        _state['dir'] = None
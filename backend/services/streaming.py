@@ -0,0 +1,559 @@
+import asyncio
+import logging
+import re
+import time
+from collections import deque
+from typing import AsyncIterator, Dict, Optional, Tuple
+
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from ..core.config import (
+    YOUTUBE_USER_AGENT, STREAM_RESUME_ATTEMPTS, SHARED_FETCH_ENABLED, SHARED_FETCH_JOIN_WINDOW_BYTES,
+    SHARED_FETCH_MAX_TRACK_BYTES, SHARED_FETCH_MAX_DOWNLOADS, SHARED_FETCH_LINGER_SECONDS, STREAM_READAHEAD_BYTES,
+)
+from ..core.metrics import CallbackGauge, Counter, Gauge, Histogram
+from ..models.schemas import ErrorResponse
+from .refresher import stream_opened, stream_closed
+from .shared_fetch import SharedDownload, SharedDownloadFailed, shared_downloads
+from .youtube import get_stream_url_service, create_error_response
+
+logger = logging.getLogger(__name__)
+
+STREAM_PROXIES_OPEN = Gauge('voxwave_stream_proxies_open', 'Open /stream upstream proxies')
+STREAM_BYTES_PROXIED = Counter('voxwave_stream_bytes_proxied_total', 'Audio bytes relayed by /stream')
+STREAM_RESUMES = Counter('voxwave_stream_resumes_total',
+                         'Mid-stream upstream failures: resumed, failed resume attempt, or gave up', ('result',))
+STREAM_SHARED_REQUESTS = Counter('voxwave_stream_shared_requests_total',
+                                 '/stream requests by how they were served: started or joined a shared download, or direct',
+                                 ('mode',))
+STREAM_SHARED_BYTES = Counter('voxwave_stream_shared_bytes_total', 'Audio bytes served to /stream from shared downloads')
+# side="client": read-ahead buffer full, upstream paused for a slow client; side="upstream": buffer empty, client waiting
+STREAM_STALLS = Counter('voxwave_stream_stalls_total', 'Read-ahead stalls of /stream relays', ('side',))
+STREAM_STALL_SECONDS = Counter('voxwave_stream_stall_seconds_total', 'Time /stream relays spent stalled', ('side',))
+STREAM_THROUGHPUT = Histogram('voxwave_stream_throughput_bytes_per_second', 'Average delivery rate of finished /stream relays',
+                              buckets=(32e3, 64e3, 128e3, 256e3, 512e3, 1e6, 2e6, 4e6, 8e6, 16e6, 64e6))
+_readahead = {'bytes': 0}
+CallbackGauge('voxwave_stream_readahead_bytes', 'Bytes read from upstream and not yet sent to /stream clients',
+              lambda: _readahead['bytes'])
+
+# Upstream reads are re-cut into chunks of about CHUNK_TARGET_SECONDS at the measured rate, within these bounds
+CHUNK_SIZE = 65536
+MIN_CHUNK_SIZE = 16 * 1024
+MAX_CHUNK_SIZE = 1024 * 1024
+CHUNK_TARGET_SECONDS = 0.1
+# googlevideo answers an expired or revoked signature with one of these
+EXPIRED_STATUSES = (403, 410)
+_CONTENT_RANGE = re.compile(r'bytes (\d+)-(\d+)/(\d+|\*)')
+_RANGE = re.compile(r'bytes=(\d*)-(\d*)')
+CORS_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Methods': 'GET, OPTIONS',
+    'Access-Control-Allow-Headers': 'Range',
+    'Access-Control-Expose-Headers': 'Content-Length, Content-Range, Accept-Ranges',
+}
+
+# Shared downloads being opened, so simultaneous first requests start one; and videos that cannot be shared
+_shared_starting: Dict[str, asyncio.Future] = {}
+_unshareable: Dict[str, float] = {}
+
+
+class UpstreamInterrupted(Exception):
+    """The upstream stream broke and could not be resumed within STREAM_RESUME_ATTEMPTS."""
+
+
+class _Upstream:
+    """One upstream GET and the httpx stream context that owns it."""
+
+    def __init__(self, client, url: str, headers: dict):
+        self._cm = client.stream('GET', url, headers=headers)
+        self.resp = None
+
+    async def open(self):
+        self.resp = await self._cm.__aenter__()
+        return self
+
+    async def close(self):
+        try:
+            await self._cm.__aexit__(None, None, None)
+        except Exception as e:
+            logger.warning(f"Error closing upstream stream: {e}")
+
+
+def _upstream_headers(stream_headers: Optional[dict], range_value: str) -> dict:
+    headers = {
+        'User-Agent': YOUTUBE_USER_AGENT,
+        'Accept': '*/*',
+        'Accept-Language': 'en-US,en;q=0.9',
+        # Byte offsets must match what the client received, so never let the body be re-encoded
+        'Accept-Encoding': 'identity',
+        'Connection': 'keep-alive',
+    }
+    for k, v in (stream_headers or {}).items():
+        if k.lower() not in ['range', 'host']:
+            headers[k] = v
+    headers['Range'] = range_value
+    return headers
+
+
+async def _open_upstream(client, play, range_value: str) -> _Upstream:
+    return await _Upstream(client, play.stream_url, _upstream_headers(play.stream_headers, range_value)).open()
+
+
+def _response_span(resp, range_value: str) -> Tuple[int, Optional[int]]:
+    """Absolute (first, last) byte offsets the upstream response covers; last is None when unknown."""
+    match = _CONTENT_RANGE.match(resp.headers.get('content-range', ''))
+    if resp.status_code == 206 and match:
+        return int(match.group(1)), int(match.group(2))
+    length = resp.headers.get('content-length')
+    if resp.status_code == 200:
+        return 0, int(length) - 1 if length and length.isdigit() else None
+    requested = _RANGE.match(range_value)
+    end = requested.group(2) if requested else ''
+    return 0, int(end) if end else None
+
+
+async def _resume(video_id: str, client, offset: int, end: Optional[int]) -> Optional[_Upstream]:
+    """Re-resolve the URL and reopen the upstream at offset; None when it cannot continue there."""
+    import httpx
+
+    play = await get_stream_url_service(video_id, force_refresh=True)
+    if isinstance(play, ErrorResponse):
+        logger.warning(f"Resume of {video_id} could not re-resolve the URL: {play.detail}")
+        return None
+    range_value = f"bytes={offset}-{end if end is not None else ''}"
+    try:
+        upstream = await _open_upstream(client, play, range_value)
+    except httpx.HTTPError as e:
+        logger.warning(f"Resume of {video_id} at byte {offset} failed to connect: {e}")
+        return None
+    match = _CONTENT_RANGE.match(upstream.resp.headers.get('content-range', ''))
+    if upstream.resp.status_code != 206 or not match or int(match.group(1)) != offset:
+        logger.warning(f"Resume of {video_id} at byte {offset} got {upstream.resp.status_code} "
+                       f"{upstream.resp.headers.get('content-range', '')}")
+        await upstream.close()
+        return None
+    return upstream
+
+
+class _Throughput:
+    """Upstream rate from exponentially decayed byte and wait-time sums; time spent elsewhere is not counted."""
+
+    DECAY = 0.9
+
+    def __init__(self):
+        self.bytes = 0.0
+        self.seconds = 0.0
+
+    def update(self, nbytes: int, seconds: float):
+        self.bytes = self.bytes * self.DECAY + nbytes
+        self.seconds = self.seconds * self.DECAY + seconds
+
+    def chunk_size(self) -> int:
+        if self.seconds <= 0:
+            return CHUNK_SIZE
+        return int(min(max(self.bytes / self.seconds * CHUNK_TARGET_SECONDS, MIN_CHUNK_SIZE), MAX_CHUNK_SIZE))
+
+
+async def _adaptive_chunks(resp, meter: _Throughput):
+    """The response body in chunks sized by meter: small on slow links so bytes flow early, large on fast ones."""
+    pieces = resp.aiter_bytes()
+    pending = bytearray()
+    while True:
+        started = time.monotonic()
+        try:
+            piece = await pieces.__anext__()
+        except StopAsyncIteration:
+            break
+        except Exception:
+            # Hand over what did arrive, so a resume continues after it instead of re-fetching it
+            if pending:
+                yield bytes(pending)
+            raise
+        meter.update(len(piece), time.monotonic() - started)
+        pending += piece
+        if len(pending) >= meter.chunk_size():
+            yield bytes(pending)
+            pending.clear()
+    if pending:
+        yield bytes(pending)
+
+
+async def _read_ahead(chunks: AsyncIterator[bytes]):
+    """Decouple upstream reads from client writes: a producer task keeps up to STREAM_READAHEAD_BYTES queued.
+
+    A slow client no longer holds the upstream connection idle (googlevideo throttles or drops those),
+    and a fast one drains what was read ahead instead of waiting on each upstream read.
+    """
+    if STREAM_READAHEAD_BYTES <= 0:
+        async for chunk in chunks:
+            yield chunk
+        return
+
+    buffer = deque()
+    state = {'bytes': 0, 'done': False, 'error': None}
+    readable = asyncio.Event()
+    writable = asyncio.Event()
+    writable.set()
+
+    def stalled(side: str, since: float):
+        STREAM_STALLS.labels(side).inc()
+        STREAM_STALL_SECONDS.labels(side).inc(time.monotonic() - since)
+
+    async def produce():
+        try:
+            async for chunk in chunks:
+                buffer.append(chunk)
+                state['bytes'] += len(chunk)
+                _readahead['bytes'] += len(chunk)
+                readable.set()
+                if state['bytes'] >= STREAM_READAHEAD_BYTES:
+                    writable.clear()
+                    since = time.monotonic()
+                    await writable.wait()
+                    stalled('client', since)
+        except Exception as e:
+            state['error'] = e
+        finally:
+            state['done'] = True
+            readable.set()
+            await chunks.aclose()
+
+    producer = asyncio.ensure_future(produce())
+    started = time.monotonic()
+    sent = 0
+    try:
+        while True:
+            if not buffer:
+                if state['done']:
+                    break
+                readable.clear()
+                since = time.monotonic()
+                await readable.wait()
+                # Waiting for the very first bytes is connection setup, not a stall
+                if sent:
+                    stalled('upstream', since)
+                continue
+            chunk = buffer.popleft()
+            state['bytes'] -= len(chunk)
+            _readahead['bytes'] -= len(chunk)
+            if state['bytes'] < STREAM_READAHEAD_BYTES:
+                writable.set()
+            sent += len(chunk)
+            yield chunk
+        if state['error'] is not None:
+            raise state['error']
+        elapsed = time.monotonic() - started
+        if elapsed > 0:
+            STREAM_THROUGHPUT.observe(sent / elapsed)
+    finally:
+        producer.cancel()
+        _readahead['bytes'] -= state['bytes']
+        state['bytes'] = 0
+
+
+async def _relay(video_id: str, client, upstream: _Upstream, offset: int, end: Optional[int]):
+    """Yield the upstream body, splicing in a resumed upstream request whenever the current one breaks."""
+    import httpx
+
+    open_proxies = STREAM_PROXIES_OPEN.labels()
+    bytes_proxied = STREAM_BYTES_PROXIED.labels()
+    open_proxies.inc()
+    stream_opened(video_id)
+    attempts = 0
+    meter = _Throughput()
+    try:
+        while True:
+            segment_start = offset
+            try:
+                async for chunk in _adaptive_chunks(upstream.resp, meter):
+                    offset += len(chunk)
+                    bytes_proxied.inc(len(chunk))
+                    yield chunk
+                if end is None or offset > end:
+                    return
+                reason = f"upstream ended at byte {offset} of {end + 1}"
+            except httpx.HTTPError as e:
+                reason = f"{type(e).__name__}: {e}"
+
+            await upstream.close()
+            upstream = None
+            if offset > segment_start:
+                # The limit is on consecutive failures: a long track may survive several unrelated drops
+                attempts = 0
+            while upstream is None:
+                attempts += 1
+                if attempts > STREAM_RESUME_ATTEMPTS:
+                    STREAM_RESUMES.labels('exhausted').inc()
+                    raise UpstreamInterrupted(f"{video_id}: {reason}; gave up after {STREAM_RESUME_ATTEMPTS} resumes")
+                logger.warning(f"Upstream for {video_id} broke ({reason}); resuming at byte {offset} "
+                               f"(attempt {attempts}/{STREAM_RESUME_ATTEMPTS})")
+                await asyncio.sleep(min(0.25 * 2 ** (attempts - 1), 2.0))
+                upstream = await _resume(video_id, client, offset, end)
+                STREAM_RESUMES.labels('resumed' if upstream else 'failed').inc()
+    except Exception as e:
+        logger.error(f"Error during streaming for {video_id}: {e}")
+        raise
+    finally:
+        open_proxies.dec()
+        stream_closed(video_id)
+        try:
+            if upstream is not None:
+                await upstream.close()
+        finally:
+            try:
+                await client.aclose()
+            except Exception as e:
+                logger.warning(f"Error closing client: {e}")
+
+
+def _new_client():
+    import httpx  # deferred to keep API startup fast; preloaded in the background by the lifespan
+
+    return httpx.AsyncClient(
+        follow_redirects=True,
+        timeout=httpx.Timeout(60.0, connect=10.0),
+        limits=httpx.Limits(max_keepalive_connections=5, max_connections=10)
+    )
+
+
+def _requested_span(range_header: Optional[str], total: int) -> Optional[Tuple[int, int]]:
+    """Inclusive byte span a single-range Range header asks for, clamped to total; None if unsatisfiable."""
+    if not range_header:
+        return 0, total - 1
+    match = _RANGE.fullmatch(range_header.strip())
+    if not match or not (match.group(1) or match.group(2)):
+        return None
+    if not match.group(1):
+        start = max(total - int(match.group(2)), 0)
+        end = total - 1
+    else:
+        start = int(match.group(1))
+        end = min(int(match.group(2)), total - 1) if match.group(2) else total - 1
+    return (start, end) if start <= end else None
+
+
+async def _start_shared(video_id: str) -> Optional[SharedDownload]:
+    """Open a whole-track upstream for video_id and start buffering it; None when it cannot be shared."""
+    import httpx
+
+    result = await get_stream_url_service(video_id)
+    if isinstance(result, ErrorResponse):
+        return None
+    client = _new_client()
+    upstream = None
+    try:
+        upstream = await _open_upstream(client, result, 'bytes=0-')
+        if upstream.resp.status_code in EXPIRED_STATUSES:
+            await upstream.close()
+            upstream = None
+            result = await get_stream_url_service(video_id, force_refresh=True)
+            if not isinstance(result, ErrorResponse):
+                upstream = await _open_upstream(client, result, 'bytes=0-')
+        if upstream is not None and upstream.resp.status_code in (200, 206):
+            start, end = _response_span(upstream.resp, 'bytes=0-')
+            if start == 0 and end is not None and end < SHARED_FETCH_MAX_TRACK_BYTES:
+                download = SharedDownload(video_id, end + 1, upstream.resp.headers.get('content-type') or 'audio/mp4',
+                                          upstream.resp.status_code)
+                download.start(_relay(video_id, client, upstream, 0, end))
+                return download
+        # Unknown length, too large or refused: serve this video directly for a while
+        _unshareable[video_id] = time.time() + SHARED_FETCH_LINGER_SECONDS
+    except httpx.HTTPError as e:
+        logger.warning(f"Shared download of {video_id} could not start: {e}")
+    if upstream is not None:
+        await upstream.close()
+    await client.aclose()
+    return None
+
+
+async def _shared_download(video_id: str):
+    """(download, started) for video_id, opening one unless it is running already; download None if unshareable."""
+    download = shared_downloads.get(video_id)
+    if download is not None:
+        return download, False
+    if _unshareable.get(video_id, 0) > time.time() or len(shared_downloads) >= SHARED_FETCH_MAX_DOWNLOADS:
+        return None, False
+    _unshareable.pop(video_id, None)
+    pending = _shared_starting.get(video_id)
+    started = pending is None
+    if started:
+        pending = asyncio.ensure_future(_start_shared(video_id))
+        _shared_starting[video_id] = pending
+        pending.add_done_callback(lambda _: _shared_starting.pop(video_id, None))
+    return await asyncio.shield(pending), started
+
+
+async def _shared_body(video_id: str, download: SharedDownload, start: int, end: int):
+    """Bytes from the shared download; if it dies before reaching them, continue on a private upstream."""
+    shared_bytes = STREAM_SHARED_BYTES.labels()
+    position = start
+    stream_opened(video_id)
+    try:
+        async for chunk in download.read(start, end):
+            position += len(chunk)
+            shared_bytes.inc(len(chunk))
+            yield chunk
+        return
+    except SharedDownloadFailed as e:
+        logger.warning(f"Shared download of {video_id} failed at byte {position} ({e}); continuing directly")
+    finally:
+        stream_closed(video_id)
+
+    client = _new_client()
+    upstream = await _resume(video_id, client, position, end)
+    if upstream is None:
+        await client.aclose()
+        raise UpstreamInterrupted(f"{video_id}: shared download failed and could not resume at byte {position}")
+    async for chunk in _read_ahead(_relay(video_id, client, upstream, position, end)):
+        yield chunk
+
+
+async def _shared_response(video_id: str, range_header: Optional[str], trace=None) -> Optional[StreamingResponse]:
+    """Serve the request from the video's shared download, or None when it must go to the upstream directly."""
+    if range_header and ',' in range_header:
+        return None
+    download, started = await _shared_download(video_id)
+    if download is None:
+        return None
+    span = _requested_span(range_header, download.total)
+    # A seek far past the download head would wait on bytes that are still a long way off
+    if span is None or span[0] > download.available + SHARED_FETCH_JOIN_WINDOW_BYTES:
+        return None
+    start, end = span
+    mode = 'started' if started else 'joined'
+    STREAM_SHARED_REQUESTS.labels(mode).inc()
+    if trace is not None:
+        trace.set(mode=f'shared_{mode}', upstream_status=download.upstream_status)
+    headers = {**CORS_HEADERS, 'Cache-Control': 'no-cache', 'Accept-Ranges': 'bytes',
+               'Content-Length': str(end - start + 1)}
+    if range_header:
+        headers['Content-Range'] = f'bytes {start}-{end}/{download.total}'
+    return StreamingResponse(
+        _shared_body(video_id, download, start, end),
+        status_code=206 if range_header else 200,
+        media_type=download.media_type,
+        headers=headers,
+    )
+
+
+async def proxy_stream(video_id: str, range_header: Optional[str], trace=None):
+    """Relay a YouTube audio stream, honouring the client's Range and resuming mid-stream failures.
+
+    Requests for the same video share one buffered upstream download where they can (room listeners,
+    seeks, re-requests); the rest get a private upstream connection. trace, a StreamTrace, is told which.
+    """
+    import httpx  # deferred to keep API startup fast; preloaded in the background by the lifespan
+
+    if SHARED_FETCH_ENABLED:
+        shared = await _shared_response(video_id, range_header, trace)
+        if shared is not None:
+            return shared
+    STREAM_SHARED_REQUESTS.labels('direct').inc()
+    if trace is not None:
+        trace.set(mode='direct')
+
+    # Get fresh stream URL
+    result = await get_stream_url_service(video_id)
+    if isinstance(result, ErrorResponse):
+        return JSONResponse(status_code=400, content=result.dict())
+
+    range_value = range_header or 'bytes=0-'
+
+    client = _new_client()
+
+    upstream = None
+
+    async def release():
+        try:
+            if upstream is not None:
+                await upstream.close()
+        finally:
+            try:
+                await client.aclose()
+            except Exception:
+                pass
+
+    try:
+        upstream = await _open_upstream(client, result, range_value)
+
+        if upstream.resp.status_code in EXPIRED_STATUSES:
+            # The cached URL died before its expire=; re-resolve once before giving up
+            logger.info(f"Upstream rejected cached URL for {video_id} ({upstream.resp.status_code}); re-resolving")
+            await upstream.close()
+            upstream = None
+            result = await get_stream_url_service(video_id, force_refresh=True)
+            if isinstance(result, ErrorResponse):
+                await release()
+                return JSONResponse(status_code=400, content=result.dict())
+            upstream = await _open_upstream(client, result, range_value)
+
+        resp = upstream.resp
+        if trace is not None:
+            trace.set(upstream_status=resp.status_code)
+        if resp.status_code >= 400:
+            error_body = ""
+            try:
+                error_bytes = await asyncio.wait_for(resp.aread(), timeout=2.0)
+                error_body = error_bytes[:300].decode('utf-8', errors='ignore')
+            except asyncio.TimeoutError:
+                error_body = "Timeout reading error response"
+            except Exception as e:
+                error_body = f"Error reading response: {e}"
+
+            logger.error(f"Upstream error {resp.status_code} for {video_id}: {error_body}")
+            await release()
+
+            return JSONResponse(
+                status_code=502,
+                content=create_error_response(
+                    'Upstream Stream Failed',
+                    f'YouTube returned {resp.status_code}',
+                    [
+                        'Stream URL may have expired',
+                        'Try refreshing the page',
+                        'Video may be region-restricted'
+                    ]
+                ).dict()
+            )
+
+        passthrough_headers = {**CORS_HEADERS, 'Cache-Control': 'no-cache'}
+
+        for h in ['accept-ranges', 'content-range', 'content-length', 'content-type']:
+            if h in resp.headers:
+                passthrough_headers[h] = resp.headers[h]
+
+        media_type = resp.headers.get('content-type') or 'audio/mp4'
+        start, end = _response_span(resp, range_value)
+
+        return StreamingResponse(
+            _read_ahead(_relay(video_id, client, upstream, start, end)),
+            status_code=resp.status_code,
+            media_type=media_type,
+            headers=passthrough_headers,
+        )
+
+    except httpx.TimeoutException as e:
+        logger.error(f"Timeout streaming {video_id}: {e}")
+        await release()
+
+        return JSONResponse(
+            status_code=504,
+            content=create_error_response(
+                'Stream Timeout',
+                'Connection to YouTube timed out',
+                ['Check your internet connection', 'Try again']
+            ).dict()
+        )
+
+    except Exception as e:
+        logger.error(f"Unexpected error streaming {video_id}: {e}")
+        await release()
+
+        return JSONResponse(
+            status_code=500,
+            content=create_error_response(
+                'Stream Failed',
+                str(e)[:150],
+                ['Unexpected error', 'Try refreshing']
+            ).dict()
+        )
@@ -0,0 +1,235 @@
+import asyncio
+import logging
+import re
+import sqlite3
+import time
+from pathlib import Path
+from typing import Iterable, List
+
+from ..core.config import TRACK_INDEX_MAX_ROWS
+
+logger = logging.getLogger(__name__)
+
+LOCAL_SEARCH_LIMIT = 20
+MAX_SUGGESTIONS = 10
+# Prune in batches once the index overshoots its bound by this fraction, instead of on every insert
+_PRUNE_SLACK = 0.05
+_TOKEN = re.compile(r'\w+', re.UNICODE)
+
+_state = {'enabled': False}
+_pending_writes = set()
+
+
+def _db_connect(db_path: Path) -> sqlite3.Connection:
+    conn = sqlite3.connect(str(db_path))
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def init_track_index(db_path: Path) -> None:
+    """Create the track index and its FTS5 table; seeds it from saved tracks the first time."""
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    with _db_connect(db_path) as conn:
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS track_index (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                source TEXT NOT NULL,
+                track_id TEXT NOT NULL,
+                title TEXT NOT NULL,
+                artist TEXT,
+                duration TEXT,
+                thumbnail TEXT,
+                hits INTEGER NOT NULL DEFAULT 1,
+                last_seen INTEGER NOT NULL,
+                UNIQUE(source, track_id)
+            )
+            """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_track_index_last_seen ON track_index(last_seen, hits)")
+        try:
+            # External-content table: the text lives once, in track_index; triggers keep the FTS index in step
+            conn.execute(
+                """
+                CREATE VIRTUAL TABLE IF NOT EXISTS track_index_fts USING fts5(
+                    title, artist,
+                    content='track_index', content_rowid='id',
+                    tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+                )
+                """
+            )
+        except sqlite3.OperationalError as e:
+            logger.warning(f"SQLite FTS5 unavailable, local track search disabled: {e}")
+            _state['enabled'] = False
+            return
+        conn.executescript(
+            """
+            CREATE TRIGGER IF NOT EXISTS track_index_ai AFTER INSERT ON track_index BEGIN
+                INSERT INTO track_index_fts(rowid, title, artist) VALUES (new.id, new.title, new.artist);
+            END;
+            CREATE TRIGGER IF NOT EXISTS track_index_ad AFTER DELETE ON track_index BEGIN
+                INSERT INTO track_index_fts(track_index_fts, rowid, title, artist)
+                VALUES ('delete', old.id, old.title, old.artist);
+            END;
+            CREATE TRIGGER IF NOT EXISTS track_index_au AFTER UPDATE OF title, artist ON track_index BEGIN
+                INSERT INTO track_index_fts(track_index_fts, rowid, title, artist)
+                VALUES ('delete', old.id, old.title, old.artist);
+                INSERT INTO track_index_fts(rowid, title, artist) VALUES (new.id, new.title, new.artist);
+            END;
+            """
+        )
+        empty = conn.execute("SELECT 1 FROM track_index LIMIT 1").fetchone() is None
+        has_saved = conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'saved_tracks'"
+        ).fetchone() is not None
+        if empty and has_saved:
+            conn.execute(
+                """
+                INSERT OR IGNORE INTO track_index(source, track_id, title, artist, thumbnail, hits, last_seen)
+                SELECT source, track_id, MAX(title), MAX(artist), MAX(thumbnail), COUNT(*), MAX(created_at)
+                FROM saved_tracks GROUP BY source, track_id
+                """
+            )
+    _state['enabled'] = True
+
+
+def track_index_enabled() -> bool:
+    return _state['enabled']
+
+
+def record_tracks(db_path: Path, tracks: Iterable[dict]) -> None:
+    """Upsert tracks seen in search results or libraries ({source, track_id, title, artist, duration, thumbnail})."""
+    if not _state['enabled']:
+        return
+    now = int(time.time())
+    rows = [
+        (t['source'], t['track_id'], t['title'], t.get('artist'), t.get('duration'), t.get('thumbnail'), now)
+        for t in tracks if t.get('track_id') and t.get('title')
+    ]
+    if not rows:
+        return
+    with _db_connect(db_path) as conn:
+        conn.executemany(
+            """
+            INSERT INTO track_index(source, track_id, title, artist, duration, thumbnail, last_seen)
+            VALUES(?,?,?,?,?,?,?)
+            ON CONFLICT(source, track_id) DO UPDATE SET
+                title=excluded.title,
+                artist=COALESCE(excluded.artist, artist),
+                duration=COALESCE(excluded.duration, duration),
+                thumbnail=COALESCE(excluded.thumbnail, thumbnail),
+                hits=hits + 1,
+                last_seen=excluded.last_seen
+            """,
+            rows,
+        )
+        _prune(conn)
+
+
+def _record_logged(db_path: Path, tracks: List[dict]) -> None:
+    try:
+        record_tracks(db_path, tracks)
+    except Exception as e:
+        logger.warning(f"Track index update failed: {e}")
+
+
+def record_tracks_soon(db_path: Path, tracks: Iterable[dict]) -> None:
+    """record_tracks in a worker thread, so requests never wait on index writes."""
+    if not _state['enabled']:
+        return
+    task = asyncio.ensure_future(asyncio.to_thread(_record_logged, db_path, list(tracks)))
+    _pending_writes.add(task)
+    task.add_done_callback(_pending_writes.discard)
+
+
+def search_result_tracks(results: Iterable[dict]) -> List[dict]:
+    """SearchResult-shaped dicts from YouTube search, as record_tracks input"""
+    return [{
+        'source': 'youtube',
+        'track_id': r['id'],
+        'title': r['title'],
+        'artist': r.get('channel'),
+        'duration': r.get('duration'),
+        'thumbnail': r.get('thumbnail'),
+    } for r in results]
+
+
+def _prune(conn: sqlite3.Connection) -> None:
+    count = conn.execute("SELECT COUNT(*) FROM track_index").fetchone()[0]
+    if count <= TRACK_INDEX_MAX_ROWS * (1 + _PRUNE_SLACK):
+        return
+    # Least recently seen go first; among equals, the ones seen least often
+    conn.execute(
+        """
+        DELETE FROM track_index WHERE id IN (
+            SELECT id FROM track_index ORDER BY last_seen ASC, hits ASC LIMIT ?
+        )
+        """,
+        (count - TRACK_INDEX_MAX_ROWS,),
+    )
+
+
+def _match_expression(q: str) -> str:
+    """Every word must match, the last one as a prefix so partially typed words still hit."""
+    tokens = _TOKEN.findall(q.lower())
+    if not tokens:
+        return ''
+    terms = [f'"{t}"' for t in tokens[:-1]] + [f'"{tokens[-1]}"*']
+    return ' '.join(terms)
+
+
+def _search_rows(conn: sqlite3.Connection, q: str, limit: int) -> List[sqlite3.Row]:
+    match = _match_expression(q)
+    if not match:
+        return []
+    # bm25 is negative (lower is better); titles weigh double, and tracks seen often rank a little higher
+    return conn.execute(
+        """
+        SELECT t.source, t.track_id, t.title, t.artist, t.duration, t.thumbnail
+        FROM track_index_fts f JOIN track_index t ON t.id = f.rowid
+        WHERE track_index_fts MATCH ?
+        ORDER BY bm25(track_index_fts, 2.0, 1.0) * (1.0 + 0.05 * MIN(t.hits, 20)), t.last_seen DESC
+        LIMIT ?
+        """,
+        (match, limit),
+    ).fetchall()
+
+
+def search_local(db_path: Path, q: str, limit: int = LOCAL_SEARCH_LIMIT) -> List[dict]:
+    """Best local matches for q, shaped like SearchResult plus source"""
+    if not _state['enabled']:
+        return []
+    with _db_connect(db_path) as conn:
+        rows = _search_rows(conn, q, min(limit, LOCAL_SEARCH_LIMIT))
+    results = []
+    for r in rows:
+        results.append({
+            'id': r['track_id'],
+            'title': r['title'],
+            'channel': r['artist'] or '',
+            'duration': r['duration'] or '',
+            'thumbnail': r['thumbnail'] or '',
+            'url': f"https://www.youtube.com/watch?v={r['track_id']}" if r['source'] == 'youtube' else '',
+            'source': r['source'],
+        })
+    return results
+
+
+def suggest(db_path: Path, prefix: str, limit: int = MAX_SUGGESTIONS) -> List[str]:
+    """Autocomplete: distinct titles of the best local matches for a partially typed query"""
+    if not _state['enabled']:
+        return []
+    limit = min(limit, MAX_SUGGESTIONS)
+    with _db_connect(db_path) as conn:
+        rows = _search_rows(conn, prefix, limit * 3)
+    seen = set()
+    suggestions = []
+    for r in rows:
+        key = r['title'].casefold()
+        if key in seen:
+            continue
+        seen.add(key)
+        suggestions.append(r['title'])
+        if len(suggestions) >= limit:
+            break
+    return suggestions
@@ -1,32 +1,125 @@
 import asyncio
+import base64
+import contextvars
+import itertools
+import json
 import logging
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Dict
-from ..core.config import PYTUBEFIX_AVAILABLE
-from ..models.schemas import SearchResult, PlayResponse, ErrorResponse
+from typing import Dict, List
+from urllib.parse import parse_qs, urlsplit
+from ..core.config import (
+    DB_PATH, L2_CACHE_ENABLED, L2_CACHE_PATH, L2_CACHE_MAX_BYTES, L2_WARM_ENTRIES, PYTUBEFIX_AVAILABLE,
+    EXTRACTOR_CONCURRENCY, STREAM_URL_MAX_AGE_SECONDS, STREAM_URL_EXPIRY_MARGIN_SECONDS,
+    EXTRACTOR_HEDGE_PERCENTILE, EXTRACTOR_HEDGE_CLIENT, EXTRACTOR_HEDGE_MIN_SAMPLES,
+    EXTRACTOR_HEDGE_DEFAULT_DELAY_SECONDS, EXTRACTOR_HEDGE_MIN_DELAY_SECONDS,
+    STREAM_FAILURE_TTL_SECONDS, STREAM_UNAVAILABLE_TTL_SECONDS,
+)
+from ..core.metrics import Counter, CallbackGauge, Histogram
+from ..core.disk_cache import DiskCache
+from ..core.http_cache import PROCESS_TAG, make_etag
+from ..core.serialization import dumps
+from ..models.schemas import PlayResponse, ErrorResponse
+from .track_index import record_tracks_soon, search_result_tracks
 
 logger = logging.getLogger(__name__)
 
-# Cache for stream URLs
+# Cache for stream URLs, keyed by video id
 stream_cache = {}
-STREAM_CACHE_SECONDS = 180  # 3 minutes (conservative)
+_stream_inflight: Dict[str, asyncio.Future] = {}
+# Failed extractions, keyed by video id: the error response and when the video may be tried again
+stream_failures: Dict[str, dict] = {}
+MAX_STREAM_FAILURES = 10000
+MAX_PLAY_BATCH = 50
+# pytubefix VideoUnavailable subclasses that say more about us (bot checks, tokens) than about the video
+_TRANSIENT_UNAVAILABLE = {'BotDetection', 'PoTokenRequired', 'LoginRequired', 'InnerTubeResponseError', 'LiveStreamOffline'}
 
+# Serialized result pages keyed "<query>#<offset>", and the live pytubefix searches they are cut from
 search_cache = {}
+search_sessions: Dict[str, dict] = {}
 SEARCH_CACHE_SECONDS = 300
+SEARCH_PAGE_SIZE = 20
+# Continuation tokens are client-supplied; deeper offsets would have one request page through YouTube for them
+MAX_SEARCH_PAGES = 10
+MAX_SEARCH_SESSIONS = 256
+# Each cached search gets a fresh version, so its ETag changes whenever the entry is rebuilt
+_search_versions = itertools.count(1)
+EMPTY_SEARCH_ENTRY = {'data': [], 'continuation': None, 'body': dumps({'results': [], 'total': 0, 'continuation': None}),
+                      'etag': make_etag('search', 'empty')}
 
-if PYTUBEFIX_AVAILABLE:
-    from pytubefix import YouTube, Search
-else:
-    logger.warning("pytubefix not available")
+# Disk tier under both caches; entries keep their absolute expiry, so TTLs survive restarts
+l2_cache = DiskCache(L2_CACHE_PATH, L2_CACHE_MAX_BYTES)
 
+_extractor_slots = asyncio.Semaphore(EXTRACTOR_CONCURRENCY)
+_extractor_pool = ThreadPoolExecutor(max_workers=EXTRACTOR_CONCURRENCY, thread_name_prefix='extractor')
+# Durations of recent first extraction attempts, whatever their outcome, for the hedge delay percentile
+_extract_latencies = deque(maxlen=200)
+_extractor_state = {'running': 0, 'queued': 0}
 
-def _search_videos_sync(q: str):
-    s = Search(q)
-    return s.videos
+CACHE_REQUESTS = Counter('voxwave_cache_requests_total', 'Cache lookups by cache and result', ('cache', 'result'))
+CallbackGauge('voxwave_cache_entries', 'Entries held per in-memory cache',
+              lambda: {'search': len(search_cache), 'search_sessions': len(search_sessions), 'stream': len(stream_cache)}, ('cache',))
+CallbackGauge('voxwave_extractor_in_flight', 'pytubefix calls currently running', lambda: _extractor_state['running'])
+CallbackGauge('voxwave_extractor_queued', 'pytubefix calls waiting for an extractor slot', lambda: _extractor_state['queued'])
+EXTRACTOR_DURATION = Histogram('voxwave_extractor_duration_seconds', 'pytubefix call duration', ('operation',))
+EXTRACTOR_HEDGES = Counter('voxwave_extractor_hedges_total', 'Hedged extractions by the attempt that won', ('winner',))
+CallbackGauge('voxwave_extractor_hedge_delay_seconds', 'Current wait before an extraction is hedged', lambda: hedge_delay())
 
 
-def _extract_audio_sync(video_id: str):
-    yt = YouTube(f"https://www.youtube.com/watch?v={video_id}")
+def _next_search_batch_sync(session: dict) -> list:
+    """Raw videos of the session's next pytubefix results page ([] once YouTube has no more)"""
+    from pytubefix import Search  # deferred: pytubefix (and aiohttp under it) is slow to import
+    search = session['search']
+    if search is None:
+        search = session['search'] = Search(session['query'])
+    elif getattr(search, '_current_continuation', None):
+        search.get_next_results()
+    else:
+        # get_next_results() without a continuation would restart the search from page one
+        return []
+    videos = search.videos
+    batch = videos[session['raw_seen']:]
+    session['raw_seen'] = len(videos)
+    return batch
+
+
+def _describe_video_sync(video):
+    """SearchResult-shaped dict for a search hit, or None for shorts and broken entries.
+
+    Search only returns bare YouTube objects; reading length/title/author fetches each video's metadata.
+    """
+    try:
+        # Basic validation
+        if not video.video_id:
+            return None
+
+        duration = video.length
+        if duration < 60: # Skip shorts
+            return None
+
+        minutes = duration // 60
+        seconds = duration % 60
+        duration_str = f"{minutes}:{seconds:02d}"
+
+        # Plain dicts in SearchResult's shape; building models here only to dump them again is wasted CPU
+        return {
+            'id': video.video_id,
+            'title': video.title,
+            'channel': video.author,
+            'duration': duration_str,
+            'thumbnail': video.thumbnail_url,
+            'url': f"https://www.youtube.com/watch?v={video.video_id}"
+        }
+    except Exception:
+        return None
+
+
+def _extract_audio_sync(video_id: str, client: str = None):
+    from pytubefix import YouTube
+    url = f"https://www.youtube.com/watch?v={video_id}"
+    yt = YouTube(url, client=client) if client else YouTube(url)
     audio_stream = yt.streams.filter(only_audio=True).order_by('abr').desc().first()
     if not audio_stream or not audio_stream.url:
         return None
@@ -37,6 +130,108 @@ def _extract_audio_sync(video_id: str):
     }
 
 
+async def _run_extractor(operation: str, func, *args):
+    """Run a blocking pytubefix call in a worker thread, bounded by EXTRACTOR_CONCURRENCY."""
+    _extractor_state['queued'] += 1
+    try:
+        await _extractor_slots.acquire()
+    finally:
+        _extractor_state['queued'] -= 1
+    _extractor_state['running'] += 1
+    start = time.perf_counter()
+    loop = asyncio.get_running_loop()
+
+    def finish(_=None):
+        EXTRACTOR_DURATION.labels(operation).observe(time.perf_counter() - start)
+        _extractor_state['running'] -= 1
+        _extractor_slots.release()
+
+    work = _extractor_pool.submit(contextvars.copy_context().run, func, *args)
+    detached = False
+    try:
+        return await asyncio.wrap_future(work)
+    except asyncio.CancelledError:
+        if not work.done():
+            # A running thread cannot be interrupted; it keeps its slot until it really returns
+            work.add_done_callback(lambda _: loop.call_soon_threadsafe(finish))
+            detached = True
+        raise
+    finally:
+        if not detached:
+            finish()
+
+
+def hedge_delay() -> float:
+    """Seconds to wait for an extraction before hedging: the configured percentile of recent latencies"""
+    if len(_extract_latencies) < EXTRACTOR_HEDGE_MIN_SAMPLES:
+        return EXTRACTOR_HEDGE_DEFAULT_DELAY_SECONDS
+    ordered = sorted(_extract_latencies)
+    index = min(int(len(ordered) * EXTRACTOR_HEDGE_PERCENTILE / 100), len(ordered) - 1)
+    return max(ordered[index], EXTRACTOR_HEDGE_MIN_DELAY_SECONDS)
+
+
+async def _hedged_extract(video_id: str, extract=_extract_audio_sync):
+    """Extract with a backup request: if the first attempt outlives hedge_delay(), race a second one
+    (through EXTRACTOR_HEDGE_CLIENT) and keep whichever succeeds first"""
+    started = time.perf_counter()
+
+    def record_primary(task):
+        # Failed and empty attempts count too; only recording successes would pull the percentile down
+        if not task.cancelled():
+            _extract_latencies.append(time.perf_counter() - started)
+
+    primary = asyncio.ensure_future(_run_extractor('extract', extract, video_id))
+    primary.add_done_callback(record_primary)
+    if EXTRACTOR_HEDGE_PERCENTILE <= 0:
+        return await primary
+    done, _ = await asyncio.wait({primary}, timeout=hedge_delay())
+    # A saturated pool means hedges would only queue behind the work they are meant to overtake
+    if done or _extractor_state['queued'] > 0:
+        return await primary
+
+    # The hedge's own time is never recorded: it started late, and would make the delay shrink as hedging grows
+    hedge = asyncio.ensure_future(
+        _run_extractor('extract_hedge', extract, video_id, EXTRACTOR_HEDGE_CLIENT or None))
+    pending = {primary, hedge}
+    failure = None
+    hedge_won = False
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is not None:
+                    failure = failure or task.exception()
+                    continue
+                if task.result():
+                    hedge_won = task is hedge
+                    EXTRACTOR_HEDGES.labels('hedge' if hedge_won else 'primary').inc()
+                    return task.result()
+        EXTRACTOR_HEDGES.labels('none').inc()
+        if failure is not None:
+            raise failure
+        return None
+    finally:
+        for task in pending:
+            task.cancel()
+        if hedge_won and primary in pending:
+            # The primary lost and is cancelled: it took at least this long, which still belongs in the sample
+            _extract_latencies.append(time.perf_counter() - started)
+
+
+def _preload_sync():
+    import httpx  # noqa: F401 - used by the /stream proxy
+    if PYTUBEFIX_AVAILABLE:
+        import pytubefix  # noqa: F401
+
+
+async def preload_extractor():
+    """Warm the lazily imported extraction stack in a worker thread after startup."""
+    try:
+        await asyncio.to_thread(_preload_sync)
+    except Exception as e:
+        logger.warning(f"Preloading extractor modules failed: {e}")
+
+
 def create_error_response(error_msg: str, detail: str, suggestions: list = None) -> ErrorResponse:
     if suggestions is None:
         suggestions = []
@@ -61,71 +256,245 @@ def _parse_duration_seconds(value):
     return nums[0]
 
 
-async def search_youtube_service(q: str):
-    """Enhanced YouTube search using pytubefix"""
+def encode_continuation(query_key: str, offset: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps([query_key, offset]).encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_continuation(token: str):
+    """(query_key, offset) from a continuation token"""
+    try:
+        query_key, offset = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid continuation token")
+    if not isinstance(query_key, str) or not query_key or not isinstance(offset, int) or offset < 0 \
+            or offset % SEARCH_PAGE_SIZE or offset >= MAX_SEARCH_PAGES * SEARCH_PAGE_SIZE:
+        raise ValueError("Invalid continuation token")
+    return query_key, offset
+
+
+def _search_session(query_key: str) -> dict:
+    """Live pytubefix Search for a query plus every result parsed from it so far"""
+    now = time.time()
+    session = search_sessions.get(query_key)
+    if session and now - session['created'] < SEARCH_CACHE_SECONDS:
+        session['last_used'] = now
+        return session
+
+    for key in [k for k, v in search_sessions.items() if now - v['created'] >= SEARCH_CACHE_SECONDS]:
+        del search_sessions[key]
+    while len(search_sessions) >= MAX_SEARCH_SESSIONS:
+        del search_sessions[min(search_sessions, key=lambda k: search_sessions[k]['last_used'])]
+
+    session = {
+        'query': query_key,
+        'search': None,
+        'raw_seen': 0,
+        'results': [],
+        'exhausted': False,
+        # In-flight pytubefix page fetch and metadata lookups, kept here so a reader leaving does not lose them
+        'fetch': None,
+        'pending': deque(),
+        'created': now,
+        'last_used': now,
+        'lock': asyncio.Lock(),
+    }
+    search_sessions[query_key] = session
+    return session
+
+
+def _forget_search_session(query_key: str, session: dict):
+    if search_sessions.get(query_key) is session:
+        del search_sessions[query_key]
+
+
+async def _parse_next(session: dict, query_key: str):
+    """Append the next search hit (if it is not a short or broken) to the session's results, fetching the next
+    pytubefix page when the current one is used up. Called with the session lock held."""
+    pending = session['pending']
+    if not pending:
+        if session['fetch'] is None:
+            session['fetch'] = asyncio.ensure_future(_run_extractor('search', _next_search_batch_sync, session))
+        # Shielded, like the lookups below: a reader that goes away leaves the work to the next one
+        try:
+            batch = await asyncio.shield(session['fetch'])
+        except Exception:
+            # Start the query over on the next request rather than replaying this failure until the session expires
+            session['fetch'] = None
+            _forget_search_session(query_key, session)
+            raise
+        session['fetch'] = None
+        if not batch:
+            session['exhausted'] = True
+            return
+        # Metadata for the whole page is fetched concurrently, results are still appended in order
+        pending.extend(asyncio.ensure_future(_run_extractor('describe', _describe_video_sync, v)) for v in batch)
+    try:
+        result = await asyncio.shield(pending[0])
+    except Exception:
+        # The session's results would have a gap, so forget it
+        for task in pending:
+            task.cancel()
+        _forget_search_session(query_key, session)
+        raise
+    pending.popleft()
+    if result is not None:
+        session['results'].append(result)
+
+
+async def iter_search_page(query_key: str, offset: int = 0):
+    """Yield ('result', dict) for results[offset:offset + SEARCH_PAGE_SIZE] as soon as each is parsed,
+    then ('end', continuation token or None)"""
+    session = _search_session(query_key)
+    page_end = offset + SEARCH_PAGE_SIZE
+    position = offset
+    while True:
+        # One parser per query. The lock covers parsing and copying results out, never a yield, so a slow
+        # reader does not hold up other requests for the query
+        async with session['lock']:
+            results = session['results']
+            while len(results) <= position < page_end and not session['exhausted']:
+                await _parse_next(session, query_key)
+            page = results[position:page_end]
+            has_more = (len(results) > page_end or not session['exhausted']) \
+                and page_end < MAX_SEARCH_PAGES * SEARCH_PAGE_SIZE
+        if not page:
+            break
+        for result in page:
+            yield 'result', result
+        position += len(page)
+    yield 'end', encode_continuation(query_key, page_end) if has_more else None
+
+
+def _store_page(query_key: str, offset: int, results: list, continuation) -> dict:
+    """Cache a finished results page and feed its tracks to the local index"""
+    entry = {
+        'data': results,
+        'continuation': continuation,
+        'body': dumps({'results': results, 'total': len(results), 'continuation': continuation}),
+        'etag': make_etag('search', PROCESS_TAG, next(_search_versions)),
+        'timestamp': datetime.now()
+    }
+    search_cache[f"{query_key}#{offset}"] = entry
+    l2_cache.set_soon('search', f"{query_key}#{offset}", entry['body'], time.time() + SEARCH_CACHE_SECONDS)
+    record_tracks_soon(DB_PATH, search_result_tracks(results))
+    return entry
+
+
+def _search_entry_from_l2(body: bytes, expires_at: float) -> dict:
+    """Rebuild a search_cache entry from its stored body; the timestamp keeps the remaining TTL intact"""
+    page = json.loads(body)
+    return {
+        'data': page['results'],
+        'continuation': page.get('continuation'),
+        'body': body,
+        'etag': make_etag('search', PROCESS_TAG, next(_search_versions)),
+        'timestamp': datetime.fromtimestamp(expires_at - SEARCH_CACHE_SECONDS)
+    }
+
+
+def _resolve_search_page(q: str = None, continuation: str = None):
+    """(query_key, offset) for a fresh query or a continuation token"""
     if not PYTUBEFIX_AVAILABLE:
         raise Exception("YouTube search not available - pytubefix is required")
-
+    if continuation:
+        return decode_continuation(continuation)
     # Validate query
     if not q or not q.strip():
         raise ValueError("Search query cannot be empty")
+    return q.strip().lower(), 0
 
-    try:
-        cache_key = q.strip().lower()
-        cached = search_cache.get(cache_key)
-        if cached and (datetime.now() - cached['timestamp']).total_seconds() < SEARCH_CACHE_SECONDS:
-            return cached['data']
-
-        results = await asyncio.to_thread(_search_videos_sync, q)
-            
-        if not results:
-            return []
-            
-        search_results = []
-        
-        for video in results:
-            if len(search_results) >= 20:
-                break
-                
-            try:
-                # Basic validation
-                if not video.video_id:
-                    continue
-                
-                duration = video.length
-                if duration < 60: # Skip shorts
-                    continue
 
-                minutes = duration // 60
-                seconds = duration % 60
-                duration_str = f"{minutes}:{seconds:02d}"
-
-                search_result = SearchResult(
-                    id=video.video_id,
-                    title=video.title,
-                    channel=video.author,
-                    duration=duration_str,
-                    thumbnail=video.thumbnail_url,
-                    url=f"https://www.youtube.com/watch?v={video.video_id}"
-                )
-                search_results.append(search_result)
-                
-            except Exception:
-                continue
+async def _cached_page(query_key: str, offset: int):
+    cache_key = f"{query_key}#{offset}"
+    cached = search_cache.get(cache_key)
+    if cached and (datetime.now() - cached['timestamp']).total_seconds() < SEARCH_CACHE_SECONDS:
+        CACHE_REQUESTS.labels('search', 'hit').inc()
+        return cached
+    CACHE_REQUESTS.labels('search', 'miss').inc()
 
-        search_cache[cache_key] = {
-            'data': search_results,
-            'timestamp': datetime.now()
-        }
-        
-        return search_results
-        
+    stored = await l2_cache.aget('search', cache_key)
+    CACHE_REQUESTS.labels('search_l2', 'hit' if stored else 'miss').inc()
+    if stored is None:
+        return None
+    entry = search_cache[cache_key] = _search_entry_from_l2(*stored)
+    return entry
+
+
+async def _cached_search(q: str = None, continuation: str = None) -> dict:
+    """Cache entry for a results page: plain result dicts plus the pre-serialized /search body"""
+    query_key, offset = _resolve_search_page(q, continuation)
+    cached = await _cached_page(query_key, offset)
+    if cached:
+        return cached
+
+    results = []
+    next_token = None
+    try:
+        async for kind, value in iter_search_page(query_key, offset):
+            if kind == 'result':
+                results.append(value)
+            else:
+                next_token = value
     except Exception as e:
         raise Exception(f"Search failed: {str(e)}")
 
+    if not results and not next_token:
+        return EMPTY_SEARCH_ENTRY
+    return _store_page(query_key, offset, results, next_token)
+
+
+async def search_youtube_ndjson(q: str = None, continuation: str = None):
+    """Results page as NDJSON lines: one {"type": "result"} per video as it is parsed, then {"type": "end"}.
+
+    Raises ValueError before the first line for a bad query or token; later failures end the stream with
+    {"type": "error"}.
+    """
+    query_key, offset = _resolve_search_page(q, continuation)
+    cached = await _cached_page(query_key, offset)
+
+    async def lines():
+        if cached:
+            for result in cached['data']:
+                yield dumps({'type': 'result', 'result': result}) + b'\n'
+            yield dumps({'type': 'end', 'total': len(cached['data']), 'continuation': cached['continuation']}) + b'\n'
+            return
+        results = []
+        try:
+            async for kind, value in iter_search_page(query_key, offset):
+                if kind == 'result':
+                    results.append(value)
+                    yield dumps({'type': 'result', 'result': value}) + b'\n'
+                    continue
+                if results or value:
+                    _store_page(query_key, offset, results, value)
+                yield dumps({'type': 'end', 'total': len(results), 'continuation': value}) + b'\n'
+        except Exception as e:
+            logger.error(f"Streamed search failed for '{query_key}': {e}")
+            yield dumps({'type': 'error', 'detail': f"Search failed: {str(e)}"}) + b'\n'
+
+    return lines()
+
 
-async def get_stream_url_service(video_id: str):
-    """Get stream URL using pytubefix"""
+async def search_youtube_service(q: str):
+    """Enhanced YouTube search using pytubefix"""
+    return (await _cached_search(q))['data']
+
+
+async def search_youtube_entry(q: str = None, continuation: str = None) -> dict:
+    """Search cache entry with the ready-to-send SearchResponse body and its ETag"""
+    return await _cached_search(q, continuation)
+
+
+def search_max_age(entry: dict) -> int:
+    """Seconds the entry stays fresh in search_cache (0 for uncached results)"""
+    if 'timestamp' not in entry:
+        return 0
+    remaining = SEARCH_CACHE_SECONDS - (datetime.now() - entry['timestamp']).total_seconds()
+    return max(int(remaining), 0)
+
+
+async def get_stream_url_service(video_id: str, force_refresh: bool = False):
+    """Get stream URL using pytubefix; force_refresh skips the cache and re-extracts"""
     if not PYTUBEFIX_AVAILABLE:
         return create_error_response(
             "Service Unavailable",
@@ -141,25 +510,113 @@ async def get_stream_url_service(video_id: str):
             []
         )
 
-    # Check cache
-    cache_key = f"{video_id}_{datetime.now().strftime('%Y%m%d%H%M')}"
-    
-    if cache_key in stream_cache:
-        cached_data = stream_cache[cache_key]
-        cache_age = (datetime.now() - cached_data['timestamp']).total_seconds()
-        
-        if cache_age < STREAM_CACHE_SECONDS:
-            logger.info(f"Using cached stream URL for {video_id} (age: {cache_age:.0f}s)")
+    if not force_refresh:
+        cached = _cached_stream(video_id)
+        if cached is not None:
+            return cached
+
+        stored = await l2_cache.aget('stream', video_id)
+        CACHE_REQUESTS.labels('stream_l2', 'hit' if stored else 'miss').inc()
+        if stored is not None:
+            cached_data = stream_cache[video_id] = _stream_entry_from_l2(*stored)
             return PlayResponse(**cached_data['data'])
 
+    # Callers missing at the same moment (every listener of a room seeking at once) share one extraction
+    pending = _stream_inflight.get(video_id)
+    if pending is None:
+        pending = asyncio.ensure_future(_resolve_stream(video_id))
+        _stream_inflight[video_id] = pending
+        pending.add_done_callback(lambda _: _stream_inflight.pop(video_id, None))
+    # shield: one caller disconnecting must not cancel the extraction the others are waiting on
+    return await asyncio.shield(pending)
+
+
+def _cached_stream(video_id: str):
+    """PlayResponse or remembered ErrorResponse for video_id from memory, or None when it must be resolved"""
+    cached_data = stream_cache.get(video_id)
+    if cached_data and cached_data['fresh_until'] > time.time():
+        cache_age = (datetime.now() - cached_data['timestamp']).total_seconds()
+        logger.info(f"Using cached stream URL for {video_id} (age: {cache_age:.0f}s)")
+        CACHE_REQUESTS.labels('stream', 'hit').inc()
+        return PlayResponse(**cached_data['data'])
+    CACHE_REQUESTS.labels('stream', 'miss').inc()
+
+    failure = stream_failures.get(video_id)
+    if failure and failure['retry_at'] > time.time():
+        CACHE_REQUESTS.labels('stream_failure', 'hit').inc()
+        return ErrorResponse(**failure['response'])
+    return None
+
+
+def uncached_stream_count(video_ids: List[str]) -> int:
+    """How many distinct videos of a batch would need an extraction (no fresh URL or remembered failure)"""
+    now = time.time()
+    count = 0
+    for video_id in dict.fromkeys(video_ids):
+        cached = stream_cache.get(video_id)
+        failure = stream_failures.get(video_id)
+        if not (cached and cached['fresh_until'] > now) and not (failure and failure['retry_at'] > now):
+            count += 1
+    return count
+
+
+def _play_line(video_id: str, result) -> bytes:
+    if isinstance(result, ErrorResponse):
+        return dumps({'type': 'error', 'video_id': video_id, 'error': result.dict()}) + b'\n'
+    return dumps({'type': 'result', 'video_id': video_id, 'play': result.dict()}) + b'\n'
+
+
+def resolve_streams_ndjson(video_ids: List[str]):
+    """NDJSON lines resolving many videos: memory-cached ones first, then the rest in completion order.
+
+    Misses go through get_stream_url_service concurrently, so they share in-flight extractions and the
+    extractor concurrency limit with /play. Raises ValueError for an empty or oversized batch.
+    """
+    # Deduplicated, order kept: a queue may list the same track twice
+    video_ids = list(dict.fromkeys(video_ids))
+    if not video_ids:
+        raise ValueError("video_ids cannot be empty")
+    if len(video_ids) > MAX_PLAY_BATCH:
+        raise ValueError(f"At most {MAX_PLAY_BATCH} video IDs per batch")
+
+    async def lines():
+        failed = 0
+        pending = []
+        for video_id in video_ids:
+            cached = _cached_stream(video_id) if PYTUBEFIX_AVAILABLE and len(video_id) == 11 else None
+            if cached is None:
+                pending.append(video_id)
+                continue
+            failed += isinstance(cached, ErrorResponse)
+            yield _play_line(video_id, cached)
+
+        async def resolve(video_id):
+            return video_id, await get_stream_url_service(video_id)
+
+        tasks = [asyncio.ensure_future(resolve(v)) for v in pending]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                video_id, result = await next_done
+                failed += isinstance(result, ErrorResponse)
+                yield _play_line(video_id, result)
+        finally:
+            # Client went away: extractions already started keep running (shielded) and still fill the cache
+            for task in tasks:
+                task.cancel()
+        yield dumps({'type': 'end', 'total': len(video_ids), 'failed': failed}) + b'\n'
+
+    return lines()
+
+
+async def _resolve_stream(video_id: str):
     try:
-        extracted = await asyncio.to_thread(_extract_audio_sync, video_id)
+        extracted = await _hedged_extract(video_id)
         if not extracted:
-            return create_error_response(
+            return _remember_failure(video_id, create_error_response(
                 "Stream Not Found",
                 "Could not find a valid audio stream",
                 ["Video may be unavailable or region locked"]
-            )
+            ), STREAM_FAILURE_TTL_SECONDS)
 
         play_response = PlayResponse(
             stream_url=extracted['url'],
@@ -168,19 +625,94 @@ async def get_stream_url_service(video_id: str):
             stream_headers=None
         )
         
-        stream_cache[cache_key] = {
+        cached_data = stream_cache[video_id] = {
             'data': play_response.dict(),
-            'timestamp': datetime.now()
+            'timestamp': datetime.now(),
+            'fresh_until': _stream_fresh_until(extracted['url'], time.time())
         }
+        l2_cache.set_soon('stream', video_id,
+                          dumps({'data': cached_data['data'], 'timestamp': cached_data['timestamp'].timestamp()}),
+                          cached_data['fresh_until'])
+        stream_failures.pop(video_id, None)
         
         return play_response
                 
     except Exception as e:
-        return create_error_response(
+        return _remember_failure(video_id, create_error_response(
             "Stream Extraction Failed",
             str(e)[:200],
             [
                 "Video may be region-restricted",
                 "Try a different video"
             ]
-        )
\ No newline at end of file
+        ), _failure_ttl(e))
+
+
+def _failure_ttl(error: Exception) -> float:
+    """How long an extraction error is replayed: long when the video itself is gone, short otherwise"""
+    # Matched by name so pytubefix stays a deferred import
+    names = {cls.__name__ for cls in type(error).__mro__}
+    if 'VideoUnavailable' in names and not names & _TRANSIENT_UNAVAILABLE:
+        return STREAM_UNAVAILABLE_TTL_SECONDS
+    return STREAM_FAILURE_TTL_SECONDS
+
+
+def _remember_failure(video_id: str, response: ErrorResponse, ttl: float) -> ErrorResponse:
+    if ttl > 0:
+        stream_failures.pop(video_id, None)
+        stream_failures[video_id] = {'response': response.dict(), 'retry_at': time.time() + ttl}
+        while len(stream_failures) > MAX_STREAM_FAILURES:
+            del stream_failures[next(iter(stream_failures))]
+    return response
+
+
+def _stream_fresh_until(url: str, now: float) -> float:
+    """When a resolved URL stops being served from cache: before its signed expire=, and never past the max age"""
+    fresh_until = now + STREAM_URL_MAX_AGE_SECONDS
+    expire = parse_qs(urlsplit(url).query).get('expire')
+    if expire and expire[0].isdigit():
+        fresh_until = min(fresh_until, int(expire[0]) - STREAM_URL_EXPIRY_MARGIN_SECONDS)
+    return fresh_until
+
+
+def _stream_entry_from_l2(value: bytes, expires_at: float) -> dict:
+    stored = json.loads(value)
+    return {
+        'data': stored['data'],
+        'timestamp': datetime.fromtimestamp(stored['timestamp']),
+        'fresh_until': expires_at
+    }
+
+
+async def warm_caches():
+    """Open the disk tier and load its most used live entries into memory, so a restart starts warm."""
+    if not L2_CACHE_ENABLED or not await asyncio.to_thread(l2_cache.open):
+        return
+    searches = await asyncio.to_thread(l2_cache.hot, 'search', L2_WARM_ENTRIES)
+    streams = await asyncio.to_thread(l2_cache.hot, 'stream', L2_WARM_ENTRIES)
+    for key, body, expires_at in searches:
+        if key not in search_cache:
+            search_cache[key] = _search_entry_from_l2(body, expires_at)
+    for video_id, value, expires_at in streams:
+        if video_id not in stream_cache:
+            stream_cache[video_id] = _stream_entry_from_l2(value, expires_at)
+    logger.info(f"Warmed caches from disk: {len(searches)} search pages, {len(streams)} stream URLs")
+
+
+def close_caches():
+    l2_cache.close()
+
+
+def stream_fresh_until(video_id: str) -> float:
+    """Epoch seconds until which the cached URL for video_id is served (0 when not cached)"""
+    cached_data = stream_cache.get(video_id)
+    return cached_data['fresh_until'] if cached_data else 0.0
+
+
+def prune_stream_cache(now: float = None):
+    """Drop stream URLs that can no longer be served"""
+    now = time.time() if now is None else now
+    for video_id in [v for v, entry in stream_cache.items() if entry['fresh_until'] <= now]:
+        del stream_cache[video_id]
+    for video_id in [v for v, entry in stream_failures.items() if entry['retry_at'] <= now]:
+        del stream_failures[video_id]
@@ -0,0 +1 @@
+"""Offline benchmarks for the VoxWave backend; see benchmarks/README.md."""
@@ -0,0 +1,81 @@
+"""Local stand-in for googlevideo: serves deterministic audio bytes with HTTP Range support.
+
+Run with ``python -m benchmarks.fake_upstream --port 8765``.
+"""
+import argparse
+import asyncio
+import re
+
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import Response, StreamingResponse
+from starlette.routing import Route
+
+CHUNK_SIZE = 64 * 1024
+_RANGE_RE = re.compile(r'bytes=(\d*)-(\d*)')
+
+
+class DroppedConnection(Exception):
+    """Raised mid-body so the server aborts the connection, like a flaky googlevideo edge."""
+
+
+def create_app(size: int, rate_kbps: float = 0.0, drop_after: int = 0) -> Starlette:
+    pattern = bytes(range(256)) * 4096
+    payload = (pattern * (size // len(pattern) + 1))[:size]
+
+    async def audio(request: Request):
+        start, end = 0, size - 1
+        status = 200
+        match = _RANGE_RE.fullmatch(request.headers.get('range', '').strip())
+        if match and (match.group(1) or match.group(2)):
+            if match.group(1):
+                start = int(match.group(1))
+                end = int(match.group(2)) if match.group(2) else size - 1
+            else:
+                start = max(size - int(match.group(2)), 0)
+            end = min(end, size - 1)
+            if start > end:
+                return Response(status_code=416, headers={'Content-Range': f'bytes */{size}'})
+            status = 206
+
+        headers = {
+            'Accept-Ranges': 'bytes',
+            'Content-Length': str(end - start + 1),
+        }
+        if status == 206:
+            headers['Content-Range'] = f'bytes {start}-{end}/{size}'
+
+        async def body():
+            sent = 0
+            for offset in range(start, end + 1, CHUNK_SIZE):
+                if drop_after and sent >= drop_after:
+                    raise DroppedConnection(f'dropped after {sent} bytes')
+                chunk = payload[offset:min(offset + CHUNK_SIZE, end + 1)]
+                if rate_kbps:
+                    await asyncio.sleep(len(chunk) / (rate_kbps * 1024))
+                sent += len(chunk)
+                yield chunk
+
+        return StreamingResponse(body(), status_code=status, media_type='audio/mp4', headers=headers)
+
+    return Starlette(routes=[Route('/audio/{video_id}', audio)])
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--size', type=int, default=4 * 1024 * 1024, help='bytes per fake track')
+    parser.add_argument('--rate-kbps', type=float, default=0.0, help='throttle each response (0 = unthrottled)')
+    parser.add_argument('--drop-after', type=int, default=0,
+                        help='abort every response after roughly this many bytes (0 = never), to exercise resumes')
+    args = parser.parse_args()
+    uvicorn.run(create_app(args.size, args.rate_kbps, args.drop_after), host=args.host, port=args.port,
+                # Deliberate drops would otherwise log a traceback per response
+                log_level='critical' if args.drop_after else 'warning')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+"""Fake ``pytubefix`` module so the backend can be benchmarked without touching YouTube.
+
+Configured through environment variables so it also works inside a uvicorn subprocess:
+
+- ``BENCH_FAKE_LATENCY_MS`` / ``BENCH_FAKE_JITTER_MS``: simulated network time per search or extraction
+- ``BENCH_FAKE_FAILURE_RATE``: fraction of extractions that raise (0..1)
+- ``BENCH_FAKE_TAIL_RATE`` / ``BENCH_FAKE_TAIL_MS``: fraction of extractions that stall, and for how much longer
+- ``BENCH_FAKE_SEARCH_RESULTS``: videos returned per search page
+- ``BENCH_UPSTREAM_URL``: base URL of ``benchmarks.fake_upstream`` used for stream URLs
+"""
+import hashlib
+import importlib.machinery
+import os
+import random
+import sys
+import time
+import types
+from dataclasses import dataclass
+
+
+@dataclass
+class FakeConfig:
+    latency_ms: float = 50.0
+    jitter_ms: float = 20.0
+    failure_rate: float = 0.0
+    tail_rate: float = 0.0
+    tail_ms: float = 0.0
+    search_results: int = 25
+    upstream_url: str = 'http://127.0.0.1:8765'
+
+    @classmethod
+    def from_env(cls) -> 'FakeConfig':
+        return cls(
+            latency_ms=float(os.environ.get('BENCH_FAKE_LATENCY_MS', cls.latency_ms)),
+            jitter_ms=float(os.environ.get('BENCH_FAKE_JITTER_MS', cls.jitter_ms)),
+            failure_rate=float(os.environ.get('BENCH_FAKE_FAILURE_RATE', cls.failure_rate)),
+            tail_rate=float(os.environ.get('BENCH_FAKE_TAIL_RATE', cls.tail_rate)),
+            tail_ms=float(os.environ.get('BENCH_FAKE_TAIL_MS', cls.tail_ms)),
+            search_results=int(os.environ.get('BENCH_FAKE_SEARCH_RESULTS', cls.search_results)),
+            upstream_url=os.environ.get('BENCH_UPSTREAM_URL', cls.upstream_url).rstrip('/'),
+        )
+
+    def to_env(self) -> dict:
+        return {
+            'BENCH_FAKE_LATENCY_MS': str(self.latency_ms),
+            'BENCH_FAKE_JITTER_MS': str(self.jitter_ms),
+            'BENCH_FAKE_FAILURE_RATE': str(self.failure_rate),
+            'BENCH_FAKE_TAIL_RATE': str(self.tail_rate),
+            'BENCH_FAKE_TAIL_MS': str(self.tail_ms),
+            'BENCH_FAKE_SEARCH_RESULTS': str(self.search_results),
+            'BENCH_UPSTREAM_URL': self.upstream_url,
+        }
+
+
+def fake_video_id(seed: str) -> str:
+    alphabet = 'ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_'
+    digest = hashlib.sha256(seed.encode()).digest()
+    return ''.join(alphabet[b % 64] for b in digest[:11])
+
+
+def build_module(config: FakeConfig) -> types.ModuleType:
+    def simulate_network():
+        delay = config.latency_ms + random.uniform(-config.jitter_ms, config.jitter_ms)
+        if delay > 0:
+            time.sleep(delay / 1000)
+
+    class VideoUnavailable(Exception):
+        pass
+
+    class FakeStream:
+        def __init__(self, url):
+            self.url = url
+            self.abr = '128kbps'
+
+    class FakeStreamQuery:
+        def __init__(self, streams):
+            self._streams = streams
+
+        def filter(self, **kwargs):
+            return self
+
+        def order_by(self, attribute):
+            return self
+
+        def desc(self):
+            return self
+
+        def first(self):
+            return self._streams[0] if self._streams else None
+
+    class YouTube:
+        def __init__(self, url, client=None, **kwargs):
+            self.video_id = url.rsplit('v=', 1)[-1][:11]
+            self.client = client
+            self.title = f'Fake track {self.video_id}'
+            self.author = 'Fake Channel'
+            self.length = 180 + int(hashlib.md5(self.video_id.encode()).hexdigest()[:4], 16) % 240
+            self.thumbnail_url = f'https://i.ytimg.com/vi/{self.video_id}/hqdefault.jpg'
+
+        @property
+        def streams(self):
+            simulate_network()
+            if config.tail_rate and random.random() < config.tail_rate:
+                time.sleep(config.tail_ms / 1000)
+            if config.failure_rate and random.random() < config.failure_rate:
+                raise VideoUnavailable(f'{self.video_id} is unavailable')
+            expire = int(time.time()) + 6 * 3600
+            return FakeStreamQuery([FakeStream(f'{config.upstream_url}/audio/{self.video_id}?expire={expire}')])
+
+    class Search:
+        def __init__(self, query, client=None, **kwargs):
+            self.query = query
+            self._results = None
+            self._page = 0
+            self._current_continuation = None
+
+        def _fetch_page(self, page):
+            simulate_network()
+            videos = []
+            for i in range(config.search_results):
+                video = YouTube(f'https://www.youtube.com/watch?v={fake_video_id(f"{self.query}:{page}:{i}")}')
+                video.title = f'{self.query} #{page * config.search_results + i + 1}'
+                videos.append(video)
+            self._current_continuation = f'{self.query}:{page + 1}'
+            return videos
+
+        @property
+        def videos(self):
+            if self._results is None:
+                self._results = self._fetch_page(0)
+            return list(self._results)
+
+        def get_next_results(self):
+            if self._results is None:
+                self._results = self._fetch_page(0)
+                return
+            self._page += 1
+            self._results.extend(self._fetch_page(self._page))
+
+    module = types.ModuleType('pytubefix')
+    # A spec lets importlib.util.find_spec (used by backend.core.config) see the fake as installed
+    module.__spec__ = importlib.machinery.ModuleSpec('pytubefix', None)
+    module.YouTube = YouTube
+    module.Search = Search
+    module.__version__ = 'fake'
+    exceptions = types.ModuleType('pytubefix.exceptions')
+    exceptions.VideoUnavailable = VideoUnavailable
+    module.exceptions = exceptions
+    return module
+
+
+def install_fake_pytubefix(config: FakeConfig = None) -> types.ModuleType:
+    """Register the fake in ``sys.modules``; must run before ``backend`` is imported."""
+    module = build_module(config or FakeConfig.from_env())
+    sys.modules['pytubefix'] = module
+    sys.modules['pytubefix.exceptions'] = module.exceptions
+    return module
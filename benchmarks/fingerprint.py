@@ -0,0 +1,174 @@
+"""Audio fingerprint throughput and duplicate lookup benchmark for the upload analysis job.
+
+Runs in-process on synthetic tracks (no ffmpeg or real uploads needed) and reports:
+
+- fingerprinting throughput per core, as seconds of audio per CPU second, single process and across
+  ``--processes`` worker processes
+- bit error rates between a track and a simulated re-encode of it (low-pass, noise, resampled, trimmed)
+  versus an unrelated track, against the DUPLICATE_MAX_BIT_ERROR_RATE threshold
+- lookup latency of a near-duplicate against a SQLite index of ``--library-size`` tracks
+
+    python -m benchmarks.fingerprint --seconds 180 --tracks 8 --processes 1 4 --library-size 2000
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from backend.core.config import DUPLICATE_MAX_BIT_ERROR_RATE
+from backend.services.fingerprint import (
+    bit_error_rate,
+    compute_fingerprint,
+    find_duplicate,
+    index_fingerprint,
+    init_fingerprint_tables,
+)
+
+from .harness import git_revision, summarize_ms, write_report
+
+SAMPLE_RATE = 44100
+NOTES_HZ = (110, 147, 196, 220, 262, 330, 392, 440, 523, 659, 784, 880)
+
+
+def synthetic_track(seed: int, seconds: float, rate: int = SAMPLE_RATE):
+    """Stereo int16 'music': a decaying note with a fifth every quarter second, over a noise floor."""
+    rng = np.random.default_rng(seed)
+    count = int(seconds * rate)
+    beat = rate // 4
+    t = np.arange(beat) / rate
+    out = np.empty(count, dtype=np.float32)
+    for start in range(0, count, beat):
+        freq = rng.choice(NOTES_HZ) * rng.choice((1, 2))
+        note = np.sin(2 * np.pi * freq * t) * np.exp(-t * 6) * 0.5 + np.sin(3 * np.pi * freq * t) * np.exp(-t * 3) * 0.2
+        out[start:start + beat] = note[:count - start]
+    out += rng.normal(0, 0.02, count).astype(np.float32)
+    return _int16(np.stack([out, out * 0.9], axis=1))
+
+
+def reencoded(samples, rate: int = SAMPLE_RATE, seed: int = 0):
+    """What a lossy re-encode roughly does: drop the top of the spectrum, add noise, halve the rate, trim the start."""
+    mono = samples.mean(axis=1) / 32768
+    spectrum = np.fft.rfft(mono)
+    spectrum[int(len(spectrum) * 4000 / (rate / 2)):] = 0
+    filtered = np.fft.irfft(spectrum, len(mono)) + np.random.default_rng(seed).normal(0, 0.01, len(mono))
+    halved = filtered[::2][int(0.037 * rate / 2):]
+    return _int16(np.stack([halved, halved], axis=1)), rate // 2
+
+
+def _int16(values):
+    return (np.clip(values, -1, 1) * 32767).astype(np.int16)
+
+
+def _fingerprint_cpu(args) -> float:
+    seed, seconds = args
+    samples = synthetic_track(seed, seconds)
+    started = time.process_time()
+    compute_fingerprint(samples, SAMPLE_RATE)
+    return time.process_time() - started
+
+
+def throughput(seconds: float, tracks: int, processes: int) -> dict:
+    jobs = [(seed, seconds) for seed in range(tracks)]
+    started = time.perf_counter()
+    if processes <= 1:
+        cpu = [_fingerprint_cpu(job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(processes) as pool:
+            cpu = list(pool.map(_fingerprint_cpu, jobs))
+    wall = time.perf_counter() - started
+    audio = seconds * tracks
+    return {
+        'processes': processes,
+        'tracks': tracks,
+        'audio_seconds': audio,
+        'cpu_seconds': round(sum(cpu), 3),
+        # Wall time includes generating the synthetic audio; the per-core figure does not
+        'audio_seconds_per_cpu_second': round(audio / sum(cpu), 1),
+        'tracks_per_second_wall': round(tracks / wall, 2),
+    }
+
+
+def robustness(seconds: float) -> dict:
+    original = synthetic_track(1, seconds)
+    copy, copy_rate = reencoded(original)
+    fingerprints = {
+        'original': compute_fingerprint(original, SAMPLE_RATE),
+        'copy': compute_fingerprint(copy, copy_rate),
+        'unrelated': compute_fingerprint(synthetic_track(2, seconds), SAMPLE_RATE),
+    }
+
+    def best(a, b):
+        return round(min(r for r in (bit_error_rate(a, b, o) for o in range(-3, 4)) if r is not None), 3)
+
+    return {
+        'frames': len(fingerprints['original']),
+        'fingerprint_bytes': fingerprints['original'].nbytes,
+        'ber_copy': best(fingerprints['copy'], fingerprints['original']),
+        'ber_unrelated': best(fingerprints['unrelated'], fingerprints['original']),
+        'threshold': DUPLICATE_MAX_BIT_ERROR_RATE,
+    }
+
+
+def lookup(seconds: float, library_size: int, queries: int) -> dict:
+    """Index library_size tracks (random fingerprints as filler, one real original), then look up copies."""
+    rng = np.random.default_rng(7)
+    frames = len(compute_fingerprint(synthetic_track(0, seconds), SAMPLE_RATE))
+    conn = sqlite3.connect(':memory:')
+    init_fingerprint_tables(conn)
+    started = time.perf_counter()
+    for i in range(library_size - 1):
+        index_fingerprint(conn, f'filler-{i}', rng.integers(0, 2 ** 32, frames, dtype=np.uint64).astype(np.uint32))
+    original = synthetic_track(1, seconds)
+    index_fingerprint(conn, 'original', compute_fingerprint(original, SAMPLE_RATE))
+    conn.commit()
+    index_seconds = time.perf_counter() - started
+
+    latencies, found = [], 0
+    for seed in range(queries):
+        copy, copy_rate = reencoded(original, seed=seed)
+        fingerprint = compute_fingerprint(copy, copy_rate)
+        started = time.perf_counter()
+        match = find_duplicate(conn, fingerprint)
+        latencies.append(time.perf_counter() - started)
+        found += match is not None and match[0] == 'original'
+    unrelated = find_duplicate(conn, compute_fingerprint(synthetic_track(2, seconds), SAMPLE_RATE))
+    return {
+        'library_size': library_size,
+        'index_rows': conn.execute("SELECT COUNT(*) FROM fingerprint_hashes").fetchone()[0],
+        'index_seconds': round(index_seconds, 2),
+        'lookup_ms': summarize_ms(latencies),
+        'copies_found': f'{found}/{queries}',
+        'unrelated_flagged': unrelated is not None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--seconds', type=float, default=180, help='length of each synthetic track')
+    parser.add_argument('--tracks', type=int, default=8, help='tracks fingerprinted per throughput run')
+    parser.add_argument('--processes', type=int, nargs='+', default=[1, os.cpu_count() or 1],
+                        help='worker process counts to measure throughput with')
+    parser.add_argument('--library-size', type=int, default=2000, help='tracks in the lookup index')
+    parser.add_argument('--queries', type=int, default=10, help='near-duplicate lookups to time')
+    parser.add_argument('--output', help='also write the JSON report to this file')
+    args = parser.parse_args()
+
+    write_report({
+        'benchmark': 'fingerprint',
+        'revision': git_revision(),
+        'timestamp': int(time.time()),
+        'python': sys.version.split()[0],
+        'numpy': np.__version__,
+        'cpu_count': os.cpu_count(),
+        'throughput': [throughput(args.seconds, args.tracks, n) for n in args.processes],
+        'robustness': robustness(args.seconds),
+        'lookup': lookup(args.seconds, args.library_size, args.queries),
+    }, args.output)
+
+
+if __name__ == '__main__':
+    main()
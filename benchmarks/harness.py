@@ -0,0 +1,130 @@
+"""Process management and statistics shared by the benchmark scripts."""
+import contextlib
+import json
+import math
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import httpx
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def scratch_env(workdir: Path, extra: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+    """Environment that points every writable backend directory at ``workdir``."""
+    env = dict(os.environ)
+    env.update({
+        'VOXWAVE_DATA_DIR': str(workdir / 'data'),
+        'VOXWAVE_UPLOAD_DIR': str(workdir / 'uploads'),
+        'VOXWAVE_CACHE_DIR': str(workdir / 'cache'),
+        'PYTHONPATH': str(ROOT_DIR) + os.pathsep + env.get('PYTHONPATH', ''),
+    })
+    # Load generators are a single client; measure the server, not the per-client limiter
+    env.setdefault('RATE_LIMIT_ENABLED', 'false')
+    env.update(extra or {})
+    return env
+
+
+def wait_for_http(url: str, timeout: float = 30.0, process: Optional[subprocess.Popen] = None) -> float:
+    """Poll ``url`` until it answers 2xx; returns seconds waited."""
+    start = time.perf_counter()
+    deadline = start + timeout
+    while time.perf_counter() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f'process exited with {process.returncode} before {url} came up')
+        try:
+            if httpx.get(url, timeout=1.0).is_success:
+                return time.perf_counter() - start
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.01)
+    raise TimeoutError(f'{url} not healthy after {timeout}s')
+
+
+@contextlib.contextmanager
+def spawn(args: List[str], env: Dict[str, str]):
+    process = subprocess.Popen([sys.executable, *args], cwd=str(ROOT_DIR), env=env)
+    try:
+        yield process
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+@contextlib.contextmanager
+def backend_stack(fake_env: Dict[str, str], upstream_args: Iterable[str] = (), server_env: Optional[Dict[str, str]] = None):
+    """Boot the fake upstream and the backend in subprocesses; yields ``(base_url, server_process, workdir)``."""
+    with tempfile.TemporaryDirectory(prefix='voxwave-bench-') as tmp:
+        workdir = Path(tmp)
+        upstream_port = free_port()
+        server_port = free_port()
+        env = scratch_env(workdir, {**fake_env, 'BENCH_UPSTREAM_URL': f'http://127.0.0.1:{upstream_port}'})
+        env.update(server_env or {})
+        with spawn(['-m', 'benchmarks.fake_upstream', '--port', str(upstream_port), *upstream_args], env) as upstream:
+            wait_for_http(f'http://127.0.0.1:{upstream_port}/audio/warmup', process=upstream)
+            with spawn(['-m', 'benchmarks.server', '--port', str(server_port)], env) as server:
+                base_url = f'http://127.0.0.1:{server_port}'
+                wait_for_http(f'{base_url}/health', process=server)
+                yield base_url, server, workdir
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(pct / 100 * len(sorted_values)) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+
+def summarize_ms(latencies_seconds: List[float]) -> Dict[str, float]:
+    values = sorted(v * 1000 for v in latencies_seconds)
+    return {
+        'p50_ms': round(percentile(values, 50), 3),
+        'p95_ms': round(percentile(values, 95), 3),
+        'p99_ms': round(percentile(values, 99), 3),
+        'max_ms': round(values[-1], 3) if values else 0.0,
+        'mean_ms': round(sum(values) / len(values), 3) if values else 0.0,
+    }
+
+
+def process_stats(pid: int) -> Dict[str, Optional[float]]:
+    """RSS and CPU seconds of ``pid`` from /proc (Linux only; ``None`` elsewhere)."""
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            rss_kb = next(int(line.split()[1]) for line in f if line.startswith('VmRSS:'))
+        with open(f'/proc/{pid}/stat') as f:
+            fields = f.read().rsplit(')', 1)[1].split()
+        ticks = os.sysconf('SC_CLK_TCK')
+        return {'rss_bytes': rss_kb * 1024, 'cpu_seconds': (int(fields[11]) + int(fields[12])) / ticks}
+    except (OSError, StopIteration, ValueError, IndexError):
+        return {'rss_bytes': None, 'cpu_seconds': None}
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=str(ROOT_DIR),
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def write_report(report: dict, output: Optional[str]):
+    text = json.dumps(report, indent=2, sort_keys=True)
+    if output:
+        Path(output).write_text(text + '\n', encoding='utf-8')
+    print(text)
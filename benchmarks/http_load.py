@@ -0,0 +1,200 @@
+"""HTTP load test against a fully offline backend.
+
+Boots ``backend.main:app`` with the fake pytubefix and a fake googlevideo upstream, then drives each
+scenario with a fixed number of closed-loop workers and prints a JSON report.
+
+    python -m benchmarks.http_load --concurrency 32 --requests 500 --output bench.json
+"""
+import argparse
+import asyncio
+import io
+import random
+import time
+from typing import Awaitable, Callable, Dict, List
+
+import httpx
+
+from .fakes import FakeConfig, fake_video_id
+from .harness import backend_stack, git_revision, process_stats, summarize_ms, write_report
+
+Scenario = Callable[[httpx.AsyncClient, random.Random], Awaitable[httpx.Response]]
+
+
+class Fixture:
+    """State created once before the timed runs (users, uploaded file, query pool)."""
+
+    def __init__(self, query_pool: int, range_bytes: int):
+        self.queries = [f'benchmark query {i}' for i in range(query_pool)]
+        self.video_ids = [fake_video_id(f'video {i}') for i in range(query_pool)]
+        self.range_bytes = range_bytes
+        self.username = 'bench_user'
+        self.password = 'bench-password'
+        self.token = ''
+        self.song = ''
+        self.song_size = 0
+
+    async def setup(self, client: httpx.AsyncClient):
+        resp = await client.post('/auth/register', json={'username': self.username, 'password': self.password})
+        resp.raise_for_status()
+        self.token = resp.json()['token']
+        for video_id in self.video_ids[:20]:
+            await client.post('/me/library', headers=self.auth, json={
+                'track_id': video_id, 'source': 'youtube', 'title': f'Saved {video_id}', 'artist': 'Bench',
+            })
+        audio = bytes(range(256)) * 4 * 1024 * 4
+        resp = await client.post('/upload', files={'file': ('bench.mp3', io.BytesIO(audio), 'audio/mpeg')})
+        resp.raise_for_status()
+        self.song = resp.json()['filename']
+        self.song_size = len(audio)
+
+    @property
+    def auth(self) -> Dict[str, str]:
+        return {'Authorization': f'Bearer {self.token}'}
+
+    def random_range(self, rng: random.Random, size: int) -> str:
+        start = rng.randrange(0, max(size - self.range_bytes, 1))
+        return f'bytes={start}-{start + self.range_bytes - 1}'
+
+
+def build_scenarios(fx: Fixture, upstream_size: int) -> Dict[str, Scenario]:
+    async def search(client, rng):
+        return await client.get('/search', params={'q': rng.choice(fx.queries)})
+
+    async def play(client, rng):
+        return await client.get(f'/play/{rng.choice(fx.video_ids)}')
+
+    async def stream(client, rng):
+        headers = {'Range': fx.random_range(rng, upstream_size)}
+        return await client.get(f'/stream/{rng.choice(fx.video_ids)}', headers=headers)
+
+    async def library(client, rng):
+        return await client.get('/library')
+
+    async def songs(client, rng):
+        return await client.get(f'/songs/{fx.song}', headers={'Range': fx.random_range(rng, fx.song_size)})
+
+    async def me_library(client, rng):
+        return await client.get('/me/library', headers=fx.auth)
+
+    async def auth_login(client, rng):
+        return await client.post('/auth/login', json={'username': fx.username, 'password': fx.password})
+
+    async def auth_register(client, rng):
+        name = f'user_{rng.getrandbits(48):x}'
+        return await client.post('/auth/register', json={'username': name, 'password': fx.password})
+
+    return {
+        'search': search,
+        'play': play,
+        'stream_range': stream,
+        'library': library,
+        'songs_range': songs,
+        'me_library': me_library,
+        'auth_login': auth_login,
+        'auth_register': auth_register,
+    }
+
+
+async def run_scenario(base_url: str, scenario: Scenario, concurrency: int, total: int, seed: int) -> dict:
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    errors = 0
+    body_bytes = 0
+    remaining = total
+
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=60.0, limits=limits) as client:
+        async def worker(worker_id: int):
+            nonlocal remaining, errors, body_bytes
+            rng = random.Random(seed * 1000 + worker_id)
+            while remaining > 0:
+                remaining -= 1
+                start = time.perf_counter()
+                try:
+                    resp = await scenario(client, rng)
+                except httpx.HTTPError:
+                    errors += 1
+                    continue
+                latencies.append(time.perf_counter() - start)
+                statuses[str(resp.status_code)] = statuses.get(str(resp.status_code), 0) + 1
+                body_bytes += len(resp.content)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(i) for i in range(concurrency)))
+        wall = time.perf_counter() - started
+
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'status_codes': statuses,
+        'wall_seconds': round(wall, 3),
+        'throughput_rps': round(len(latencies) / wall, 2) if wall else 0.0,
+        'bytes_received': body_bytes,
+        **summarize_ms(latencies),
+    }
+
+
+async def run_all(base_url: str, server_pid: int, args, upstream_size: int) -> dict:
+    fx = Fixture(args.query_pool, args.range_bytes)
+    async with httpx.AsyncClient(base_url=base_url, timeout=30.0) as client:
+        await fx.setup(client)
+
+    scenarios = build_scenarios(fx, upstream_size)
+    selected = args.scenarios or list(scenarios)
+    results = {}
+    for name in selected:
+        before = process_stats(server_pid)
+        # Slow, CPU-bound endpoints (PBKDF2) get fewer requests so a run stays short
+        total = max(args.requests // 10, args.concurrency) if name.startswith('auth_') else args.requests
+        result = await run_scenario(base_url, scenarios[name], args.concurrency, total, args.seed)
+        after = process_stats(server_pid)
+        if before['cpu_seconds'] is not None and after['cpu_seconds'] is not None:
+            result['server_cpu_seconds'] = round(after['cpu_seconds'] - before['cpu_seconds'], 3)
+            result['server_rss_bytes'] = after['rss_bytes']
+        results[name] = result
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--requests', type=int, default=300, help='requests per scenario')
+    parser.add_argument('--scenarios', nargs='*', help='subset of scenarios to run (default: all)')
+    parser.add_argument('--query-pool', type=int, default=50, help='distinct queries/video ids (controls cache hit rate)')
+    parser.add_argument('--range-bytes', type=int, default=256 * 1024, help='bytes requested per Range request')
+    parser.add_argument('--upstream-size', type=int, default=4 * 1024 * 1024, help='bytes per fake upstream track')
+    parser.add_argument('--latency-ms', type=float, default=FakeConfig.latency_ms, help='fake pytubefix latency')
+    parser.add_argument('--jitter-ms', type=float, default=FakeConfig.jitter_ms)
+    parser.add_argument('--failure-rate', type=float, default=FakeConfig.failure_rate)
+    parser.add_argument('--tail-rate', type=float, default=FakeConfig.tail_rate, help='fraction of extractions that stall')
+    parser.add_argument('--tail-ms', type=float, default=FakeConfig.tail_ms, help='extra latency of a stalled extraction')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='also write the JSON report to this file')
+    args = parser.parse_args()
+
+    fake = FakeConfig(latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, failure_rate=args.failure_rate,
+                      tail_rate=args.tail_rate, tail_ms=args.tail_ms)
+    with backend_stack(fake.to_env(), ['--size', str(args.upstream_size)]) as (base_url, server, _):
+        scenarios = asyncio.run(run_all(base_url, server.pid, args, args.upstream_size))
+
+    write_report({
+        'benchmark': 'http_load',
+        'revision': git_revision(),
+        'timestamp': int(time.time()),
+        'config': {
+            'concurrency': args.concurrency,
+            'requests': args.requests,
+            'query_pool': args.query_pool,
+            'range_bytes': args.range_bytes,
+            'fake_latency_ms': args.latency_ms,
+            'fake_jitter_ms': args.jitter_ms,
+            'fake_failure_rate': args.failure_rate,
+            'fake_tail_rate': args.tail_rate,
+            'fake_tail_ms': args.tail_ms,
+        },
+        'scenarios': scenarios,
+    }, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,211 @@
+"""WebSocket room fan-out benchmark.
+
+Creates rooms through ``/create-room``, attaches simulated listeners to ``/ws/{room_id}/{user_id}``, has
+each room's host emit play/seek/song_change at a fixed rate and measures host-to-listener delivery latency,
+server memory per connection and server CPU. Sweeps several listener counts in one run:
+
+    python -m benchmarks.room_fanout --rooms 20 --listeners 10 100 500 --rate 4 --duration 10
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import resource
+import time
+from typing import Dict, List
+
+import httpx
+
+from .fakes import FakeConfig
+from .harness import backend_stack, git_revision, process_stats, summarize_ms, write_report
+
+try:
+    import websockets
+except ImportError:  # pragma: no cover - shipped with uvicorn[standard]
+    websockets = None
+
+EVENT_TYPES = ('play', 'seek', 'song_change')
+HOST_NAME = 'bench_host'
+
+
+def raise_fd_limit():
+    """Thousands of sockets need more than the default 1024 descriptors (inherited by the server)."""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard == resource.RLIM_INFINITY or soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def sequence_of(message: dict):
+    """Recover the host's sequence number from a broadcast room update."""
+    data = message.get('data') or {}
+    if message.get('type') == 'song_change':
+        return (data.get('current_song') or {}).get('seq')
+    return data.get('current_time')
+
+
+class Room:
+    def __init__(self, room_id: str):
+        self.room_id = room_id
+        self.sent_at: Dict[int, float] = {}
+        self.latencies: List[float] = []
+        self.received = 0
+        self.sent = 0
+
+
+async def listen(ws_url: str, room: Room, user_id: str, ready: asyncio.Event, stop: asyncio.Event, gate: asyncio.Semaphore):
+    async with gate:
+        ws = await websockets.connect(f'{ws_url}/ws/{room.room_id}/{user_id}', max_queue=None, ping_interval=None)
+    try:
+        await ws.recv()  # room_state
+        ready.set()
+        while not stop.is_set():
+            try:
+                raw = await asyncio.wait_for(ws.recv(), timeout=0.5)
+            except asyncio.TimeoutError:
+                continue
+            now = time.perf_counter()
+            message = json.loads(raw)
+            if message.get('type') == 'ping':
+                await ws.send('{"type": "pong"}')
+                continue
+            seq = sequence_of(message)
+            sent_at = room.sent_at.get(seq) if isinstance(seq, (int, float)) else None
+            if sent_at is not None:
+                room.latencies.append(now - sent_at)
+                room.received += 1
+    finally:
+        await ws.close()
+
+
+async def host(ws_url: str, room: Room, rate: float, duration: float):
+    async with websockets.connect(f'{ws_url}/ws/{room.room_id}/{HOST_NAME}', max_queue=None, ping_interval=None) as ws:
+        await ws.recv()  # room_state
+        interval = 1.0 / rate
+        deadline = time.perf_counter() + duration
+        next_send = time.perf_counter()
+        for seq in itertools.count(1):
+            if next_send >= deadline:
+                break
+            await asyncio.sleep(max(next_send - time.perf_counter(), 0))
+            msg_type = EVENT_TYPES[seq % len(EVENT_TYPES)]
+            message = {'type': msg_type, 'current_time': seq}
+            if msg_type == 'song_change':
+                message['song'] = {'id': f'yt-bench{seq:07d}', 'title': f'Bench {seq}', 'source': 'youtube', 'seq': seq}
+            room.sent_at[seq] = time.perf_counter()
+            await ws.send(json.dumps(message))
+            room.sent += 1
+            next_send += interval
+        # Leave in-flight broadcasts time to land before the listeners stop
+        await asyncio.sleep(1.0)
+
+
+async def run_step(base_url: str, server_pid: int, token: str, rooms: int, listeners: int,
+                   rate: float, duration: float, connect_concurrency: int) -> dict:
+    ws_url = base_url.replace('http://', 'ws://', 1)
+    async with httpx.AsyncClient(base_url=base_url, timeout=30.0) as client:
+        room_objs = []
+        for _ in range(rooms):
+            resp = await client.post('/create-room', headers={'Authorization': f'Bearer {token}'})
+            resp.raise_for_status()
+            room_objs.append(Room(resp.json()['room_id']))
+
+    baseline = process_stats(server_pid)
+    stop = asyncio.Event()
+    gate = asyncio.Semaphore(connect_concurrency)
+    listener_tasks = []
+    ready_events = []
+    connect_started = time.perf_counter()
+    for room in room_objs:
+        for i in range(listeners):
+            ready = asyncio.Event()
+            ready_events.append(ready)
+            listener_tasks.append(asyncio.create_task(listen(ws_url, room, f'listener_{i}', ready, stop, gate)))
+    await asyncio.wait_for(asyncio.gather(*(e.wait() for e in ready_events)), timeout=300)
+    connect_seconds = time.perf_counter() - connect_started
+
+    connected = process_stats(server_pid)
+    harness_cpu_before = resource.getrusage(resource.RUSAGE_SELF)
+    await asyncio.gather(*(host(ws_url, room, rate, duration) for room in room_objs))
+    emitted = process_stats(server_pid)
+    harness_cpu_after = resource.getrusage(resource.RUSAGE_SELF)
+
+    stop.set()
+    await asyncio.gather(*listener_tasks, return_exceptions=True)
+
+    connections = rooms * (listeners + 1)
+    latencies = [lat for room in room_objs for lat in room.latencies]
+    expected = sum(room.sent for room in room_objs) * listeners
+    result = {
+        'rooms': rooms,
+        'listeners_per_room': listeners,
+        'connections': connections,
+        'connect_seconds': round(connect_seconds, 3),
+        'messages_sent': sum(room.sent for room in room_objs),
+        'deliveries_expected': expected,
+        'deliveries_received': len(latencies),
+        'delivery_ratio': round(len(latencies) / expected, 4) if expected else None,
+        'latency': summarize_ms(latencies),
+        'harness_cpu_seconds': round(
+            (harness_cpu_after.ru_utime + harness_cpu_after.ru_stime)
+            - (harness_cpu_before.ru_utime + harness_cpu_before.ru_stime), 3),
+    }
+    if baseline['rss_bytes'] is not None and connected['rss_bytes'] is not None:
+        result['server_rss_bytes'] = connected['rss_bytes']
+        result['server_bytes_per_connection'] = round((connected['rss_bytes'] - baseline['rss_bytes']) / connections)
+    if connected['cpu_seconds'] is not None and emitted['cpu_seconds'] is not None:
+        server_cpu = emitted['cpu_seconds'] - connected['cpu_seconds']
+        result['server_cpu_seconds'] = round(server_cpu, 3)
+        result['server_cpu_utilization'] = round(server_cpu / (duration + 1.0), 3)
+    return result
+
+
+async def run_all(base_url: str, server_pid: int, args) -> List[dict]:
+    async with httpx.AsyncClient(base_url=base_url, timeout=30.0) as client:
+        resp = await client.post('/auth/register', json={'username': HOST_NAME, 'password': 'bench-password'})
+        resp.raise_for_status()
+        token = resp.json()['token']
+
+    steps = []
+    for listeners in args.listeners:
+        steps.append(await run_step(base_url, server_pid, token, args.rooms, listeners,
+                                    args.rate, args.duration, args.connect_concurrency))
+        # Let closed sockets drain before the next, larger step
+        await asyncio.sleep(1.0)
+    return steps
+
+
+def main():
+    if websockets is None:
+        raise SystemExit('room_fanout needs the websockets package (pip install "uvicorn[standard]")')
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rooms', type=int, default=10, help='rooms running in parallel')
+    parser.add_argument('--listeners', type=int, nargs='+', default=[10, 100], help='listeners per room, one step each')
+    parser.add_argument('--rate', type=float, default=2.0, help='host events per second per room')
+    parser.add_argument('--duration', type=float, default=10.0, help='seconds each host emits for')
+    parser.add_argument('--connect-concurrency', type=int, default=200, help='simultaneous WebSocket handshakes')
+    parser.add_argument('--output', help='also write the JSON report to this file')
+    args = parser.parse_args()
+
+    raise_fd_limit()
+    # Keep the reaper out of the measurement window
+    server_env = {'ROOM_HEARTBEAT_INTERVAL_SECONDS': '3600'}
+    with backend_stack(FakeConfig().to_env(), server_env=server_env) as (base_url, server, _):
+        steps = asyncio.run(run_all(base_url, server.pid, args))
+
+    write_report({
+        'benchmark': 'room_fanout',
+        'revision': git_revision(),
+        'timestamp': int(time.time()),
+        'config': {
+            'rooms': args.rooms,
+            'listeners': args.listeners,
+            'rate_per_room': args.rate,
+            'duration_seconds': args.duration,
+        },
+        'steps': steps,
+    }, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+"""Response serialization micro-benchmark for ``/search`` and ``/me/library``.
+
+Runs in-process and measures CPU time per response body for the old path (pydantic models validated
+again through ``response_model`` and rendered by ``JSONResponse``) and the current one (plain dicts
+rendered by ``FastJSONResponse``, or cached bytes sent as-is on a search cache hit):
+
+    python -m benchmarks.serialization --iterations 2000 --library-sizes 20 200 1000
+"""
+import argparse
+import asyncio
+import sys
+import time
+from typing import Callable, Dict, List
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+
+from backend.core.serialization import ORJSON_AVAILABLE, FastJSONResponse, RawJSONResponse, dumps
+from backend.models.schemas import SavedTracksResponse, SearchResponse, SearchResult
+
+from .fakes import fake_video_id
+from .harness import git_revision, write_report
+
+SEARCH_FIELD = create_model_field(name='Response_search', type_=SearchResponse, mode='serialization')
+LIBRARY_FIELD = create_model_field(name='Response_library', type_=SavedTracksResponse, mode='serialization')
+
+
+def search_rows(count: int = 20) -> List[dict]:
+    rows = []
+    for i in range(count):
+        video_id = fake_video_id(f'serialization {i}')
+        rows.append({
+            'id': video_id,
+            'title': f'Benchmark track number {i} (Official Audio)',
+            'channel': f'Channel {i % 7}',
+            'duration': f'{3 + i % 4}:{(i * 7) % 60:02d}',
+            'thumbnail': f'https://i.ytimg.com/vi/{video_id}/hqdefault.jpg',
+            'url': f'https://www.youtube.com/watch?v={video_id}',
+        })
+    return rows
+
+
+def library_payload(count: int) -> dict:
+    tracks = [{
+        'track_id': fake_video_id(f'saved {i}'),
+        'source': 'youtube',
+        'title': f'Saved track {i}',
+        'artist': f'Artist {i % 13}',
+        'thumbnail': f'https://i.ytimg.com/vi/{fake_video_id(f"saved {i}")}/hqdefault.jpg',
+        'created_at': 1_700_000_000 + i,
+    } for i in range(count)]
+    return {'tracks': tracks, 'next_cursor': None, 'version': count, 'deleted': [], 'full': True}
+
+
+def cpu_per_call(func: Callable[[], bytes], iterations: int) -> dict:
+    func()  # warm caches and lazy imports
+    started = time.process_time()
+    for _ in range(iterations):
+        body = func()
+    elapsed = time.process_time() - started
+    return {'cpu_us': round(elapsed / iterations * 1e6, 2), 'body_bytes': len(body)}
+
+
+def compare(legacy: Callable[[], bytes], fast: Callable[[], bytes], iterations: int) -> dict:
+    before = cpu_per_call(legacy, iterations)
+    after = cpu_per_call(fast, iterations)
+    return {
+        'legacy': before,
+        'fast': after,
+        'cpu_us_saved': round(before['cpu_us'] - after['cpu_us'], 2),
+        'speedup': round(before['cpu_us'] / after['cpu_us'], 1) if after['cpu_us'] else None,
+    }
+
+
+def run(iterations: int, library_sizes: List[int]) -> Dict[str, dict]:
+    loop = asyncio.new_event_loop()
+
+    def respond(field, content) -> bytes:
+        # What FastAPI does for a route returning a model with response_model set
+        encoded = loop.run_until_complete(serialize_response(field=field, response_content=content))
+        return JSONResponse(content=encoded).body
+
+    rows = search_rows()
+    cached_models = [SearchResult(**row) for row in rows]
+    cached_body = dumps({'results': rows, 'total': len(rows)})
+
+    results = {
+        'search_cache_hit': compare(
+            lambda: respond(SEARCH_FIELD, SearchResponse(results=cached_models, total=len(cached_models))),
+            lambda: RawJSONResponse(content=cached_body).body,
+            iterations,
+        ),
+        'search_cache_miss': compare(
+            lambda: respond(SEARCH_FIELD, SearchResponse(
+                results=[SearchResult(**row) for row in rows], total=len(rows))),
+            lambda: RawJSONResponse(content=dumps({'results': [dict(row) for row in rows], 'total': len(rows)})).body,
+            iterations,
+        ),
+    }
+    for size in library_sizes:
+        payload = library_payload(size)
+        results[f'me_library_{size}'] = compare(
+            lambda: respond(LIBRARY_FIELD, SavedTracksResponse(**payload)),
+            lambda: FastJSONResponse(content=payload).body,
+            max(iterations * 20 // max(size, 20), 50),
+        )
+    loop.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--iterations', type=int, default=2000, help='responses rendered per search case')
+    parser.add_argument('--library-sizes', type=int, nargs='+', default=[20, 200, 1000], help='saved tracks per response')
+    parser.add_argument('--output', help='also write the JSON report to this file')
+    args = parser.parse_args()
+
+    write_report({
+        'benchmark': 'serialization',
+        'revision': git_revision(),
+        'timestamp': int(time.time()),
+        'python': sys.version.split()[0],
+        'orjson': ORJSON_AVAILABLE,
+        'cases': run(args.iterations, args.library_sizes),
+    }, args.output)
+
+
+if __name__ == '__main__':
+    main()
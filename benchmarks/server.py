@@ -0,0 +1,24 @@
+"""Run ``backend.main:app`` with the fake pytubefix installed.
+
+Run with ``python -m benchmarks.server --port 8900``; fake behaviour comes from ``BENCH_*`` variables.
+"""
+import argparse
+
+from .fakes import install_fake_pytubefix
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--log-level', default='warning')
+    args = parser.parse_args()
+
+    install_fake_pytubefix()
+
+    import uvicorn
+    uvicorn.run('backend.main:app', host=args.host, port=args.port, log_level=args.log_level)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,91 @@
+"""Cold-start benchmark for the API process.
+
+Measures, each in a fresh interpreter and repeated ``--runs`` times:
+
+- ``import``: wall time of ``import backend.main``, plus the slowest packages from ``-X importtime``
+- ``healthy``: time from spawning uvicorn to the first 200 from ``/health``
+
+    python -m benchmarks.startup --runs 5 --output startup.json
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+from .harness import ROOT_DIR, free_port, git_revision, scratch_env, spawn, wait_for_http, write_report
+
+IMPORT_SNIPPET = 'import time; t = time.perf_counter(); import backend.main; print(time.perf_counter() - t)'
+
+
+def measure_import(env: Dict[str, str]) -> float:
+    out = subprocess.check_output([sys.executable, '-c', IMPORT_SNIPPET], cwd=str(ROOT_DIR), env=env,
+                                  stderr=subprocess.DEVNULL, text=True)
+    return float(out.strip().splitlines()[-1])
+
+
+def slowest_imports(env: Dict[str, str], top: int) -> List[dict]:
+    """Top-level packages ranked by the import time spent in their own modules (``-X importtime`` self time)."""
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import backend.main'], cwd=str(ROOT_DIR),
+                          env=env, capture_output=True, text=True, check=True)
+    totals: Dict[str, int] = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or line.count('|') != 2:
+            continue
+        self_us, _, name = line[len('import time:'):].split('|')
+        if not self_us.strip().isdigit():
+            continue  # header row
+        package = name.strip().split('.')[0]
+        totals[package] = totals.get(package, 0) + int(self_us)
+    ranked = sorted(totals.items(), key=lambda kv: kv[1], reverse=True)[:top]
+    return [{'package': name, 'self_ms': round(us / 1000, 2)} for name, us in ranked]
+
+
+def measure_healthy(env: Dict[str, str]) -> float:
+    port = free_port()
+    started = time.perf_counter()
+    with spawn(['-m', 'uvicorn', 'backend.main:app', '--port', str(port), '--log-level', 'warning'], env) as server:
+        wait_for_http(f'http://127.0.0.1:{port}/health', timeout=60.0, process=server)
+        return time.perf_counter() - started
+
+
+def describe(samples: List[float]) -> dict:
+    return {
+        'runs_ms': [round(s * 1000, 1) for s in samples],
+        'median_ms': round(statistics.median(samples) * 1000, 1),
+        'min_ms': round(min(samples) * 1000, 1),
+        'max_ms': round(max(samples) * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=10, help='slowest packages to list')
+    parser.add_argument('--output', help='also write the JSON report to this file')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='voxwave-startup-') as tmp:
+        env = scratch_env(Path(tmp))
+        # Warm the OS page cache and .pyc files so runs compare interpreter work, not disk
+        measure_import(env)
+        imports = [measure_import(env) for _ in range(args.runs)]
+        healthy = [measure_healthy(env) for _ in range(args.runs)]
+        slowest = slowest_imports(env, args.top)
+
+    write_report({
+        'benchmark': 'startup',
+        'revision': git_revision(),
+        'timestamp': int(time.time()),
+        'python': sys.version.split()[0],
+        'import_backend_main': describe(imports),
+        'time_to_healthy': describe(healthy),
+        'slowest_imports': slowest,
+    }, args.output)
+
+
+if __name__ == '__main__':
+    main()
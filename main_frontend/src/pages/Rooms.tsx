@@ -84,6 +84,11 @@ export default function Rooms() {
       try {
         const data = JSON.parse(event.data);
 
+        if (data.type === 'ping') {
+          ws.send(JSON.stringify({ type: 'pong' }));
+          return;
+        }
+
         if (data.type === 'room_state' && data.data) {
           const roomData = data.data;
           setActiveRoom(prev => prev ? {
@@ -0,0 +1,34 @@
+import os
+import tempfile
+
+import pytest
+
+# Point every writable location at a scratch directory before the backend reads its config
+_SCRATCH = tempfile.mkdtemp(prefix='voxwave-tests-')
+for _name in ('VOXWAVE_DATA_DIR', 'VOXWAVE_UPLOAD_DIR', 'VOXWAVE_CACHE_DIR'):
+    os.environ[_name] = os.path.join(_SCRATCH, _name.rsplit('_', 2)[1].lower())
+# TestClient connects as "testclient"; trust it like the reverse proxy in front of a deployment
+os.environ['FORWARDED_ALLOW_IPS'] = 'testclient'
+
+
+@pytest.fixture
+def client():
+    from fastapi.testclient import TestClient
+
+    from backend.core import ratelimit
+    from backend.main import app
+
+    # Every test starts with full rate-limit buckets
+    for limiter in ratelimit._limiters.values():
+        limiter.buckets.clear()
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+@pytest.fixture
+def auth_headers(client):
+    import uuid
+
+    response = client.post('/auth/register', json={'username': f'user{uuid.uuid4().hex[:8]}', 'password': 'pass1234'})
+    assert response.status_code == 200, response.text
+    return {'Authorization': f"Bearer {response.json()['token']}"}
@@ -0,0 +1,91 @@
+import asyncio
+import io
+import struct
+import time
+import wave
+
+import numpy as np
+
+from backend.core.config import UPLOAD_DIR
+from backend.services.audio_analysis import _read_wav_pipe, _sub_block_energies, decode_audio, measure_loudness
+
+RATE = 44100
+
+
+def _stereo_sine(seconds: float, amplitude: float):
+    t = np.arange(int(seconds * RATE)) / RATE
+    tone = np.sin(2 * np.pi * 997 * t) * amplitude * 32767
+    return np.stack([tone, tone * 0.5], axis=1).astype(np.int16)
+
+
+def _wav_bytes(samples) -> bytes:
+    out = io.BytesIO()
+    with wave.open(out, 'wb') as wav:
+        wav.setnchannels(samples.shape[1])
+        wav.setsampwidth(2)
+        wav.setframerate(RATE)
+        wav.writeframes(samples.tobytes())
+    return out.getvalue()
+
+
+def test_decode_keeps_mono_and_measures_every_channel(tmp_path):
+    # Longer than one decode chunk, so loudness is accumulated across chunks
+    samples = _stereo_sine(60, 0.1)
+    path = tmp_path / 'tone.wav'
+    path.write_bytes(_wav_bytes(samples))
+
+    mono, rate, peak, energies = decode_audio(path)
+
+    assert rate == RATE and mono.shape == (len(samples), 1)
+    assert peak == int(np.abs(samples.astype(np.int32)).max())
+    assert np.allclose(energies, _sub_block_energies(samples, RATE))
+    # -20 dBFS in the left channel and -26 dBFS in the right: -23.0 + -29.0 summed in power
+    assert abs(measure_loudness(energies, peak)['integrated_lufs'] + 22.0) < 0.3
+
+
+def test_pipe_wav_is_read_to_end_of_file():
+    samples = _stereo_sine(2, 0.5)
+    data = bytearray(_wav_bytes(samples))
+    # What ffmpeg writes to a pipe: sizes it cannot fill in
+    struct.pack_into('<I', data, 4, 0xFFFFFFFF)
+    struct.pack_into('<I', data, data.index(b'data') + 4, 0xFFFFFFFF)
+
+    mono, rate, peak, _ = _read_wav_pipe(io.BytesIO(bytes(data)))
+
+    assert rate == RATE and len(mono) == len(samples)
+    assert np.array_equal(mono[:, 0], (samples.astype(np.int32).sum(axis=1) // 2).astype(np.int16))
+
+
+def test_each_upload_resolves_once_its_own_row_is_stored(tmp_path, monkeypatch):
+    from backend.services import audio_analysis
+
+    delays = {'fast.wav': 0.0, 'slow.wav': 0.5}
+
+    def analyse_sync(filename):
+        time.sleep(delays[filename])
+        return {'filename': filename, 'duration': 1.0, 'fingerprint': np.empty(0, dtype=np.uint32),
+                'integrated_lufs': -14.0, 'peak_dbfs': -1.0, 'gain_db': 0.0}
+
+    async def scenario():
+        audio_analysis.init_analysis_db(tmp_path / 'analysis.db')
+        UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
+        futures = {}
+        for filename in delays:
+            (UPLOAD_DIR / filename).write_bytes(b'')
+            futures[filename] = audio_analysis.schedule_analysis(filename)
+        queue = audio_analysis._queue()
+        batch = [queue.get_nowait() for _ in range(queue.qsize())]
+        worker = asyncio.ensure_future(audio_analysis._analyse_batch(batch, asyncio.Semaphore(2)))
+
+        await asyncio.wait_for(futures['fast.wav'], 0.4)
+        assert audio_analysis.upload_loudness('fast.wav')['gain_db'] == 0.0
+        assert not futures['slow.wav'].done()
+        await worker
+        assert audio_analysis.analysis_status('slow.wav') != 'pending'
+        for filename in delays:
+            (UPLOAD_DIR / filename).unlink()
+            audio_analysis.remove_analysis(filename)
+        await asyncio.gather(*audio_analysis._pending_writes)
+
+    monkeypatch.setattr(audio_analysis, '_analyse_sync', analyse_sync)
+    asyncio.run(scenario())
@@ -0,0 +1,59 @@
+import asyncio
+import time
+
+import pytest
+
+from backend.services import youtube
+
+
+def _use_latencies(monkeypatch, seconds):
+    latencies = youtube.deque([seconds] * youtube.EXTRACTOR_HEDGE_MIN_SAMPLES, maxlen=200)
+    monkeypatch.setattr(youtube, '_extract_latencies', latencies)
+    monkeypatch.setattr(youtube, 'EXTRACTOR_HEDGE_PERCENTILE', 95)
+    monkeypatch.setattr(youtube, 'EXTRACTOR_HEDGE_MIN_DELAY_SECONDS', 0.05)
+    return latencies
+
+
+def test_slow_primary_is_hedged_after_the_delay(monkeypatch):
+    latencies = _use_latencies(monkeypatch, 0.2)
+    calls = []
+
+    def extract(video_id, client=None):
+        calls.append((client, time.perf_counter()))
+        if client is None:
+            time.sleep(0.6)
+            return {'url': 'primary'}
+        time.sleep(0.05)
+        return {'url': 'hedge'}
+
+    async def scenario():
+        delay = youtube.hedge_delay()
+        started = time.perf_counter()
+        result = await youtube._hedged_extract('video1', extract)
+        assert result == {'url': 'hedge'}
+        hedge_started = [at for client, at in calls if client is not None]
+        assert len(hedge_started) == 1 and hedge_started[0] - started >= delay
+        # The lost primary is recorded from its own start, the hedge not at all
+        assert len(latencies) == youtube.EXTRACTOR_HEDGE_MIN_SAMPLES + 1
+        assert latencies[-1] >= delay
+        # Let the abandoned primary thread return its slot before the loop closes
+        await asyncio.sleep(0.6)
+
+    asyncio.run(scenario())
+
+
+def test_failed_primary_latency_is_recorded(monkeypatch):
+    latencies = _use_latencies(monkeypatch, 5.0)
+
+    def extract(video_id, client=None):
+        time.sleep(0.05)
+        raise RuntimeError('upstream dropped')
+
+    async def scenario():
+        with pytest.raises(RuntimeError):
+            await youtube._hedged_extract('video1', extract)
+        await asyncio.sleep(0)
+
+    asyncio.run(scenario())
+    assert len(latencies) == youtube.EXTRACTOR_HEDGE_MIN_SAMPLES + 1
+    assert latencies[-1] >= 0.05
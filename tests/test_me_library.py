@@ -0,0 +1,9 @@
+def test_remove_saved_track(client, auth_headers):
+    track = {'track_id': 'dQw4w9WgXcQ', 'source': 'youtube', 'title': 'Test track'}
+    assert client.post('/me/library', json=track, headers=auth_headers).status_code == 200
+
+    response = client.delete('/me/library', params={'track_id': track['track_id'], 'source': 'youtube'},
+                             headers=auth_headers)
+    assert response.status_code == 200, response.text
+    assert response.json()['ok'] is True
+    assert client.get('/me/library', headers=auth_headers).json()['tracks'] == []
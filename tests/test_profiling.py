@@ -0,0 +1,30 @@
+import asyncio
+
+from backend.core import profiling
+from backend.core.profiling import ProfilingMiddleware
+
+
+def test_sampling_stops_at_response_headers(monkeypatch):
+    monkeypatch.setattr(profiling, 'PROFILING_ENABLED', True)
+    seen = {}
+
+    async def streaming_app(scope, receive, send):
+        await send({'type': 'http.response.start', 'status': 200, 'headers': []})
+        # Still sending the body: the profiling slot must already be free
+        seen['active_profiles'] = middleware.active_profiles
+        await send({'type': 'http.response.body', 'body': b'x', 'more_body': True})
+        await asyncio.sleep(0.05)
+        await send({'type': 'http.response.body', 'body': b''})
+
+    middleware = ProfilingMiddleware(streaming_app)
+
+    async def receive():
+        return {'type': 'http.request', 'body': b''}
+
+    async def send(message):
+        pass
+
+    scope = {'type': 'http', 'method': 'GET', 'path': '/stream/x', 'headers': []}
+    asyncio.run(middleware(scope, receive, send))
+    assert seen['active_profiles'] == 0
+    assert middleware.active_profiles == 0
@@ -0,0 +1,64 @@
+from backend.api import endpoints
+from backend.core.config import RATE_LIMITS
+from backend.core.ratelimit import TokenBucketLimiter
+
+
+def test_take_charges_cost():
+    limiter = TokenBucketLimiter('test', per_minute=60, burst=10)
+    assert limiter.take('a', now=0, cost=8) == 0
+    assert limiter.take('a', now=0, cost=3) == 1.0  # 2 tokens left, one more refills in a second
+    assert limiter.take('a', now=1, cost=3) == 0
+    assert limiter.take('b', now=0, cost=50) == 0  # capped at burst: a full bucket
+    assert limiter.take('b', now=0) > 0
+
+
+def test_play_batch_charges_per_uncached_video(client, monkeypatch):
+    async def no_lines():
+        yield b'{"type": "end", "total": 0, "failed": 0}\n'
+
+    burst = RATE_LIMITS['play'][1]
+    monkeypatch.setattr(endpoints, 'resolve_streams_ndjson', lambda video_ids: no_lines())
+    monkeypatch.setattr(endpoints, 'uncached_stream_count', lambda video_ids: burst)
+    video_ids = [f'video{i:06d}' for i in range(burst)]
+
+    assert client.post('/play/batch', json={'video_ids': video_ids}).status_code == 200
+    response = client.post('/play/batch', json={'video_ids': video_ids})
+    assert response.status_code == 429
+    assert int(response.headers['Retry-After']) > 0
+
+
+def test_forwarded_clients_get_separate_budgets(client):
+    burst = RATE_LIMITS['auth'][1]
+    credentials = {'username': 'nobody', 'password': 'wrong-password'}
+    first = {'X-Forwarded-For': '203.0.113.7'}
+    second = {'X-Forwarded-For': '198.51.100.9'}
+
+    for _ in range(burst):
+        assert client.post('/auth/login', json=credentials, headers=first).status_code != 429
+    assert client.post('/auth/login', json=credentials, headers=first).status_code == 429
+    assert client.post('/auth/login', json=credentials, headers=second).status_code != 429
+
+
+def _request(headers):
+    from starlette.requests import Request
+
+    return Request({'type': 'http', 'headers': [(k.lower().encode(), v.encode()) for k, v in headers.items()],
+                    'client': ('203.0.113.7', 1234)})
+
+
+def test_client_key_needs_no_database_lookup(auth_headers, monkeypatch):
+    def no_lookup(*args):
+        raise AssertionError('rate-limit key queried the database')
+
+    monkeypatch.setattr(endpoints, 'get_user_by_token', no_lookup)
+    assert endpoints._client_key(_request(auth_headers)).startswith('user:')
+    # Made-up tokens count against the caller's IP rather than getting buckets of their own
+    assert endpoints._client_key(_request({'Authorization': 'Bearer made-up'})) == 'ip:203.0.113.7'
+    assert endpoints._client_key(_request({})) == 'ip:203.0.113.7'
+
+
+def test_type_ahead_is_rate_limited(client):
+    burst = RATE_LIMITS['suggest'][1]
+    for _ in range(burst):
+        assert client.get('/search/suggest', params={'q': 'he'}).status_code == 200
+    assert client.get('/search/suggest', params={'q': 'he'}).status_code == 429
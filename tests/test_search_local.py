@@ -0,0 +1,22 @@
+import threading
+
+from backend.api import endpoints
+
+
+def test_index_lookups_run_off_the_event_loop(client, monkeypatch):
+    threads = []
+
+    def lookup(name):
+        def record(db_path, q, *args):
+            threads.append((name, threading.current_thread()))
+            return []
+        return record
+
+    monkeypatch.setattr(endpoints, 'search_local', lookup('search_local'))
+    monkeypatch.setattr(endpoints, 'suggest', lookup('suggest'))
+    loop_thread = client.portal.call(threading.current_thread)
+
+    assert client.get('/search/local', params={'q': 'hello'}).json() == {'results': [], 'total': 0}
+    assert client.get('/search/suggest', params={'q': 'hel'}).json() == {'suggestions': []}
+    assert [name for name, _ in threads] == ['search_local', 'suggest']
+    assert all(thread is not loop_thread for _, thread in threads)
@@ -0,0 +1,54 @@
+import asyncio
+
+import pytest
+
+from backend.services import youtube
+
+
+def test_slow_reader_does_not_hold_up_the_query(monkeypatch):
+    pages = [[f'video{i}' for i in range(5)], []]
+    monkeypatch.setattr(youtube, '_next_search_batch_sync', lambda session: pages.pop(0))
+    monkeypatch.setattr(youtube, '_describe_video_sync', lambda video: {'id': video})
+
+    async def scenario():
+        slow = youtube.iter_search_page('slow reader', 0)
+        # The first reader stops after one result, without closing its stream
+        assert await slow.__anext__() == ('result', {'id': 'video0'})
+        page = [item async for item in youtube.iter_search_page('slow reader', 0)]
+        assert [value['id'] for kind, value in page[:-1]] == [f'video{i}' for i in range(5)]
+        assert page[-1] == ('end', None)
+        assert await slow.__anext__() == ('result', {'id': 'video1'})
+        await slow.aclose()
+
+    asyncio.run(asyncio.wait_for(scenario(), 5))
+    youtube.search_sessions.pop('slow reader', None)
+
+
+def test_failed_page_fetch_is_not_replayed(monkeypatch):
+    calls = []
+
+    def next_batch(session):
+        calls.append(session)
+        if len(calls) == 1:
+            raise ConnectionError('upstream dropped')
+        return ['video0'] if len(calls) == 2 else []
+
+    monkeypatch.setattr(youtube, '_next_search_batch_sync', next_batch)
+    monkeypatch.setattr(youtube, '_describe_video_sync', lambda video: {'id': video})
+
+    async def scenario():
+        with pytest.raises(ConnectionError):
+            [item async for item in youtube.iter_search_page('flaky', 0)]
+        assert 'flaky' not in youtube.search_sessions
+        page = [item async for item in youtube.iter_search_page('flaky', 0)]
+        assert page == [('result', {'id': 'video0'}), ('end', None)]
+
+    asyncio.run(asyncio.wait_for(scenario(), 5))
+    youtube.search_sessions.pop('flaky', None)
+
+
+def test_continuation_offsets_are_capped():
+    last = (youtube.MAX_SEARCH_PAGES - 1) * youtube.SEARCH_PAGE_SIZE
+    assert youtube.decode_continuation(youtube.encode_continuation('q', last)) == ('q', last)
+    with pytest.raises(ValueError):
+        youtube.decode_continuation(youtube.encode_continuation('q', 100000))
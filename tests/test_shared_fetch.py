@@ -0,0 +1,65 @@
+import asyncio
+
+from backend.services.shared_fetch import SharedDownload
+
+
+async def _chunks(*parts, fail=False):
+    for part in parts:
+        yield part
+        await asyncio.sleep(0)
+    if fail:
+        raise ConnectionError('upstream dropped')
+
+
+async def _failed_then_replaced():
+    first = SharedDownload('video1', 8, 'audio/webm')
+    first.start(_chunks(b'abcd', fail=True))
+    reader = first.read(0, 7)
+    assert await reader.__anext__() == b'abcd'
+    await asyncio.sleep(0.05)
+    assert first.error
+
+    # A replacement for the same video while the failed download still has a reader
+    second = SharedDownload('video1', 8, 'audio/webm')
+    second.start(_chunks(b'abcd', b'efgh'))
+    await asyncio.sleep(0.05)
+    assert second.path != first.path
+
+    await reader.aclose()  # last reader leaves: the failed download closes and removes its own file
+    assert not first.path.exists()
+    assert second.path.exists()
+    body = b''.join([chunk async for chunk in second.read(0, 7)])
+    second.close()
+    return body
+
+
+def test_replacement_download_keeps_its_buffer():
+    assert asyncio.run(_failed_then_replaced()) == b'abcdefgh'
+
+
+def test_startup_sweeps_only_stale_buffer_directories(tmp_path, monkeypatch):
+    import os
+    import time
+
+    from backend.services import shared_fetch
+
+    monkeypatch.setattr(shared_fetch, 'SHARED_FETCH_DIR', tmp_path)
+    monkeypatch.setitem(shared_fetch._state, 'dir', None)
+    live = tmp_path / 'worker-live'
+    live.mkdir()
+    (live / 'video1.1.part').write_bytes(b'abcd')
+    stale = tmp_path / 'worker-crashed'
+    stale.mkdir()
+    (stale / 'video2.1.part').write_bytes(b'abcd')
+    old = time.time() - shared_fetch.STALE_BUFFER_SECONDS - 60
+    for path in (stale / 'video2.1.part', stale):
+        os.utime(path, (old, old))
+
+    shared_fetch.prepare_shared_downloads()
+    own = shared_fetch._state['dir']
+    assert own.parent == tmp_path and own.is_dir()
+    assert (live / 'video1.1.part').exists()
+    assert not stale.exists()
+
+    shared_fetch.close_shared_downloads()
+    assert not own.exists() and live.exists()
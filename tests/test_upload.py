@@ -0,0 +1,32 @@
+import asyncio
+import io
+import time
+import wave
+
+from backend.api import endpoints
+from backend.core.config import ANALYSIS_CONCURRENCY
+
+
+def _silence() -> bytes:
+    out = io.BytesIO()
+    with wave.open(out, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(8000)
+        wav.writeframes(b'\0\0' * 8000)
+    return out.getvalue()
+
+
+def test_upload_behind_a_backlog_does_not_wait_for_analysis(client, monkeypatch):
+    monkeypatch.setattr(endpoints, 'UPLOAD_ANALYSIS_WAIT_SECONDS', 5)
+    # Files queued ahead of the upload, e.g. by the startup backfill
+    monkeypatch.setattr(endpoints, 'analysis_backlog', lambda: ANALYSIS_CONCURRENCY + 2)
+    monkeypatch.setattr(endpoints, 'schedule_analysis', lambda filename: asyncio.get_running_loop().create_future())
+
+    started = time.perf_counter()
+    response = client.post('/upload', files={'file': ('song.wav', _silence(), 'audio/wav')})
+
+    assert response.status_code == 200
+    assert time.perf_counter() - started < 2
+    assert response.json()['analysed'] is False
+    (endpoints.UPLOAD_DIR / response.json()['filename']).unlink(missing_ok=True)